@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework_simplejwt.tokens import RefreshToken
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def issue_tokens(user):
+    """Mint one refresh/access pair for ``user``, each encoded exactly once."""
+    refresh = RefreshToken.for_user(user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+def set_token_cookies(response, tokens):
+    response.set_cookie('access', tokens['access'], httponly=True, samesite='Lax')
+    response.set_cookie('refresh', tokens['refresh'], httponly=True, samesite='Lax')
+    return response
+
+
+def hashing_executor():
+    """The pool every password hash runs in, ``PASSWORD_HASHING_WORKERS`` threads wide.
+
+    PBKDF2 releases the GIL, so hashes run in parallel with each other and with
+    the event loop; the bound keeps a burst of logins from taking every core.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing',
+            )
+        return _executor
+
+
+def in_hashing_pool(func, *args):
+    """Run ``func(*args)`` in the hashing pool and wait for its result."""
+    return hashing_executor().submit(func, *args).result()
+
+
+def hash_password(raw_password):
+    return in_hashing_pool(make_password, raw_password)
+
+
+def _verify(raw_password, encoded):
+    # Returns (valid, rehashed password if the stored hash is outdated, else None).
+    rehashed = []
+    valid = check_password(raw_password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return valid, rehashed[0] if rehashed else None
+
+
+class HashingPoolBackend(ModelBackend):
+    """``ModelBackend`` with its password hashing done in the hashing pool.
+
+    The async login runs backends through ``django.contrib.auth.aauthenticate``,
+    a thread per request; this keeps the hashes those threads wait on to
+    ``PASSWORD_HASHING_WORKERS`` at a time. Queries stay on the calling thread.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Pay for one hash anyway, so response times don't reveal unknown usernames.
+            hash_password(password)
+            return None
+
+        valid, rehashed = in_hashing_pool(_verify, password, user.password)
+        if rehashed:
+            user.password = rehashed
+            user.save(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
@@ -1,12 +1,20 @@
 from django.contrib import admin
-from .models import Movie, Collection
+from django.db.models import Count, Prefetch
+from .models import CollectionGenreCount, Genre, Job, Movie, Collection
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
     list_display = ('title', 'description', 'genres')
     search_fields = ('title', 'genres')
     ordering = ('title',)
-    list_filter = ('genres',)
+    list_filter = ('genre',)
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+    ordering = ('name',)
+    raw_id_fields = ('movies',)
 
 @admin.register(Collection)
 class CollectionAdmin(admin.ModelAdmin):
@@ -15,6 +23,23 @@ class CollectionAdmin(admin.ModelAdmin):
     ordering = ('title',)
     list_filter = ('movies',)
 
+    def get_queryset(self, request):
+        top_genres = CollectionGenreCount.objects.filter(count__gt=0).order_by('-count', 'genre')
+        return super().get_queryset(request).annotate(movie_count=Count('movies')).prefetch_related(
+            Prefetch('genre_counts', queryset=top_genres, to_attr='ranked_genre_counts')
+        )
+
     def get_movie_count(self, obj):
-        return obj.movies.count()
+        return obj.movie_count
     get_movie_count.short_description = 'Number of Movies'
+    get_movie_count.admin_order_field = 'movie_count'
+
+    def favourite_genres(self, obj):
+        return ','.join(genre_count.genre for genre_count in obj.ranked_genre_counts[:3])
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    ordering = ('-run_at',)
+    readonly_fields = ('locked_by', 'locked_until', 'created_at', 'finished_at', 'last_error')
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .routers import reading_from_primary
+
+
+# What authentication and the permission checks read off a user. The rest of the
+# row, the password hash included, is never cached.
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserCache:
+    """Users by token id: a small per-process LRU in front of the shared cache.
+
+    Entries live ``JWT_USER_CACHE_LOCAL_TTL`` seconds in the LRU and
+    ``JWT_USER_CACHE_TTL`` in the shared cache. Saving or deleting a user drops
+    both here and in the shared cache; other processes drop their LRU copy
+    once its short TTL runs out. Entries hold ``USER_FIELDS`` only, and each
+    caller gets a user of its own rebuilt from them.
+    """
+
+    namespace = 'auth:user'
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, user_id):
+        return f'{self.namespace}:{user_id}'
+
+    def get(self, user_id):
+        """Return the user with ``user_id``, or None when there is none.
+
+        The user has no password hash; ``password_md5`` holds what simplejwt
+        compares the token's revoke claim with, when that check is on.
+        """
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                return self.build(entry[1])
+
+        fields = cache.get(self.key(user_id))
+        if fields is None:
+            fields = self.load(user_id)
+            if fields is None:
+                return None
+            cache.set(self.key(user_id), fields, timeout=settings.JWT_USER_CACHE_TTL)
+
+        with self.lock:
+            self.entries[user_id] = (now + settings.JWT_USER_CACHE_LOCAL_TTL, fields)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.JWT_USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        return self.build(fields)
+
+    @staticmethod
+    def load(user_id):
+        names = dict.fromkeys((*USER_FIELDS, api_settings.USER_ID_FIELD))
+        with reading_from_primary():
+            fields = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: user_id}
+            ).values(*names, 'password').first()
+        if fields is None:
+            return None
+        password = fields.pop('password')
+        fields['password_md5'] = get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+        return fields
+
+    @staticmethod
+    def build(fields):
+        fields = dict(fields)
+        password_md5 = fields.pop('password_md5')
+        user = get_user_model()(**fields)
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        user.password_md5 = password_md5
+        return user
+
+    def invalidate(self, user_id):
+        """Forget ``user_id`` now and again on commit, like ``forget_cached_collections``."""
+        user_id = str(user_id)
+
+        def forget():
+            with self.lock:
+                self.entries.pop(user_id, None)
+            cache.delete(self.key(user_id))
+
+        forget()
+        transaction.on_commit(forget)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that resolves users through ``user_cache`` instead of a query per request."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_md5:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """Claims-only mode: ``request.user`` is a ``TokenUser`` read straight off the token.
+
+    Only for read-only endpoints that need no more than the user id, if that:
+    no user is loaded, so a deactivated user keeps access until their access
+    token expires. Everything else stays on ``CachedJWTAuthentication``.
+    """
@@ -0,0 +1,97 @@
+from django.db import transaction
+
+from .genres import count_genres, invalidate_favourite_genres
+from .metrics import serializer_data
+from .models import Collection, CollectionGenreCount, Movie, SearchTerm
+from .search import deferred_unindex, index_instances
+from .serializers import CollectionSerializer, bulk_create_with_ids, resolve_movies
+from .signals import deferred_collection_forget
+
+Membership = Collection.movies.through
+
+
+@transaction.atomic
+def create_collections(items):
+    """Create one collection per validated ``CollectionSerializer`` payload in ``items``.
+
+    All their movies are resolved with a single lookup, and the collections
+    with their memberships and genre counts go in with one bulk insert each.
+    Bulk inserts skip the signals, so the search index is updated here too;
+    new collections have no cached version or ETag to retire.
+    """
+    if not items:
+        return []
+    movies = iter(resolve_movies([movie for item in items for movie in item.get('movies', [])]))
+    collections = bulk_create_with_ids(
+        Collection, [Collection(title=item['title'], description=item['description']) for item in items],
+    )
+
+    members = {}
+    for collection, item in zip(collections, items):
+        members[collection.id] = {movie.id: movie for movie in (next(movies) for _ in item.get('movies', []))}
+    Membership.objects.bulk_create(
+        Membership(collection_id=collection_id, movie_id=movie_id)
+        for collection_id, movies_by_id in members.items()
+        for movie_id in movies_by_id
+    )
+    # The collections are new, so their counts are inserted whole rather than incremented.
+    CollectionGenreCount.objects.bulk_create(
+        CollectionGenreCount(collection_id=collection_id, genre=genre, count=n)
+        for collection_id, movies_by_id in members.items()
+        for genre, n in count_genres(movie.genres for movie in movies_by_id.values()).items()
+    )
+    invalidate_favourite_genres()
+    index_instances(SearchTerm.COLLECTION, collections, new=True)
+    return collections
+
+
+def collection_details(uuids):
+    """Detail payloads of the collections with these uuids, keyed by uuid, in two queries."""
+    collections = list(Collection.objects.filter(uuid__in=uuids).prefetch_related('movies'))
+    return dict(zip(
+        (collection.uuid for collection in collections),
+        serializer_data(CollectionSerializer(collections, many=True)),
+    ))
+
+
+@transaction.atomic
+def delete_collections(uuids):
+    """Delete the collections with these uuids and return the set of those that existed.
+
+    The per-row ``post_delete`` handlers only collect their work here: the
+    index entries and cached state of the whole batch go at once.
+    """
+    collections = Collection.objects.filter(uuid__in=uuids)
+    deleted = set(collections.values_list('uuid', flat=True))
+    with deferred_unindex(), deferred_collection_forget():
+        collections.delete()
+    return deleted
+
+
+@transaction.atomic
+def add_movies(collection, uuids):
+    """Add the movies with these uuids to ``collection``.
+
+    Returns ``(added, present)``, the uuids that were added and those that
+    already were members. Only the new membership rows are written and only
+    their genres counted, so the cost follows the batch, not the collection.
+    """
+    movies = dict(Movie.objects.filter(uuid__in=uuids).values_list('id', 'uuid'))
+    present = set(
+        Membership.objects.filter(collection=collection, movie_id__in=movies).values_list('movie_id', flat=True)
+    )
+    new = [movie_id for movie_id in movies if movie_id not in present]
+    if new:
+        collection.movies.add(*new)
+    return {movies[movie_id] for movie_id in new}, {movies[movie_id] for movie_id in present}
+
+
+@transaction.atomic
+def remove_movies(collection, uuids):
+    """Remove the movies with these uuids from ``collection``; returns the uuids that were members."""
+    members = dict(
+        Membership.objects.filter(collection=collection, movie__uuid__in=uuids).values_list('movie_id', 'movie__uuid')
+    )
+    if members:
+        collection.movies.remove(*members)
+    return set(members.values())
@@ -0,0 +1,56 @@
+"""Benchmarks for the hot paths, run with ``manage.py benchmark <name>``.
+
+Each module listed in ``BENCHMARKS`` exposes ``add_arguments(parser)`` and
+``run(**options)``, which returns a JSON-serialisable dict of results.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+BENCHMARKS = ('batch', 'load', 'login', 'metrics', 'renderers', 'search', 'streaming')
+
+
+def per_call(func, iterations):
+    """Return the mean seconds per call of ``func`` over ``iterations`` calls."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations
+
+
+def latency(func, iterations):
+    """Return p50 and p99 milliseconds of ``func`` over ``iterations`` calls."""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 3),
+    }
+
+
+@contextmanager
+def throwaway_database():
+    """Run the block on a fresh, migrated test database of the configured engine; yields its name.
+
+    It is dropped afterwards, like the test runner's. SQLite gets a temporary
+    file rather than the runner's in-memory database, so that every thread
+    serving requests sees the same one.
+    """
+    name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as scratch:
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(scratch, 'bench.sqlite3')
+        try:
+            yield connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        finally:
+            connection.creation.destroy_test_db(name, verbosity=0)
+            test_settings['NAME'] = test_name
@@ -0,0 +1,125 @@
+"""Collection throughput one request at a time vs the batch endpoints.
+
+Both paths run the views in-process with JWT authentication, so the numbers
+cover auth, validation, queries and rendering but not the network. Runs
+against a scratch SQLite database filled by ``generate_data``.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from movie_collection.models import Movie
+from movie_collection.views import (
+    CollectionBatchLookupView, CollectionBatchView, CollectionDetailView, CollectionListView,
+)
+
+from .streaming import manage
+
+OPERATIONS = ('create', 'get', 'delete')
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        '--collections', type=int, default=500, help='Collections created, read and deleted per path.',
+    )
+    parser.add_argument('--batch-size', type=int, default=250, help='Collections or uuids per batch request.')
+    parser.add_argument('--movies-per-collection', type=int, default=20, help='Existing movies in each collection.')
+    parser.add_argument('--movies', type=int, default=5000, help='Movies in the scratch database.')
+    # Internal: the measurements run in a process pointed at the scratch database.
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+
+
+def run(collections=500, batch_size=250, movies_per_collection=20, movies=5000, measure=False, **options):
+    if measure:
+        return measure_paths(collections, batch_size, movies_per_collection)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = {**os.environ, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(scratch, 'bench.sqlite3')}
+        manage(env, 'migrate', '--verbosity', '0')
+        manage(env, 'generate_data', '--users', '0', '--movies', str(movies), '--collections', '0', '--seed', '1')
+        output = manage(
+            env, 'benchmark', 'batch', '--measure', '--collections', str(collections),
+            '--batch-size', str(batch_size), '--movies-per-collection', str(movies_per_collection),
+        )
+    return {key: value for key, value in json.loads(output).items() if key != 'benchmark'}
+
+
+def measure_paths(collections, batch_size, movies_per_collection):
+    user, _ = User.objects.get_or_create(username='bench_batch')
+    factory = RequestFactory(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    movies = list(Movie.objects.values('uuid', 'title', 'description'))
+    rng = random.Random(1)
+    items = [
+        {
+            'title': f'Batch collection {i}',
+            'description': 'Created by the batch benchmark.',
+            'movies': [{**movie, 'uuid': str(movie['uuid'])} for movie in rng.sample(movies, movies_per_collection)],
+        }
+        for i in range(collections)
+    ]
+    chunks = [items[start:start + batch_size] for start in range(0, collections, batch_size)]
+
+    def call(view, method, path, data=None, **kwargs):
+        body = {} if data is None else {'data': json.dumps(data), 'content_type': 'application/json'}
+        request = getattr(factory, method)(path, **body)
+        response = view(request, **kwargs)
+        response.render()
+        assert response.status_code < 300, response.content[:500]
+        return response
+
+    list_view = CollectionListView.as_view()
+    detail_view = CollectionDetailView.as_view()
+
+    def single():
+        uuids = [call(list_view, 'post', '/collection/', item).data['collection_uuid'] for item in items]
+        yield
+        for collection_uuid in uuids:
+            call(detail_view, 'get', '/collection/', collection_uuid=collection_uuid)
+        yield
+        for collection_uuid in uuids:
+            call(detail_view, 'delete', '/collection/', collection_uuid=collection_uuid)
+        yield
+
+    batch_view = CollectionBatchView.as_view()
+    lookup_view = CollectionBatchLookupView.as_view()
+
+    def batched():
+        batches = []
+        for chunk in chunks:
+            created = call(batch_view, 'post', '/', {'collections': chunk}).data['results']
+            batches.append([result['collection_uuid'] for result in created])
+        yield
+        for uuids in batches:
+            call(lookup_view, 'post', '/', {'uuids': uuids})
+        yield
+        for uuids in batches:
+            call(batch_view, 'delete', '/', {'uuids': uuids})
+        yield
+
+    results = {'collections': collections, 'batch_size': batch_size, 'movies_per_collection': movies_per_collection}
+    for name, path in (('one_at_a_time', single), ('batched', batched)):
+        cache.clear()
+        results[name] = timed(path(), collections)
+    results['speedup'] = {}
+    for operation in OPERATIONS:
+        key = f'{operation}_per_s'
+        results['speedup'][operation] = round(results['batched'][key] / results['one_at_a_time'][key], 1)
+    return results
+
+
+def timed(steps, collections):
+    """Collections per second of each step ``steps`` yields after, in ``OPERATIONS`` order."""
+    rates = {}
+    for operation in OPERATIONS:
+        started = time.perf_counter()
+        next(steps)
+        rates[f'{operation}_per_s'] = round(collections / (time.perf_counter() - started), 1)
+    return rates
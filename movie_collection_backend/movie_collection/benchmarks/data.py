@@ -0,0 +1,93 @@
+"""Synthetic users, movies and collections in bulk, for benchmarking against realistic tables."""
+import itertools
+import random
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from movie_collection.genres import rebuild_genre_counts, sync_movie_genres
+from movie_collection.models import Collection, Movie, SearchTerm
+from movie_collection.search import analyze_search_index, index_objects
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ren', 'tor', 'vas', 'del', 'pri', 'sun', 'har', 'bel', 'nox', 'qui', 'zan', 'mor')
+VOCABULARY = tuple(a + b + c for a in SYLLABLES for b in SYLLABLES for c in ('', *SYLLABLES[:9]))
+# Zipf-like frequencies: a few words are everywhere and most are rare, as in real text.
+WORD_WEIGHTS = tuple(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+GENRES = (
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary',
+    'Drama', 'Fantasy', 'Horror', 'Romance', 'Science Fiction', 'Thriller',
+)
+
+
+def generate(users=0, movies=0, collections=0, movies_per_collection=20, password='bench',
+             batch_size=1000, seed=None, prefix='bench'):
+    """Insert the requested rows in batches and return how many of each were created.
+
+    Everything goes through ``bulk_create``, so genre links and counts and the
+    search index, which signals would normally maintain, are brought up to
+    date explicitly.
+    Collections draw their movies from every movie in the table.
+    """
+    rng = random.Random(seed)
+    created = {'users': 0, 'movies': 0, 'collections': 0}
+
+    if users:
+        # Hashing is deliberately slow; every generated user shares one hash.
+        hashed = make_password(password)
+        start = User.objects.filter(username__startswith=f'{prefix}_user_').count()
+        for offset in range(0, users, batch_size):
+            batch = [
+                User(username=f'{prefix}_user_{start + i}', password=hashed)
+                for i in range(offset, min(offset + batch_size, users))
+            ]
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+            created['users'] += len(batch)
+
+    for offset in range(0, movies, batch_size):
+        batch = [
+            Movie(
+                uuid=uuid.uuid4(),
+                title=words(rng, 1, 4).title(),
+                description=words(rng, 8, 40),
+                genres=','.join(rng.sample(GENRES, rng.randint(1, 3))),
+            )
+            for _ in range(min(batch_size, movies - offset))
+        ]
+        Movie.objects.bulk_create(batch)
+        inserted = Movie.objects.filter(uuid__in=[movie.uuid for movie in batch])
+        sync_movie_genres(inserted.values_list('id', 'genres'))
+        index_objects(SearchTerm.MOVIE, inserted, new=True)
+        created['movies'] += len(batch)
+
+    movie_ids = list(Movie.objects.values_list('id', flat=True)) if collections else []
+    Membership = Collection.movies.through
+    for offset in range(0, collections, batch_size):
+        batch = [
+            Collection(uuid=uuid.uuid4(), title=words(rng, 1, 3).title(), description=words(rng, 4, 20))
+            for _ in range(min(batch_size, collections - offset))
+        ]
+        Collection.objects.bulk_create(batch)
+        collection_ids = list(
+            Collection.objects.filter(uuid__in=[collection.uuid for collection in batch]).values_list('id', flat=True)
+        )
+        Membership.objects.bulk_create(
+            [
+                Membership(collection_id=collection_id, movie_id=movie_id)
+                for collection_id in collection_ids
+                for movie_id in rng.sample(movie_ids, min(movies_per_collection, len(movie_ids)))
+            ],
+            batch_size=batch_size,
+        )
+        rebuild_genre_counts(collection_ids)
+        index_objects(SearchTerm.COLLECTION, Collection.objects.filter(id__in=collection_ids), new=True)
+        created['collections'] += len(batch)
+
+    if movies or collections:
+        analyze_search_index()
+    return created
+
+
+def words(rng, low, high):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=WORD_WEIGHTS, k=rng.randint(low, high)))
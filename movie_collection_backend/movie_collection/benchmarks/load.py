@@ -0,0 +1,203 @@
+"""Requests/sec and p50/p99 per endpoint under concurrent HTTP load.
+
+By default the app is served in-process by Django's threaded WSGI server, with
+``EXTERNAL_API_URL`` pointed at a ``FakeUpstream`` of configurable latency and
+error rate. It runs on a throwaway test database of the configured engine,
+filled with synthetic rows, and a local-memory cache, so neither the real
+tables nor a shared cache are touched.
+
+Pass ``--url`` to load an already running server instead. It must share this
+process's database, which is where the bench user and sample collection come
+from, so ``--password`` is then required, and the user, collections and movies
+the run created are deleted when it ends.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from movie_collection.models import Collection, Movie
+
+from . import throwaway_database
+from .data import generate
+from .upstream import FakeUpstream
+
+BENCH_USERNAME = 'bench_admin'
+LOAD_TITLES = ('Load test collection', 'Updated')
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class LoadServer(ThreadedWSGIServer):
+    # Django's default backlog of 10 refuses bursts of concurrent connects.
+    request_queue_size = 128
+
+
+def endpoints(collection_uuid, pages, credentials):
+    """``(name, method, path, body, auth)`` for every endpoint worth loading."""
+    detail = reverse('collection-detail', args=[collection_uuid])
+    new_collection = {
+        'title': 'Load test collection',
+        'description': 'Created by the load benchmark.',
+        'movies': [
+            {'title': f'Load Movie {i}', 'description': 'Synthetic.', 'genres': 'Drama'} for i in range(5)
+        ],
+    }
+    return [
+        ('movie-list', 'GET', lambda i: f"{reverse('movie-list')}?page={i % pages + 1}", None, True),
+        ('genre-list', 'GET', lambda i: reverse('genre-list'), None, True),
+        ('collection-list', 'GET', lambda i: reverse('collection-list'), None, True),
+        ('collection-detail', 'GET', lambda i: detail, None, True),
+        ('collection-create', 'POST', lambda i: reverse('collection-list'), new_collection, True),
+        ('collection-update', 'PUT', lambda i: detail, {**new_collection, 'title': 'Updated'}, True),
+        ('collection-export', 'GET', lambda i: reverse('collection-export'), None, True),
+        ('collection-cache-stats', 'GET', lambda i: reverse('collection-cache-stats'), None, True),
+        ('movie-cache-stats', 'GET', lambda i: reverse('movie-cache-stats'), None, True),
+        ('request-count', 'GET', lambda i: reverse('request_count'), None, True),
+        ('metrics', 'GET', lambda i: reverse('metrics'), None, True),
+        ('login', 'POST', lambda i: reverse('login'), credentials, False),
+    ]
+
+
+def add_arguments(parser):
+    parser.add_argument('--url', help='Base URL of a running server; by default one is started in-process.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients per endpoint.')
+    parser.add_argument('--requests', type=int, default=500, help='Requests sent to each endpoint.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the fake upstream waits per response.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of upstream responses that are 503s.')
+    parser.add_argument('--upstream-movies', type=int, default=500, help='Movies served by the fake upstream.')
+    parser.add_argument('--endpoint', action='append', dest='only', help='Load only this endpoint; repeatable.')
+    parser.add_argument('--password', help=f'Password of the {BENCH_USERNAME!r} user; required with --url.')
+    parser.add_argument('--movies', type=int, default=2000, help='Movies in the throwaway database.')
+    parser.add_argument('--collections', type=int, default=200, help='Collections in the throwaway database.')
+    parser.add_argument('--seed', type=int, help='Seed for the fake upstream error draws.')
+
+
+def run(url=None, concurrency=16, requests=500, latency=0.05, error_rate=0.0, upstream_movies=500, only=None,
+        password=None, movies=2000, collections=200, seed=None, **options):
+    settings = {'concurrency': concurrency, 'requests': requests}
+    if url:
+        if not password:
+            raise CommandError(f'--url loads a real database: pass --password for the {BENCH_USERNAME!r} user.')
+        with bench_rows(password) as collection_uuid:
+            results = load(url.rstrip('/'), collection_uuid, password, **settings, pages=1, only=only)
+        return {**settings, 'url': url, 'endpoints': results}
+
+    password = password or 'bench'
+    upstream = FakeUpstream(upstream_movies, latency=latency, error_rate=error_rate, seed=seed)
+    with throwaway_database(), override_settings(CACHES=LOCAL_CACHES), upstream, \
+            override_settings(EXTERNAL_API_URL=upstream.url):
+        generate(movies=movies, collections=collections, seed=seed)
+        User.objects.create_superuser(BENCH_USERNAME, password=password)
+        collection_uuid = Collection.objects.values_list('uuid', flat=True).first()
+
+        server = LoadServer(('127.0.0.1', 0), QuietHandler)
+        server.set_app(get_internal_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            results = load(
+                f'http://127.0.0.1:{server.server_port}', collection_uuid, password, **settings,
+                pages=-(-upstream_movies // FakeUpstream.page_size), only=only,
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+    return {
+        **settings,
+        'database': {'movies': movies, 'collections': collections},
+        'upstream': {'latency': latency, 'error_rate': error_rate, 'movies': upstream_movies},
+        'endpoints': results,
+    }
+
+
+@contextmanager
+def bench_rows(password):
+    """Create the bench user and a sample collection for the block, and delete what the run added after it.
+
+    Yields the sample collection's uuid; it is the one the detail and update
+    endpoints load, so no existing collection gets rewritten.
+    """
+    created_user = not User.objects.filter(username=BENCH_USERNAME).exists()
+    if created_user:
+        User.objects.create_superuser(BENCH_USERNAME, password=password)
+    last_collection = Collection.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    last_movie = Movie.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    sample = Collection.objects.create(title=LOAD_TITLES[0], description='Created by the load benchmark.')
+    try:
+        yield sample.uuid
+    finally:
+        Collection.objects.filter(id__gt=last_collection, title__in=LOAD_TITLES).delete()
+        Movie.objects.filter(id__gt=last_movie, title__startswith='Load Movie ').delete()
+        if created_user:
+            User.objects.filter(username=BENCH_USERNAME).delete()
+
+
+def load(base_url, collection_uuid, password, concurrency, requests, pages, only=None):
+    credentials = {'username': BENCH_USERNAME, 'password': password}
+    login = _session().post(base_url + reverse('login'), json=credentials)
+    login.raise_for_status()
+    headers = {'Authorization': f"Bearer {login.json()['access_token']}"}
+
+    results = {}
+    for name, method, path, body, auth in endpoints(collection_uuid, pages, credentials):
+        if only and name not in only:
+            continue
+        results[name] = hammer(base_url, method, path, body, headers if auth else {}, concurrency, requests)
+    return results
+
+
+_local = threading.local()
+
+
+def _session():
+    # One keep-alive session per client thread; ``requests.Session`` isn't thread-safe.
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def hammer(base_url, method, path, payload, headers, concurrency, total):
+    """Send ``total`` requests from ``concurrency`` threads and summarise their latencies."""
+    def call(i):
+        started = time.perf_counter()
+        try:
+            response = _session().request(method, base_url + path(i), json=payload, headers=headers, timeout=30)
+            response.content
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(call, range(total)))
+    return summarise(outcomes, time.perf_counter() - started)
+
+
+def summarise(outcomes, elapsed):
+    """Throughput, latency percentiles (ms) and error count of ``(seconds, ok)`` outcomes."""
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    if not latencies:
+        return {'requests': 0, 'errors': 0, 'rps': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for _, ok in outcomes if not ok),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+    }
@@ -0,0 +1,103 @@
+"""Login throughput: the sync view on threads, the sync view under ASGI and the async view.
+
+Under ASGI sync views share one thread, so their password hashes run one at
+a time; the async view hashes in the bounded pool instead. ``loop_lag_ms``
+is the worst delay a 1ms ticker saw on the event loop while the logins ran.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.test import AsyncRequestFactory, RequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from movie_collection.accounts import issue_tokens
+from movie_collection.views import AsyncUserLoginView, UserLoginView
+
+from . import per_call
+
+USERNAME = 'bench_login'
+
+
+def add_arguments(parser):
+    parser.add_argument('--logins', type=int, default=64, help='Logins per measurement.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Logins in flight at once.')
+    parser.add_argument('--password', default='bench', help=f'Password of the {USERNAME!r} user.')
+
+
+def run(logins=64, concurrency=16, password='bench', **options):
+    user = User.objects.filter(username=USERNAME).first()
+    if user is None:
+        user = User.objects.create_user(USERNAME, password=password)
+    credentials = json.dumps({'username': USERNAME, 'password': password})
+
+    def previous_tokens():
+        # What UserLoginView used to do: take the pair, parse the refresh again, mint another access.
+        tokens = issue_tokens(user)
+        refresh = RefreshToken(tokens['refresh'])
+        return str(refresh), str(refresh.access_token)
+
+    sync_view = UserLoginView.as_view()
+    async_view = AsyncUserLoginView.as_view()
+
+    def sync_login():
+        request = RequestFactory().post('/login/', credentials, content_type='application/json')
+        response = sync_view(request)
+        assert response.status_code == 200, response.data
+        close_old_connections()
+
+    async def async_login():
+        request = AsyncRequestFactory().post('/login/', credentials, content_type='application/json')
+        response = await async_view(request)
+        assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: sync_login(), range(logins)))
+    threaded = time.perf_counter() - started
+
+    under_asgi, under_asgi_lag = asyncio.run(burst(sync_to_async(sync_login), logins, concurrency))
+    native, native_lag = asyncio.run(burst(async_login, logins, concurrency))
+
+    iterations = 200
+    return {
+        'logins': logins,
+        'concurrency': concurrency,
+        'token_pair_us': round(per_call(lambda: issue_tokens(user), iterations) * 1e6, 1),
+        'previous_token_path_us': round(per_call(previous_tokens, iterations) * 1e6, 1),
+        'sync_threads_per_s': round(logins / threaded, 1),
+        'sync_under_asgi_per_s': round(logins / under_asgi, 1),
+        'sync_under_asgi_loop_lag_ms': under_asgi_lag,
+        'async_per_s': round(logins / native, 1),
+        'async_loop_lag_ms': native_lag,
+    }
+
+
+async def burst(login, logins, concurrency):
+    """Run ``logins`` calls of ``login``, ``concurrency`` at a time; return (seconds, worst loop lag ms)."""
+    limit = asyncio.Semaphore(concurrency)
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - started - 0.001)
+
+    async def one():
+        async with limit:
+            await login()
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await tick
+    return elapsed, round(lag * 1000, 2)
@@ -0,0 +1,69 @@
+"""Render and parse time of DRF's JSON classes vs the fast ones on typical payloads."""
+import io
+import uuid
+from datetime import datetime, timezone
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movie_collection.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+from . import per_call
+
+
+def add_arguments(parser):
+    parser.add_argument('--iterations', type=int, default=200, help='Calls timed per measurement.')
+    parser.add_argument('--movies', type=int, default=500, help='Movies in the collection payload.')
+
+
+def movie(i):
+    return {
+        'uuid': str(uuid.uuid4()),
+        'title': f'Movie {i}',
+        'description': 'A film about something that happens to someone, somewhere. ' * 4,
+        'genres': 'Drama,Crime,Thriller',
+    }
+
+
+def payloads(movies):
+    return {
+        # MovieListView passes upstream results straight through.
+        'movie_page': {
+            'count': 50000,
+            'next': 'http://localhost:8000/movies/?page=3',
+            'previous': 'http://localhost:8000/movies/?page=1',
+            'results': [movie(i) for i in range(100)],
+        },
+        'collection_detail': {
+            'title': 'Favourites',
+            'description': 'Everything worth watching twice.',
+            'movies': [movie(i) for i in range(movies)],
+        },
+        # Unserialized values the fast path encodes natively.
+        'native_types': [
+            {'uuid': uuid.uuid4(), 'at': datetime.now(timezone.utc), 'count': i} for i in range(movies)
+        ],
+    }
+
+
+def run(iterations=200, movies=500, **options):
+    drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    drf_parser, fast_parser = JSONParser(), FastJSONParser()
+    results = {'backend': 'orjson' if orjson else 'json', 'iterations': iterations}
+
+    for name, data in payloads(movies).items():
+        body = drf_renderer.render(data)
+        render_drf = per_call(lambda: drf_renderer.render(data), iterations)
+        render_fast = per_call(lambda: fast_renderer.render(data), iterations)
+        parse_drf = per_call(lambda: drf_parser.parse(io.BytesIO(body)), iterations)
+        parse_fast = per_call(lambda: fast_parser.parse(io.BytesIO(body)), iterations)
+        results[name] = {
+            'bytes': len(body),
+            'render_drf_us': round(render_drf * 1e6, 1),
+            'render_fast_us': round(render_fast * 1e6, 1),
+            'render_speedup': round(render_drf / render_fast, 1),
+            'parse_drf_us': round(parse_drf * 1e6, 1),
+            'parse_fast_us': round(parse_fast * 1e6, 1),
+            'parse_speedup': round(parse_drf / parse_fast, 1),
+        }
+    return results
@@ -0,0 +1,82 @@
+"""Search latency at catalog scale: the ranked index vs the admin's ``LIKE '%...%'`` scans.
+
+Runs against a scratch SQLite database filled by ``generate_data``, whose
+Zipf-distributed vocabulary gives common, middling and rare words to look for.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from django.db.models import Q
+
+from movie_collection.models import Movie
+from movie_collection.search import SearchResults
+
+from . import latency
+from .data import VOCABULARY
+from .streaming import manage
+
+QUERIES = {
+    'common': VOCABULARY[0],
+    'middling': VOCABULARY[60],
+    'rare': VOCABULARY[1500],
+    'two_words': f'{VOCABULARY[5]} {VOCABULARY[300]}',
+}
+
+
+def add_arguments(parser):
+    parser.add_argument('--movies', type=int, default=100000, help='Movies in the scratch database.')
+    parser.add_argument('--iterations', type=int, default=50, help='Searches timed per query.')
+    parser.add_argument('--page-size', type=int, default=20, help='Results loaded per search.')
+    # Internal: the measurements run in a process pointed at the scratch database.
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+
+
+def run(movies=100000, iterations=50, page_size=20, measure=False, **options):
+    if measure:
+        return measure_queries(iterations, page_size)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = {**os.environ, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(scratch, 'bench.sqlite3')}
+        manage(env, 'migrate', '--verbosity', '0')
+        started = time.perf_counter()
+        manage(
+            env, 'generate_data', '--users', '0', '--movies', str(movies),
+            '--collections', str(movies // 100), '--seed', '1',
+        )
+        generated = time.perf_counter() - started
+        output = manage(
+            env, 'benchmark', 'search', '--measure',
+            '--iterations', str(iterations), '--page-size', str(page_size),
+        )
+    results = {key: value for key, value in json.loads(output).items() if key != 'benchmark'}
+    return {'movies': movies, 'generate_and_index_seconds': round(generated, 1), **results}
+
+
+def like_scan(query, page_size):
+    # What MovieAdmin's search_fields run: every word must appear in some field.
+    matches = Movie.objects.all()
+    for word in query.split():
+        matches = matches.filter(
+            Q(title__icontains=word) | Q(description__icontains=word) | Q(genres__icontains=word)
+        )
+    return matches.count(), list(matches[:page_size])
+
+
+def indexed_search(query, page_size):
+    results = SearchResults(query)
+    return results.count(), results[:page_size]
+
+
+def measure_queries(iterations, page_size):
+    measured = {}
+    for name, query in QUERIES.items():
+        measured[name] = {
+            'query': query,
+            'matches': indexed_search(query, page_size)[0],
+            'index': latency(lambda: indexed_search(query, page_size), iterations),
+            'like_scan': latency(lambda: like_scan(query, page_size), max(1, iterations // 5)),
+        }
+    return {'page_size': page_size, 'queries': measured}
@@ -0,0 +1,89 @@
+"""Peak RSS of listing every collection: buffered ``serializer.data`` vs the streamed export.
+
+Runs against a scratch SQLite database by default. ``--engine configured``
+uses a throwaway test database on the configured engine instead, since
+client-side buffering (mysqlclient's, say) only shows up there.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from movie_collection.exports import stream_collections
+from movie_collection.models import Collection
+from movie_collection.serializers import CollectionListSerializer
+
+from . import throwaway_database
+
+PATHS = ('buffered', 'streamed')
+
+
+def add_arguments(parser):
+    parser.add_argument('--collections', type=int, default=20000, help='Collections in the scratch database.')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per chunk for the streamed export.')
+    parser.add_argument(
+        '--engine', choices=('sqlite', 'configured'), default='sqlite',
+        help="Database to measure on: a scratch SQLite file, or a test database on the configured engine.",
+    )
+    # Internal: each path is measured in a fresh process so peak RSS is its own.
+    parser.add_argument('--seed', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--path', choices=PATHS, help=argparse.SUPPRESS)
+
+
+def run(collections=20000, chunk_size=2000, seed=False, path=None, engine='sqlite', **options):
+    if seed:
+        return seed_collections(collections)
+    if path:
+        return measure(path, chunk_size)
+
+    if engine == 'configured' and connection.vendor != 'sqlite':
+        with throwaway_database() as test_name:
+            return {'vendor': connection.vendor, **compare({**os.environ, 'NAME': test_name}, collections, chunk_size)}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = {**os.environ, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(scratch, 'bench.sqlite3')}
+        manage(env, 'migrate', '--verbosity', '0')
+        return {'vendor': 'sqlite', **compare(env, collections, chunk_size)}
+
+
+def compare(env, collections, chunk_size):
+    manage(env, 'benchmark', 'streaming', '--seed', '--collections', str(collections))
+    results = {'collections': collections, 'chunk_size': chunk_size}
+    for name in PATHS:
+        output = manage(env, 'benchmark', 'streaming', '--path', name, '--chunk-size', str(chunk_size))
+        results[name] = {key: value for key, value in json.loads(output).items() if key != 'benchmark'}
+    return results
+
+
+def manage(env, *args):
+    command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args]
+    return subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+
+
+def seed_collections(count):
+    Collection.objects.bulk_create(
+        (Collection(title=f'Collection {i}', description='A collection description. ' * 8) for i in range(count)),
+        batch_size=1000,
+    )
+    return {'seeded': count}
+
+
+def measure(path, chunk_size):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if path == 'buffered':
+        data = CollectionListSerializer(Collection.objects.order_by('id'), many=True).data
+        size = len(JSONRenderer().render({'is_success': True, 'data': {'collections': data}}))
+    else:
+        size = sum(len(part) for part in stream_collections(Collection.objects.all(), chunk_size))
+    elapsed = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'bytes': size, 'seconds': round(elapsed, 3), 'peak_rss_growth_kb': after - before}
@@ -0,0 +1,103 @@
+"""Local stand-in for ``EXTERNAL_API_URL``, shared by the tests and the load benchmark."""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeUpstream:
+    """Local stand-in for the external movie API, served from a background thread.
+
+    ``failures`` is a list of status codes returned (in order) before pages are
+    served normally, ``broken_pages`` always answer 503, and ``latency`` delays
+    every response by that many seconds. ``error_rate`` makes that fraction of
+    the remaining requests fail with 503, drawn from a generator seeded with
+    ``seed`` so runs can be repeated.
+    """
+
+    page_size = 10
+
+    def __init__(self, movie_count=25, latency=0, failures=(), broken_pages=(), error_rate=0.0, seed=None,
+                 host='127.0.0.1', port=0):
+        self.movies = [
+            {
+                'uuid': str(uuid.uuid4()),
+                'title': f'Upstream Movie {i}',
+                'description': f'Description {i}',
+                'genres': 'Drama,Comedy' if i % 2 else 'Action',
+            }
+            for i in range(movie_count)
+        ]
+        self.latency = latency
+        self.failures = list(failures)
+        self.broken_pages = set(broken_pages)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.pages_requested = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with upstream.lock:
+                    upstream.requests += 1
+                    upstream.connections.add(self.client_address)
+                    failure = upstream.failures.pop(0) if upstream.failures else None
+                    if failure is None and upstream.error_rate and upstream.random.random() < upstream.error_rate:
+                        failure = 503
+                if upstream.latency:
+                    time.sleep(upstream.latency)
+                page = int(parse_qs(urlparse(self.path).query).get('page', ['1'])[0])
+                with upstream.lock:
+                    upstream.pages_requested.append(page)
+                if failure or page in upstream.broken_pages:
+                    self.send_json(failure or 503, {'detail': 'upstream failure'})
+                    return
+                self.send_json(200, upstream.page(page))
+
+            def send_json(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        # The default listen backlog of 5 drops bursts of concurrent connects.
+        self.server.request_queue_size = 128
+        self.server.server_bind()
+        self.server.server_activate()
+        # Clients that hit their deadline hang up mid-response; that's expected here.
+        self.server.handle_error = lambda request, client_address: None
+        self.url = f'http://{host}:{self.server.server_port}/movies/'
+
+    def page(self, page):
+        start = (page - 1) * self.page_size
+        last_page = max(1, -(-len(self.movies) // self.page_size))
+        return {
+            'count': len(self.movies),
+            'next': f'{self.url}?page={page + 1}' if page < last_page else None,
+            'previous': f'{self.url}?page={page - 1}' if page > 1 else None,
+            'results': self.movies[start:start + self.page_size],
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
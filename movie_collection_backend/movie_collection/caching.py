@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import afetch_movies, fetch_movies
+
+logger = logging.getLogger(__name__)
+
+
+def incr_counter(key, delta=1):
+    """Atomically add ``delta`` to a counter in the shared cache, creating it if needed."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # First hit for this counter; another worker may have created it meanwhile.
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+class CacheStats:
+    """Named counters in the default cache; every worker contributes when ``CACHE_URL`` is shared."""
+
+    def __init__(self, namespace, fields):
+        self.namespace = namespace
+        self.fields = tuple(fields)
+
+    def key(self, field):
+        return f'{self.namespace}:stats:{field}'
+
+    def incr(self, field, delta=1):
+        incr_counter(self.key(field), delta)
+
+    async def aincr(self, field, delta=1):
+        key = self.key(field)
+        try:
+            await cache.aincr(key, delta)
+        except ValueError:
+            if not await cache.aadd(key, delta, timeout=None):
+                await cache.aincr(key, delta)
+
+    def snapshot(self):
+        values = cache.get_many([self.key(field) for field in self.fields])
+        return {field: values.get(self.key(field), 0) for field in self.fields}
+
+    def reset(self):
+        cache.delete_many([self.key(field) for field in self.fields])
+
+
+# Result of a flight whose leader failed, told apart from a computed None.
+_NO_RESULT = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = _NO_RESULT
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(key, compute, lock_timeout=10, wait=5):
+    """Run ``compute()`` for ``key`` at most once at a time and share its result.
+
+    Concurrent callers in this process wait for the leader's result. Callers in
+    other processes are held back by a lock in the shared cache and poll it for
+    the value the leader stores under ``key``. Either way, if no result shows up
+    within ``wait`` seconds, or the leader fails, they compute it themselves
+    rather than return nothing.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(wait) and flight.result is not _NO_RESULT:
+            return flight.result
+        return compute()
+
+    lock_key = f'{key}:lock'
+    try:
+        if not cache.add(lock_key, 1, timeout=lock_timeout):
+            expires_at = time.monotonic() + wait
+            while time.monotonic() < expires_at:
+                time.sleep(0.05)
+                value = cache.get(key)
+                if value is not None:
+                    flight.result = value
+                    return value
+            flight.result = compute()
+            return flight.result
+        try:
+            flight.result = compute()
+        finally:
+            cache.delete(lock_key)
+        return flight.result
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+_async_flights = {}
+
+
+async def asingle_flight(key, compute, lock_timeout=10, wait=5):
+    """Async counterpart of ``single_flight``; ``compute`` is a coroutine function."""
+    flight_key = (id(asyncio.get_running_loop()), key)
+    flight = _async_flights.get(flight_key)
+    if flight is not None:
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight), wait)
+        except asyncio.TimeoutError:
+            result = _NO_RESULT
+        if result is not _NO_RESULT:
+            return result
+        return await compute()
+
+    flight = _async_flights[flight_key] = asyncio.get_running_loop().create_future()
+    result = _NO_RESULT
+    lock_key = f'{key}:lock'
+    try:
+        if not await cache.aadd(lock_key, 1, timeout=lock_timeout):
+            expires_at = time.monotonic() + wait
+            while time.monotonic() < expires_at:
+                await asyncio.sleep(0.05)
+                value = await cache.aget(key)
+                if value is not None:
+                    result = value
+                    return value
+            result = await compute()
+            return result
+        try:
+            result = await compute()
+        finally:
+            await cache.adelete(lock_key)
+        return result
+    finally:
+        del _async_flights[flight_key]
+        flight.set_result(result)
+
+
+# Keeps background refresh tasks referenced until they finish.
+_background_tasks = set()
+
+
+class UpstreamPageCache:
+    """Cache of upstream movie pages with stale-while-revalidate.
+
+    Entries are fresh for ``ttl`` seconds. After that they are still served for
+    up to ``stale_ttl`` more seconds while a single background refresh runs.
+    A copy of every page fetched is kept for ``last_good_ttl`` seconds; when a
+    page can be neither served nor fetched, as while the upstream circuit is
+    open, that copy is returned instead, marked ``stale`` with its ``fetched_at``.
+    """
+
+    namespace = 'movies:page'
+    stats = CacheStats(namespace, ('hit', 'miss', 'stale', 'fallback'))
+
+    def __init__(self, fetch=fetch_movies, afetch=afetch_movies, ttl=None, stale_ttl=None, last_good_ttl=None):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.ttl = settings.MOVIE_PAGE_CACHE_TTL if ttl is None else ttl
+        self.stale_ttl = settings.MOVIE_PAGE_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        self.last_good_ttl = settings.MOVIE_PAGE_LAST_GOOD_TTL if last_good_ttl is None else last_good_ttl
+
+    def key(self, page):
+        return f'{self.namespace}:{page}'
+
+    def last_good_key(self, page):
+        return f'{self.key(page)}:last_good'
+
+    @staticmethod
+    def fallback(entry):
+        return {**entry['data'], 'stale': True, 'fetched_at': entry['fetched_at']}
+
+    def get(self, page):
+        """Return the movies page from cache, fetching it upstream when needed."""
+        entry = cache.get(self.key(page))
+        if entry is None:
+            self.stats.incr('miss')
+            entry = single_flight(self.key(page), lambda: self.load(page))
+            return entry['data'] if entry else self.last_good(page)
+
+        if time.time() - entry['fetched_at'] < self.ttl:
+            self.stats.incr('hit')
+        else:
+            self.stats.incr('stale')
+            self.refresh_in_background(page)
+        return entry['data']
+
+    def load(self, page):
+        """Fetch ``page`` upstream and store it; failed fetches are not cached."""
+        data = self.fetch(page)
+        if data is None:
+            return None
+        entry = {'data': data, 'fetched_at': time.time()}
+        cache.set(self.key(page), entry, timeout=self.ttl + self.stale_ttl)
+        cache.set(self.last_good_key(page), entry, timeout=self.last_good_ttl)
+        return entry
+
+    def last_good(self, page):
+        entry = cache.get(self.last_good_key(page))
+        if entry is None:
+            return None
+        self.stats.incr('fallback')
+        return self.fallback(entry)
+
+    def refresh_in_background(self, page):
+        refresh_key = f'{self.key(page)}:refresh'
+        if not cache.add(refresh_key, 1, timeout=max(self.ttl, 1)):
+            return None
+
+        def refresh():
+            try:
+                self.load(page)
+            except Exception:
+                logger.exception('Background refresh of movies page %s failed', page)
+            finally:
+                cache.delete(refresh_key)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
+
+    async def aget(self, page):
+        """Async version of ``get``; refreshes run as tasks on the current loop."""
+        entry = await cache.aget(self.key(page))
+        if entry is None:
+            await self.stats.aincr('miss')
+            entry = await asingle_flight(self.key(page), lambda: self.aload(page))
+            return entry['data'] if entry else await self.alast_good(page)
+
+        if time.time() - entry['fetched_at'] < self.ttl:
+            await self.stats.aincr('hit')
+        else:
+            await self.stats.aincr('stale')
+            await self.arefresh_in_background(page)
+        return entry['data']
+
+    async def aload(self, page):
+        data = await self.afetch(page)
+        if data is None:
+            return None
+        entry = {'data': data, 'fetched_at': time.time()}
+        await cache.aset(self.key(page), entry, timeout=self.ttl + self.stale_ttl)
+        await cache.aset(self.last_good_key(page), entry, timeout=self.last_good_ttl)
+        return entry
+
+    async def alast_good(self, page):
+        entry = await cache.aget(self.last_good_key(page))
+        if entry is None:
+            return None
+        await self.stats.aincr('fallback')
+        return self.fallback(entry)
+
+    async def arefresh_in_background(self, page):
+        refresh_key = f'{self.key(page)}:refresh'
+        if not await cache.aadd(refresh_key, 1, timeout=max(self.ttl, 1)):
+            return None
+
+        async def refresh():
+            try:
+                await self.aload(page)
+            except Exception:
+                logger.exception('Background refresh of movies page %s failed', page)
+            finally:
+                await cache.adelete(refresh_key)
+
+        task = asyncio.create_task(refresh())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return task
+
+
+class CollectionDetailCache:
+    """Cache of serialized collection detail payloads, keyed by uuid and version.
+
+    Entries remember how long building them took, which each hit adds to the
+    ``saved_us`` stat. Lookups go through the version cached by ``etags``,
+    which every write bumps and repoints on commit, so an entry built from a
+    row read before the write is never looked up again and just expires after
+    ``ttl`` seconds.
+    """
+
+    namespace = 'collection:detail'
+    stats = CacheStats(namespace, ('hit', 'miss', 'saved_us'))
+
+    def __init__(self, ttl=None):
+        self.ttl = settings.COLLECTION_DETAIL_CACHE_TTL if ttl is None else ttl
+
+    def get(self, collection_uuid, version, build):
+        """Return the entry for ``version``, building the current one with ``build()`` on a miss.
+
+        ``version`` is the cached current version, or None when it is not
+        cached. ``build`` returns ``(version, data)``, or None when there is
+        no such collection; misses are not cached.
+        """
+        key = collection_detail_key(collection_uuid, version)
+        entry = None if version is None else cache.get(key)
+        if entry is not None:
+            self.stats.incr('hit')
+            self.stats.incr('saved_us', entry['build_us'])
+            return entry
+
+        self.stats.incr('miss')
+        return single_flight(key, lambda: self.load(collection_uuid, build))
+
+    def load(self, collection_uuid, build):
+        started = time.perf_counter()
+        built = build()
+        if built is None:
+            return None
+        version, data = built
+        entry = {'version': version, 'data': data, 'build_us': int((time.perf_counter() - started) * 1e6)}
+        cache.set(collection_detail_key(collection_uuid, version), entry, timeout=self.ttl)
+        return entry
+
+    @classmethod
+    def report(cls):
+        """Stats with the derived hit ratio and average milliseconds saved per hit."""
+        stats = cls.stats.snapshot()
+        lookups = stats['hit'] + stats['miss']
+        stats['hit_ratio'] = round(stats['hit'] / lookups, 4) if lookups else 0.0
+        stats['saved_ms_per_hit'] = round(stats['saved_us'] / stats['hit'] / 1000, 3) if stats['hit'] else 0.0
+        return stats
+
+
+def collection_detail_key(collection_uuid, version):
+    return f'{CollectionDetailCache.namespace}:{collection_uuid}:{version}'
+
+
+def get_movies_page(page):
+    return UpstreamPageCache().get(page)
+
+
+async def aget_movies_page(page):
+    return await UpstreamPageCache().aget(page)
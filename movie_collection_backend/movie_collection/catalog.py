@@ -0,0 +1,163 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .etags import bump_collection_versions
+from .genres import rebuild_genre_counts, sync_movie_genres
+from .models import CatalogSyncState, Collection, Movie, SearchTerm
+from .search import index_objects
+from .utils import UPSTREAM_PAGE_SIZE, fetch_movies
+
+logger = logging.getLogger(__name__)
+
+MOVIE_FIELDS = ('uuid', 'title', 'description', 'genres')
+
+
+class CatalogSyncError(Exception):
+    """Raised when an upstream page could not be fetched during a sync."""
+
+
+def upsert_movies(items, first_position=None):
+    """Insert or update upstream movie dicts in one statement, keyed on uuid.
+
+    With ``first_position``, the items are the upstream catalog from that
+    position on, and take over those catalog positions from whatever movies
+    held them before.
+
+    Bulk upserts bypass model signals, so genre links and the search index are
+    resynced and the collections holding any of these movies get their
+    versions bumped and genre counts rebuilt afterwards.
+    """
+    movies = [
+        Movie(
+            uuid=item['uuid'],
+            title=item.get('title') or '',
+            description=item.get('description') or '',
+            genres=item.get('genres') or '',
+            catalog_position=None if first_position is None else first_position + i,
+        )
+        for i, item in enumerate(items)
+    ]
+    uuids = [movie.uuid for movie in movies]
+    update_fields = ['title', 'description', 'genres']
+    if first_position is not None:
+        update_fields.append('catalog_position')
+        Movie.objects.filter(
+            catalog_position__gte=first_position, catalog_position__lt=first_position + len(movies),
+        ).exclude(uuid__in=uuids).update(catalog_position=None)
+    # MySQL always upserts on any unique key and rejects an explicit target.
+    unique_fields = ['uuid'] if connection.features.supports_update_conflicts_with_target else None
+    Movie.objects.bulk_create(
+        movies,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+    sync_movie_genres(Movie.objects.filter(uuid__in=uuids).values_list('id', 'genres'))
+    index_objects(SearchTerm.MOVIE, Movie.objects.filter(uuid__in=uuids))
+    affected = Collection.objects.filter(movies__uuid__in=uuids).distinct()
+    collection_ids = list(affected.values_list('id', flat=True))
+    if collection_ids:
+        bump_collection_versions(Collection.objects.filter(id__in=collection_ids))
+        rebuild_genre_counts(collection_ids)
+    return len(movies)
+
+
+def sync_catalog(concurrency=4, restart=False, fetch=fetch_movies):
+    """Mirror every upstream movie page into the ``Movie`` table.
+
+    Up to ``concurrency`` pages are fetched ahead in parallel while pages are
+    written in order, so the checkpoint always points at the first page that
+    still needs syncing. An interrupted run resumes from that page; a finished
+    run resets it so the next sync starts over from page 1.
+    """
+    state, _ = CatalogSyncState.objects.get_or_create(source=settings.EXTERNAL_API_URL)
+    start = 1 if restart else state.next_page
+
+    first = fetch(start)
+    if first is None:
+        raise CatalogSyncError(f'Could not fetch page {start}')
+    total_pages = max(1, -(-first['count'] // UPSTREAM_PAGE_SIZE))
+    synced = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        next_to_submit = start + 1
+
+        def fill():
+            nonlocal next_to_submit
+            while len(pending) < concurrency and next_to_submit <= total_pages:
+                pending.append((next_to_submit, executor.submit(fetch, next_to_submit)))
+                next_to_submit += 1
+
+        page, data = start, first
+        fill()
+        while True:
+            if not data['data']:
+                break
+            with transaction.atomic():
+                synced += upsert_movies(data['data'], first_position=(page - 1) * UPSTREAM_PAGE_SIZE)
+                CatalogSyncState.objects.filter(pk=state.pk).update(next_page=page + 1)
+            logger.info('Synced movies page %d/%d', page, total_pages)
+
+            if not pending:
+                break
+            page, future = pending.popleft()
+            data = future.result()
+            if data is None:
+                for _, future in pending:
+                    future.cancel()
+                raise CatalogSyncError(f'Could not fetch page {page}; rerun to resume from it')
+            fill()
+
+    with transaction.atomic():
+        # Movies past the end of the catalog were dropped upstream.
+        Movie.objects.filter(catalog_position__gte=first['count']).update(catalog_position=None)
+        CatalogSyncState.objects.filter(pk=state.pk).update(next_page=1, last_completed_at=timezone.now())
+    return synced
+
+
+def local_movies(genre=None):
+    """The synced movies, in upstream order; ``genre`` narrows them through the indexed genre links."""
+    movies = Movie.objects.filter(catalog_position__isnull=False).order_by('catalog_position')
+    if genre:
+        movies = movies.filter(genre__name=genre)
+    return movies
+
+
+def local_page_rows(movies, page, genre=None):
+    """The rows of ``page`` (1-based) of ``local_movies(genre)``.
+
+    Unfiltered pages are a range scan of the catalog position index, however
+    deep the page. A genre's movies have gaps in their positions, so their
+    pages are counted off within the genre instead.
+    """
+    start = (page - 1) * UPSTREAM_PAGE_SIZE
+    if genre:
+        return movies.values(*MOVIE_FIELDS)[start:start + UPSTREAM_PAGE_SIZE]
+    return movies.filter(
+        catalog_position__gte=start, catalog_position__lt=start + UPSTREAM_PAGE_SIZE,
+    ).values(*MOVIE_FIELDS)
+
+
+def local_movies_page(page, genre=None):
+    """Serve a movies page from the local mirror in the same shape as ``fetch_movies``."""
+    movies = local_movies(genre)
+    results = list(local_page_rows(movies, page, genre))
+    return {'count': movies.count(), 'next': None, 'previous': None, 'data': _stringify(results)}
+
+
+async def alocal_movies_page(page, genre=None):
+    movies = local_movies(genre)
+    results = [row async for row in local_page_rows(movies, page, genre)]
+    return {'count': await movies.acount(), 'next': None, 'previous': None, 'data': _stringify(results)}
+
+
+def _stringify(rows):
+    for row in rows:
+        row['uuid'] = str(row['uuid'])
+    return rows
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when several worker processes would each get a private default cache."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.WEB_CONCURRENCY <= 1 or not issubclass(import_string(backend), (LocMemCache, DummyCache)):
+        return []
+    return [
+        checks.Warning(
+            f'The default cache ({backend}) is private to each process, '
+            f'but WEB_CONCURRENCY is {settings.WEB_CONCURRENCY}.',
+            hint=(
+                'Set CACHE_URL to a Redis or memcached server shared by every worker. Without it, '
+                'revoked tokens stay valid on other workers and each worker keeps its own circuit '
+                'breaker, counters and locks.'
+            ),
+            id='movie_collection.W001',
+        )
+    ]
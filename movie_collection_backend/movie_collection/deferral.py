@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class Deferral:
+    """Collect work inside ``block()`` and hand it to ``flush`` once, at the end of the outermost block.
+
+    The collection lives in a ``ContextVar``, like ``routers.request_pin``, so
+    code that ``sync_to_async`` runs in another thread still adds to the block
+    it was called from. Nested blocks join the outer one.
+    """
+
+    def __init__(self, name, new, flush):
+        self.collected = ContextVar(name, default=None)
+        self.new = new
+        self.flush = flush
+
+    def pending(self):
+        """The current block's collection to add to, or None outside any block."""
+        return self.collected.get()
+
+    @contextmanager
+    def block(self):
+        if self.collected.get() is not None:
+            yield
+            return
+        pending = self.new()
+        token = self.collected.set(pending)
+        try:
+            yield
+        finally:
+            self.collected.reset(token)
+        if pending:
+            self.flush(pending)
@@ -0,0 +1,100 @@
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.http import quote_etag
+
+from .models import Collection
+from .renderers import dumps
+from .routers import reading_from_primary
+
+
+def collection_version_key(collection_uuid):
+    return f'collection:version:{collection_uuid}'
+
+
+def collection_etag(collection_uuid, version):
+    return quote_etag(f'{collection_uuid}-{version}')
+
+
+def cached_collection_version(collection_uuid):
+    """Return the collection's current version if it is cached, else None."""
+    return cache.get(collection_version_key(collection_uuid))
+
+
+def remember_collection_etag(collection_uuid, version):
+    """Cache the version a collection was just read at and return its ETag.
+
+    Only fills a missing entry, so it never overrides the version a write
+    published on commit.
+    """
+    cache.add(collection_version_key(collection_uuid), version, timeout=settings.COLLECTION_ETAG_CACHE_TTL)
+    return collection_etag(collection_uuid, version)
+
+
+def forget_cached_collections(uuids):
+    """Drop cached versions now, and on commit cache the committed ones.
+
+    A read that loaded a row before the commit can still try to cache its
+    version afterwards, but ``remember_collection_etag`` will not replace the
+    one published here; detail payloads are keyed by version, so the stale
+    one it built is never served either.
+    """
+    uuids = list(uuids)
+    if not uuids:
+        return
+    cache.delete_many([collection_version_key(collection_uuid) for collection_uuid in uuids])
+    transaction.on_commit(lambda: publish_collection_versions(uuids))
+
+
+@reading_from_primary()
+def publish_collection_versions(uuids):
+    versions = {
+        collection_version_key(collection_uuid): version
+        for collection_uuid, version in Collection.objects.filter(uuid__in=uuids).values_list('uuid', 'version')
+    }
+    cache.set_many(versions, timeout=settings.COLLECTION_ETAG_CACHE_TTL)
+    # Collections deleted meanwhile.
+    cache.delete_many([
+        key for key in map(collection_version_key, uuids) if key not in versions
+    ])
+
+
+def bump_collection_versions(collections):
+    """Bump the version of every collection in ``collections``, retiring their ETags."""
+    uuids = list(collections.values_list('uuid', flat=True))
+    if uuids:
+        Collection.objects.filter(uuid__in=uuids).update(version=F('version') + 1)
+        forget_cached_collections(uuids)
+
+
+def bump_collection_version(collection):
+    if collection.__dict__.get('_bumps_deferred') is not None:
+        collection._bumps_deferred += 1
+        return
+    Collection.objects.filter(pk=collection.pk).update(version=F('version') + 1)
+    forget_cached_collections([collection.uuid])
+
+
+@contextmanager
+def one_version_bump(collection, bump=True):
+    """Fold every version bump ``collection`` gets inside the block into one.
+
+    ``bump=False`` drops them instead, for a collection created in the block
+    that nobody can hold an ETag for yet.
+    """
+    collection._bumps_deferred = 0
+    try:
+        yield
+    finally:
+        deferred = collection.__dict__.pop('_bumps_deferred')
+    if bump and deferred:
+        bump_collection_version(collection)
+
+
+def content_etag(data):
+    """Strong ETag for a JSON-serialisable body: a hash of its canonical encoding."""
+    return quote_etag(hashlib.blake2b(dumps(data, sort_keys=True), digest_size=16).hexdigest())
@@ -0,0 +1,66 @@
+from asgiref.sync import sync_to_async
+
+from .renderers import dumps
+from .serializers import CollectionListSerializer
+
+EXPORT_FIELDS = tuple(CollectionListSerializer.Meta.fields)
+EXPORT_HEAD = b'{"is_success":true,"data":{"collections":['
+EXPORT_TAIL = b']}}'
+
+
+def read_chunk(collections, last_id, chunk_size):
+    return list(collections.filter(id__gt=last_id).values('id', *EXPORT_FIELDS)[:chunk_size])
+
+
+def encode_chunk(rows):
+    return b','.join(dumps({field: row[field] for field in EXPORT_FIELDS}) for row in rows)
+
+
+def stream_collections(collections, chunk_size):
+    """Yield ``collections`` as the collection list JSON body, ``chunk_size`` rows at a time.
+
+    Rows are read in keyset chunks, ``id > last id ORDER BY id LIMIT
+    chunk_size``, each its own short query, and encoded straight from
+    ``values()``. Memory stays bounded by one chunk however many collections
+    there are, on every backend: a plain ``iterator()`` would not do, as
+    mysqlclient buffers the whole result set on the client.
+    """
+    collections = collections.order_by('id')
+
+    yield EXPORT_HEAD
+    separator = b''
+    last_id = 0
+    while True:
+        rows = read_chunk(collections, last_id, chunk_size)
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        yield separator + encode_chunk(rows)
+        separator = b','
+        if len(rows) < chunk_size:
+            break
+    yield EXPORT_TAIL
+
+
+async def astream_collections(collections, chunk_size):
+    """Async counterpart of ``stream_collections``, for serving under ASGI.
+
+    Django's ASGI handler reads a sync iterator into a list before sending
+    any of it; this one runs each chunk's query with ``sync_to_async``, so
+    the body goes out a chunk at a time there too.
+    """
+    collections = collections.order_by('id')
+
+    yield EXPORT_HEAD
+    separator = b''
+    last_id = 0
+    while True:
+        rows = await sync_to_async(read_chunk)(collections, last_id, chunk_size)
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        yield separator + encode_chunk(rows)
+        separator = b','
+        if len(rows) < chunk_size:
+            break
+    yield EXPORT_TAIL
@@ -0,0 +1,174 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .models import Collection, CollectionGenreCount, Genre
+from .routers import reading_from_primary
+
+
+FAVOURITE_GENRES_VERSION_KEY = 'favourite_genres:version'
+
+
+def split_genres(value):
+    """Split a comma-joined genres string into clean genre names."""
+    return [genre.strip() for genre in (value or '').split(',') if genre.strip()]
+
+
+def count_genres(genre_strings):
+    counts = Counter()
+    for value in genre_strings:
+        counts.update(split_genres(value))
+    return counts
+
+
+def sync_movie_genres(movies):
+    """Point each movie's ``Genre`` links at the names in its ``genres`` string.
+
+    ``movies`` is an iterable of ``(movie_id, genres)`` pairs; their links are
+    replaced in bulk with the same handful of queries however many there are.
+    """
+    movies = list(movies)
+    if not movies:
+        return
+
+    links = {(movie_id, name) for movie_id, genres in movies for name in split_genres(genres)}
+    names = {name for _, name in links}
+    genre_ids = {}
+    if names:
+        Genre.objects.bulk_create([Genre(name=name) for name in names], ignore_conflicts=True)
+        genre_ids = dict(Genre.objects.filter(name__in=names).values_list('name', 'id'))
+
+    Link = Genre.movies.through
+    Link.objects.filter(movie_id__in=[movie_id for movie_id, _ in movies]).delete()
+    Link.objects.bulk_create([Link(movie_id=movie_id, genre_id=genre_ids[name]) for movie_id, name in links])
+
+
+def collections_with_genre(collections, genre):
+    """Narrow ``collections`` to those holding at least one movie in ``genre``."""
+    Membership = Collection.movies.through
+    return collections.filter(
+        id__in=Membership.objects.filter(movie__genre__name=genre).values('collection_id')
+    )
+
+
+def genre_facets():
+    """Movies and collections per genre, counted by the database with GROUP BY."""
+    return list(
+        Genre.objects.annotate(
+            movie_count=Count('movies', distinct=True),
+            collection_count=Count('movies__collections', distinct=True),
+        )
+        .filter(movie_count__gt=0)
+        .order_by('-movie_count', 'name')
+        .values('name', 'movie_count', 'collection_count')
+    )
+
+
+def apply_genre_deltas(deltas):
+    """Add ``deltas`` ({(collection_id, genre): change}) to the stored genre counts.
+
+    Missing rows are created first so the increments themselves are a single
+    atomic UPDATE, whatever else is writing to the same collection.
+    """
+    deltas = {key: change for key, change in deltas.items() if change}
+    if not deltas:
+        return
+
+    collection_ids = {collection_id for collection_id, _ in deltas}
+    genres = {genre for _, genre in deltas}
+    CollectionGenreCount.objects.bulk_create(
+        [
+            CollectionGenreCount(collection_id=collection_id, genre=genre)
+            for (collection_id, genre), change in deltas.items() if change > 0
+        ],
+        ignore_conflicts=True,
+    )
+    rows = CollectionGenreCount.objects.filter(collection_id__in=collection_ids, genre__in=genres)
+    rows.update(count=F('count') + Case(
+        *[
+            When(collection_id=collection_id, genre=genre, then=Value(change))
+            for (collection_id, genre), change in deltas.items()
+        ],
+        default=Value(0),
+    ))
+    if any(change < 0 for change in deltas.values()):
+        rows.filter(count__lte=0).delete()
+    invalidate_favourite_genres()
+
+
+def rebuild_genre_counts(collection_ids=None, chunk_size=500):
+    """Recompute stored genre counts from scratch, e.g. after a bulk import.
+
+    Works through collections ``chunk_size`` at a time; returns how many were
+    rebuilt.
+    """
+    Membership = Collection.movies.through
+    queryset = Collection.objects.order_by('id')
+    if collection_ids is not None:
+        queryset = queryset.filter(id__in=collection_ids)
+    ids = list(queryset.values_list('id', flat=True))
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        counts = {collection_id: Counter() for collection_id in chunk}
+        memberships = Membership.objects.filter(collection_id__in=chunk).values_list('collection_id', 'movie__genres')
+        for collection_id, genres in memberships:
+            counts[collection_id].update(split_genres(genres))
+
+        with transaction.atomic():
+            CollectionGenreCount.objects.filter(collection_id__in=chunk).delete()
+            CollectionGenreCount.objects.bulk_create(
+                CollectionGenreCount(collection_id=collection_id, genre=genre, count=count)
+                for collection_id, genre_counts in counts.items()
+                for genre, count in genre_counts.items()
+            )
+    invalidate_favourite_genres()
+    return len(ids)
+
+
+@reading_from_primary()
+def favourite_genres_of(collections, limit=3):
+    """Return the sorted union of each collection's top ``limit`` genres in one query."""
+    ranked = CollectionGenreCount.objects.filter(collection__in=collections, count__gt=0).annotate(
+        rank=Window(RowNumber(), partition_by=F('collection_id'), order_by=(F('count').desc(), F('genre').asc()))
+    )
+    return sorted(set(ranked.filter(rank__lte=limit).values_list('genre', flat=True)))
+
+
+def invalidate_favourite_genres():
+    """Retire every cached favourite genres summary by bumping their version."""
+    try:
+        cache.incr(FAVOURITE_GENRES_VERSION_KEY)
+    except ValueError:
+        cache.add(FAVOURITE_GENRES_VERSION_KEY, 1, timeout=None)
+
+
+def favourite_genres_key(version, genre):
+    # The genre comes from the query string; memcached rejects keys with spaces or over 250 bytes.
+    digest = hashlib.blake2b(genre.encode(), digest_size=16).hexdigest() if genre else ''
+    return f'favourite_genres:{version}:{digest}'
+
+
+def cached_favourite_genres(genre=None):
+    """Return the favourite genres of all collections, or of those in ``genre``.
+
+    The summary is cached until the stored genre counts next change. A genre
+    no collection has is not cached, so clients cannot fill the cache with
+    made-up ones.
+    """
+    version = cache.get(FAVOURITE_GENRES_VERSION_KEY, 0)
+    collections = Collection.objects.all()
+    if genre:
+        collections = collections_with_genre(collections, genre)
+    key = favourite_genres_key(version, genre)
+    summary = cache.get(key)
+    if summary is None:
+        summary = favourite_genres_of(collections)
+        if summary or not genre:
+            cache.set(key, summary, timeout=settings.FAVOURITE_GENRES_CACHE_TTL)
+    return summary
@@ -0,0 +1,201 @@
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import sync_catalog
+from .genres import rebuild_genre_counts
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job functions by name, filled by the ``job`` decorator.
+JOBS = {}
+
+# Seconds between sweeps for expired leases and old finished jobs.
+MAINTENANCE_INTERVAL = 30
+
+# Inserts tried by ``enqueue`` while workers keep claiming the job it collides with.
+DEDUP_ATTEMPTS = 5
+
+
+def job(func):
+    """Register ``func`` as a job under its name and give it an ``enqueue`` shortcut.
+
+    ``func.enqueue(**kwargs)`` is ``enqueue(func.__name__, **kwargs)``.
+    """
+    JOBS[func.__name__] = func
+    func.enqueue = functools.partial(enqueue, func.__name__)
+    return func
+
+
+def enqueue(name, *, dedup_key=None, run_at=None, delay=None, max_attempts=None, **kwargs):
+    """Queue a call of job ``name`` with ``kwargs`` and return its ``Job``.
+
+    ``kwargs`` are stored as JSON, so UUIDs and datetimes arrive as strings.
+    ``run_at``, or ``delay`` in seconds, schedules the job for later. While a
+    job with the same ``dedup_key`` is still queued, that job is returned
+    instead of a new one; once it starts, the key can queue a follow-up, so
+    changes made while it runs are not missed. Inside a transaction the job is
+    only seen by workers after the commit, and goes away with a rollback.
+    """
+    if name not in JOBS:
+        raise ValueError(f'Unknown job {name!r}')
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    fields = {
+        'name': name,
+        'payload': kwargs,
+        'dedup_key': dedup_key,
+        'run_at': run_at,
+        'max_attempts': settings.JOB_MAX_ATTEMPTS if max_attempts is None else max_attempts,
+    }
+
+    # The unique ``dedup_key``, which only queued jobs keep, settles races
+    # between callers: the losing insert fails and returns the winner's job.
+    for _ in range(DEDUP_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Job.objects.create(**fields)
+        except IntegrityError:
+            if dedup_key is None:
+                raise
+        existing = Job.objects.filter(dedup_key=dedup_key).first()
+        if existing is not None:
+            return existing
+        # It was claimed between the insert and the lookup; the key is free again.
+    raise IntegrityError(f'Could not queue {name!r}: dedup key {dedup_key!r} kept changing hands')
+
+
+def claim(worker, limit):
+    """Mark up to ``limit`` due jobs as running for ``worker`` and return them.
+
+    Each job is taken with a conditional UPDATE, so workers racing for the
+    same row cannot both win it, without row locks or an external broker.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    claimed = [
+        job_id for job_id in due.values_list('id', flat=True)[:limit]
+        if Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            dedup_key=None,
+            attempts=F('attempts') + 1,
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+        )
+    ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def retry_delay(attempts):
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), 3600)
+
+
+def requeue_expired():
+    """Queue again the running jobs whose worker stopped renewing its lease, e.g. because it died."""
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.RUNNING, locked_until__lt=now)
+    expired.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error='Lease expired', locked_by='', locked_until=None, finished_at=now,
+    )
+    return expired.update(status=Job.QUEUED, run_at=now, locked_by='', locked_until=None)
+
+
+def purge_finished():
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_RETENTION_SECONDS)
+    Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()
+
+
+class Worker:
+    """Runs due jobs on a pool of ``threads`` threads until ``stop`` is set.
+
+    Any number of workers, in any number of processes, can share the table.
+    The leases of running jobs are renewed on every poll; jobs whose lease
+    ran out are queued again. Failed jobs are retried after ``retry_delay``
+    until they run out of attempts.
+    """
+
+    def __init__(self, threads=4, poll_interval=1.0):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.stop = threading.Event()
+        self.running = {}
+        self.maintained_at = None
+
+    def run(self, once=False):
+        """Work until stopped, or with ``once`` until no job is due or running; returns jobs run."""
+        processed = 0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as pool:
+            while not self.stop.is_set():
+                self.running = {job_id: future for job_id, future in self.running.items() if not future.done()}
+                self.maintain()
+                free = self.threads - len(self.running)
+                jobs = claim(self.name, free) if free else []
+                for claimed in jobs:
+                    self.running[claimed.pk] = pool.submit(self.execute, claimed)
+                processed += len(jobs)
+
+                if once and not jobs and not self.running:
+                    break
+                if self.running and (len(self.running) == self.threads or not jobs):
+                    wait(self.running.values(), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif not jobs:
+                    self.stop.wait(self.poll_interval)
+        close_old_connections()
+        return processed
+
+    def maintain(self):
+        if self.running:
+            Job.objects.filter(pk__in=self.running, locked_by=self.name).update(
+                locked_until=timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            )
+        if self.maintained_at is None or time.monotonic() - self.maintained_at >= MAINTENANCE_INTERVAL:
+            self.maintained_at = time.monotonic()
+            requeue_expired()
+            purge_finished()
+
+    def execute(self, job):
+        close_old_connections()
+        mine = Job.objects.filter(pk=job.pk, locked_by=self.name)
+        started = time.perf_counter()
+        try:
+            JOBS[job.name](**job.payload)
+        except Exception:
+            logger.exception('Job %s failed on attempt %d/%d', job, job.attempts, job.max_attempts)
+            error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                mine.update(
+                    status=Job.QUEUED, last_error=error, locked_by='', locked_until=None,
+                    run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                )
+            else:
+                mine.update(
+                    status=Job.FAILED, last_error=error, locked_by='', locked_until=None, finished_at=timezone.now(),
+                )
+        else:
+            logger.info('Job %s done in %.1fms', job, (time.perf_counter() - started) * 1000)
+            mine.update(status=Job.DONE, locked_by='', locked_until=None, finished_at=timezone.now())
+        finally:
+            close_old_connections()
+
+
+@job
+def sync_movies(restart=False):
+    sync_catalog(restart=restart)
+
+
+@job
+def recompute_genre_counts(collection_ids=None):
+    rebuild_genre_counts(collection_ids)
@@ -0,0 +1,25 @@
+import json
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+from movie_collection.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run one of the movie_collection benchmarks and print its results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Also write the results to this JSON file.')
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name in BENCHMARKS:
+            module = import_module(f'movie_collection.benchmarks.{name}')
+            module.add_arguments(subparsers.add_parser(name, help=module.__doc__))
+
+    def handle(self, *args, **options):
+        module = import_module(f'movie_collection.benchmarks.{options["benchmark"]}')
+        results = {'benchmark': options['benchmark'], **module.run(**options)}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_collection.benchmarks.data import generate
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate synthetic users, movies and collections for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to create.')
+        parser.add_argument('--movies', type=int, default=10000, help='Movies to create.')
+        parser.add_argument('--collections', type=int, default=1000, help='Collections to create.')
+        parser.add_argument(
+            '--movies-per-collection', type=int, default=20,
+            help='Movies drawn at random into each new collection.',
+        )
+        parser.add_argument('--password', default='bench', help='Password of every generated user.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows inserted per statement.')
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable data.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        created = generate(
+            users=options['users'],
+            movies=options['movies'],
+            collections=options['collections'],
+            movies_per_collection=options['movies_per_collection'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Created {users} users, {movies} movies and {collections} collections'.format(**created)
+        ))
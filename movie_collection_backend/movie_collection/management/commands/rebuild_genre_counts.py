@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from movie_collection.genres import rebuild_genre_counts
+from movie_collection.models import Collection
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored per-collection genre counts, e.g. after a bulk import.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'collections', nargs='*',
+            help='UUIDs of the collections to rebuild; all collections when omitted.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of collections recomputed per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        collection_ids = None
+        if options['collections']:
+            collection_ids = list(
+                Collection.objects.filter(uuid__in=options['collections']).values_list('id', flat=True)
+            )
+
+        rebuilt = rebuild_genre_counts(collection_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt genre counts for {rebuilt} collections'))
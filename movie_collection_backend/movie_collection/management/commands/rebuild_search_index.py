@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from movie_collection.search import rebuild_search_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the movie and collection search index from scratch, e.g. after a bulk import.'
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend != 'index':
+            self.stdout.write(f'Search runs on the {backend!r} full-text backend; there is no index to rebuild')
+            return
+
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} movies and collections'))
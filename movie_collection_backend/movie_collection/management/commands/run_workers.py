@@ -0,0 +1,35 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_collection.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs on a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Number of jobs run at the same time.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds between looks for due jobs while idle.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no job is due or running instead of waiting for more.',
+        )
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1')
+
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'])
+        # Finish the jobs already running, but claim no more.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop.set())
+
+        processed = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_collection.catalog import CatalogSyncError, sync_catalog
+
+
+class Command(BaseCommand):
+    help = 'Mirror the external movie API into the local Movie table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Maximum number of upstream pages fetched in parallel.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the saved checkpoint and start again from page 1.',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        try:
+            synced = sync_catalog(concurrency=options['concurrency'], restart=options['restart'])
+        except CatalogSyncError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Synced {synced} movies'))
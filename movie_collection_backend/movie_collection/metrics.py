@@ -0,0 +1,150 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds; anything slower lands in the implicit +Inf bucket.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated inside the matching bucket."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def quantile(self, q, snapshot=None):
+        counts, _, count = snapshot or self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Registry:
+    """Process-local histograms keyed by metric name and label values.
+
+    Each worker keeps its own registry; scrape every worker (or sum their
+    buckets) for a deployment-wide view.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, *sorted(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def time(self, name, **labels):
+        return self.histogram(name, **labels).time()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def reset(self):
+        # Zeroed in place: callers may hold on to the histograms they observe into.
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
+
+    def render(self):
+        """Render every histogram in the Prometheus text format.
+
+        Each histogram family is followed by a ``<name>_quantile`` gauge family
+        with its p50/p95/p99; a histogram family may only hold its buckets,
+        sum and count.
+        """
+        by_name = {}
+        for (name, *labels), histogram in sorted(self.histograms.items()):
+            by_name.setdefault(name, []).append((labels, histogram, histogram.snapshot()))
+
+        lines = []
+        for name, series in by_name.items():
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram, (counts, total, count) in series:
+                cumulative = 0
+                for bound, bucket_count in zip((*histogram.buckets, '+Inf'), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+
+            lines.append(f'# HELP {name}_quantile Quantiles of {name}, interpolated inside its buckets.')
+            lines.append(f'# TYPE {name}_quantile gauge')
+            for labels, histogram, snapshot in series:
+                for q in QUANTILES:
+                    value = histogram.quantile(q, snapshot)
+                    lines.append(f'{name}_quantile{_labels(labels, quantile=q)} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+registry = Registry()
+registry.describe('http_request_duration_seconds', 'Time spent handling a request, per view.')
+registry.describe('http_request_db_seconds', 'Database time spent per request, per view.')
+registry.describe('upstream_attempt_duration_seconds', 'Latency of single external API attempts.')
+registry.describe('upstream_fetch_duration_seconds', 'Latency of fetch_movies calls, retries included.')
+registry.describe('serializer_duration_seconds', 'Time spent building serializer output.')
+
+
+def serializer_data(serializer):
+    """Return ``serializer.data``, timing it under the serializer's class name."""
+    child = getattr(serializer, 'child', serializer)
+    with registry.time('serializer_duration_seconds', serializer=type(child).__name__):
+        return serializer.data
@@ -1,13 +1,257 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import URLResolver, get_resolver
+
+from .caching import incr_counter
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = '<unmatched>'
+# Routes without a name, such as the admin's catch-all, are counted together.
+UNNAMED_ROUTE = '<unnamed>'
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+# Seconds that counters written into an already-reset epoch linger before expiring.
+RETIRED_EPOCH_TTL = 60
+
+
+def route_names(resolver=None, namespace=''):
+    """Yield the view name of every named route, the way ``resolver_match.view_name`` spells it."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            inner = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from route_names(pattern, inner)
+        elif pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+class RequestCounter:
+    """Request counts per route and status class, kept in the default cache.
+
+    Requests only add to a per-process buffer; a background thread (see
+    ``start``) flushes it every ``REQUEST_COUNTER_FLUSH_INTERVAL`` seconds
+    with one atomic ``incr`` per counter that moved, so the totals cover
+    every worker that shares the cache set by ``CACHE_URL``; with the
+    per-process default they only cover the worker answering. Counters live
+    under an epoch, so a reset is a single atomic ``incr`` of the epoch:
+    later flushes land in the new epoch while the old one is read back and
+    dropped.
+    """
+
+    epoch_key = 'request_count:epoch'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flusher_pid = None
+
+    def key(self, epoch, route, status_class):
+        return f'request_count:{epoch}:{route}:{status_class}'
+
+    def record(self, route, status_code):
+        with self.lock:
+            self.pending[(route, f'{status_code // 100}xx')] += 1
+
+    def start(self):
+        """Flush from a daemon thread every interval, and once more when the process exits.
+
+        Called by the WSGI and ASGI entry points, so an idle worker still
+        publishes what it has counted; workers forked afterwards start their own.
+        """
+        if self.flusher_pid == os.getpid():
+            return
+        if self.flusher_pid is None:
+            atexit.register(self.flush)
+            os.register_at_fork(after_in_child=self.after_fork)
+        self.flusher_pid = os.getpid()
+        threading.Thread(target=self.run_flusher, name='request-counter', daemon=True).start()
+
+    def after_fork(self):
+        # The parent's buffer is the parent's to flush, and its lock may have been held mid-fork.
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(settings.REQUEST_COUNTER_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not flush request counts')
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return
+        epoch = cache.get(self.epoch_key, 0)
+        self.publish(epoch, pending)
+        current = cache.get(self.epoch_key, 0)
+        if current != epoch:
+            # A reset retired the epoch mid-flush and may have read and dropped it
+            # before these landed. Let what was written there expire, and count it
+            # in the new epoch instead: a request can then show up in both the
+            # reset's report and the new totals, but never in neither.
+            for route, status_class in pending:
+                cache.touch(self.key(epoch, route, status_class), RETIRED_EPOCH_TTL)
+            self.publish(current, pending)
+
+    def publish(self, epoch, pending):
+        for (route, status_class), count in pending.items():
+            incr_counter(self.key(epoch, route, status_class), count)
+
+    def breakdown(self, epoch=None):
+        """Return ``(total, {route: {status_class: count}})`` for an epoch (default: current)."""
+        if epoch is None:
+            epoch = cache.get(self.epoch_key, 0)
+        keys = {
+            self.key(epoch, route, status_class): (route, status_class)
+            for route in (*set(route_names()), UNNAMED_ROUTE, UNMATCHED_ROUTE)
+            for status_class in STATUS_CLASSES
+        }
+        routes = {}
+        for key, count in cache.get_many(list(keys)).items():
+            route, status_class = keys[key]
+            routes.setdefault(route, {})[status_class] = count
+        return sum(sum(classes.values()) for classes in routes.values()), routes
+
+    def reset(self):
+        """Start a new epoch and return the breakdown of the one it replaced."""
+        self.flush()
+        epoch = incr_counter(self.epoch_key) - 1
+        total, routes = self.breakdown(epoch)
+        cache.delete_many([
+            self.key(epoch, route, status_class)
+            for route, classes in routes.items()
+            for status_class in classes
+        ])
+        return total, routes
+
+
+request_counter = RequestCounter()
+
+
+class RequestCounterMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.count(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.count(request, response)
+        return response
+
+    def count(self, request, response):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            route = UNMATCHED_ROUTE
+        else:
+            route = match.view_name if match.url_name else UNNAMED_ROUTE
+        request_counter.record(route, response.status_code)
+
+
+class QueryTimer:
+    """``execute_wrapper`` adding database time to the current request's total.
+
+    One instance is installed on every connection as it is opened; requests
+    opt in by setting ``request_db_time``, a ``ContextVar`` that follows them
+    into the threads ``sync_to_async`` runs their queries on.
+    """
+
+    def __call__(self, execute, sql, params, many, context):
+        totals = request_db_time.get()
+        if totals is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            totals[0] += time.perf_counter() - started
+
+
+request_db_time = ContextVar('request_db_time', default=None)
+query_timer = QueryTimer()
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+class MetricsMiddleware:
+    """Record per-view latency and database time histograms.
+
+    Belongs first in ``MIDDLEWARE`` so the timing covers every other layer.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.histograms = {}
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        totals = [0.0]
+        token = request_db_time.set(totals)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_db_time.reset(token)
+        self.observe(request, time.perf_counter() - started, totals[0])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        totals = [0.0]
+        token = request_db_time.set(totals)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_db_time.reset(token)
+        self.observe(request, time.perf_counter() - started, totals[0])
+        return response
 
-class RequestCounterMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        cache.incr('request_count')
-    
-class RequestCounterMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        if cache.get('request_count') is None:
-            cache.set('request_count', 0)
-        cache.incr('request_count')
+    def observe(self, request, elapsed, db_time):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNMATCHED_ROUTE
+        histograms = self.histograms.get(view)
+        if histograms is None:
+            histograms = self.histograms[view] = (
+                registry.histogram('http_request_duration_seconds', view=view),
+                registry.histogram('http_request_db_seconds', view=view),
+            )
+        histograms[0].observe(elapsed)
+        histograms[1].observe(db_time)
@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-18 12:09
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_genre_counts(apps, schema_editor):
+    Collection = apps.get_model('movie_collection', 'Collection')
+    CollectionGenreCount = apps.get_model('movie_collection', 'CollectionGenreCount')
+
+    counts = {}
+    memberships = Collection.movies.through.objects.values_list('collection_id', 'movie__genres')
+    for collection_id, genres in memberships.iterator():
+        counter = counts.setdefault(collection_id, Counter())
+        counter.update(genre.strip() for genre in (genres or '').split(',') if genre.strip())
+
+    CollectionGenreCount.objects.bulk_create(
+        (
+            CollectionGenreCount(collection_id=collection_id, genre=genre, count=count)
+            for collection_id, counter in counts.items()
+            for genre, count in counter.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_collection', '0002_catalogsyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionGenreCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_counts', to='movie_collection.collection')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['collection', '-count', 'genre'], name='collection_top_genres_idx')],
+                'constraints': [models.UniqueConstraint(fields=('collection', 'genre'), name='unique_collection_genre')],
+            },
+        ),
+        migrations.RunPython(populate_genre_counts, migrations.RunPython.noop),
+    ]
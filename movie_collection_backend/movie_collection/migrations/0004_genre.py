@@ -0,0 +1,40 @@
+# Generated by Django 5.1 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+def split_existing_genres(apps, schema_editor):
+    Genre = apps.get_model('movie_collection', 'Genre')
+    Movie = apps.get_model('movie_collection', 'Movie')
+
+    links = set()
+    for movie_id, genres in Movie.objects.values_list('id', 'genres').iterator():
+        links.update((movie_id, genre.strip()) for genre in (genres or '').split(',') if genre.strip())
+
+    Genre.objects.bulk_create(
+        [Genre(name=name) for name in {name for _, name in links}], batch_size=1000, ignore_conflicts=True
+    )
+    genre_ids = dict(Genre.objects.values_list('name', 'id'))
+    Genre.movies.through.objects.bulk_create(
+        [Genre.movies.through(movie_id=movie_id, genre_id=genre_ids[name]) for movie_id, name in links],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_collection', '0003_collectiongenrecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('movies', models.ManyToManyField(blank=True, to='movie_collection.movie')),
+            ],
+        ),
+        migrations.RunPython(split_existing_genres, migrations.RunPython.noop),
+    ]
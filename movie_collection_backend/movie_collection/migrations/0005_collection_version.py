@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_collection', '0004_genre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1 on 2026-10-18 12:54
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+# Frozen copies of search.tokenize and its field weights as of this migration.
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split()
+)
+FIELDS = {
+    'movie': {'title': 3, 'genres': 2, 'description': 1},
+    'collection': {'title': 3, 'description': 1},
+}
+FULLTEXT_INDEXES = [
+    ('movie_collection_movie', 'movie_search_ft', 'title, description, genres'),
+    ('movie_collection_collection', 'collection_search_ft', 'title, description'),
+]
+
+
+def tokenize(text):
+    return [word[:64] for word in re.findall(r'\w+', (text or '').lower()) if len(word) > 1 and word not in STOP_WORDS]
+
+
+def index_existing_rows(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        # Searched through the FULLTEXT indexes below instead.
+        return
+    SearchTerm = apps.get_model('movie_collection', 'SearchTerm')
+    for kind, model_name in (('movie', 'Movie'), ('collection', 'Collection')):
+        model = apps.get_model('movie_collection', model_name)
+        terms = []
+        for row in model.objects.values('id', *FIELDS[kind]).iterator():
+            weights = Counter()
+            for field, weight in FIELDS[kind].items():
+                for term in tokenize(row[field]):
+                    weights[term] += weight
+            terms.extend(
+                SearchTerm(kind=kind, object_id=row['id'], term=term, weight=weight) for term, weight in weights.items()
+            )
+            if len(terms) >= 5000:
+                SearchTerm.objects.bulk_create(terms)
+                terms = []
+        SearchTerm.objects.bulk_create(terms)
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, columns in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})')
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, _ in FULLTEXT_INDEXES:
+        schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_collection', '0005_collection_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('movie', 'Movie'), ('collection', 'Collection')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'kind', 'object_id', 'weight'], name='search_term_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id', 'term'), name='unique_search_term')],
+            },
+        ),
+        migrations.RunPython(index_existing_rows, migrations.RunPython.noop),
+        migrations.RunPython(add_fulltext_indexes, drop_fulltext_indexes),
+    ]
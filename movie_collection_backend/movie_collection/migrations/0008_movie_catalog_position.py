@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_collection', '0007_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='catalog_position',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -1,21 +1,33 @@
 from django.db import models
-from collections import Counter
 import uuid
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class Movie(models.Model):
     """Model representing a movie."""
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     title = models.CharField(max_length=255)
-    genre = models.CharField(max_length=100)
-    director = models.CharField(max_length=100)
-    release_year = models.IntegerField()
-    rating = models.FloatField()
-    poster = models.ImageField(upload_to='posters/', blank=True, null=True)
+    description = models.TextField()
+    genres = models.CharField(max_length=255, blank=True)
+    # Where ``sync_movies`` found the movie in the upstream catalog; None for
+    # movies that only exist here. The local movie list pages on it.
+    catalog_position = models.PositiveIntegerField(null=True, blank=True, db_index=True, editable=False)
 
     def __str__(self):
         return self.title
 
+class Genre(models.Model):
+    """A genre name, linked to every movie whose ``genres`` string lists it."""
+
+    name = models.CharField(max_length=255, unique=True)
+    movies = models.ManyToManyField(Movie, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Collection(models.Model):
     """Model representing a collection of movies."""
 
@@ -23,17 +35,118 @@ class Collection(models.Model):
     title = models.CharField(max_length=250)
     description = models.TextField()
     movies = models.ManyToManyField(Movie, related_name='collections')
+    # Bumped on every change to the collection or its movies; feeds its ETag.
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # ``version`` only moves through ``F('version') + 1`` updates. Writing the
+        # in-memory value back could undo a concurrent bump, leaving two bodies
+        # with one ETag, so updates leave it out.
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.attname for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'version']
+        super().save(*args, **kwargs)
+
     @property
     def favourite_genres(self):
         """Returns the most common genres in the collection."""
 
-        all_genres = []
-        for movie in self.movies.all():
-            all_genres.extend(movie.genres.split(','))
-        
-        most_common_genres = Counter(all_genres).most_common(3)
-        return ','.join([genre for genre, _ in most_common_genres])
+        most_common_genres = self.genre_counts.filter(count__gt=0).order_by('-count', 'genre')[:3]
+        return ','.join(most_common_genres.values_list('genre', flat=True))
+
+
+class CollectionGenreCount(models.Model):
+    """Number of movies per genre in a collection, kept current by signals."""
+
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='genre_counts')
+    genre = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['collection', 'genre'], name='unique_collection_genre'),
+        ]
+        indexes = [
+            models.Index(fields=['collection', '-count', 'genre'], name='collection_top_genres_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.collection_id}:{self.genre}={self.count}'
+
+
+class CatalogSyncState(models.Model):
+    """Progress of mirroring an upstream movie API into the Movie table."""
+
+    source = models.CharField(max_length=255, unique=True)
+    next_page = models.PositiveIntegerField(default=1)
+    last_completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.source
+
+
+class SearchTerm(models.Model):
+    """One entry of the search index: a term and its weight in one movie or collection.
+
+    Kept current by signals (see ``search``) unless the database's own
+    full-text index is used instead.
+    """
+
+    MOVIE = 'movie'
+    COLLECTION = 'collection'
+    KINDS = [(MOVIE, 'Movie'), (COLLECTION, 'Collection')]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'term'], name='unique_search_term'),
+        ]
+        indexes = [
+            # Covers the whole search query, so ranking never reads the table.
+            models.Index(fields=['term', 'kind', 'object_id', 'weight'], name='search_term_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id}:{self.term}={self.weight}'
+
+
+class Job(models.Model):
+    """A call of a registered job function, queued for ``manage.py run_workers`` (see ``jobs``)."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Only queued jobs keep their key, so uniqueness holds among them on every backend.
+    dedup_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}#{self.pk} {self.status}'
@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CollectionCursorPagination(CursorPagination):
+    """Keyset pagination over collections, newest first, on the primary key index."""
+
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SearchPagination(PageNumberPagination):
+    """Numbered pages of ranked search results; ranking has no stable key to keyset on."""
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,122 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-SQL-Profile'
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|%s|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r'\(\s*(?:\?\s*,\s*)*\?\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """Reduce ``sql`` to its shape: literals and placeholders become ``?``, ``IN`` lists ``(...)``."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _VALUE_LISTS.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryProfile:
+    """``execute_wrapper`` counting and timing queries, grouped by shape.
+
+    The same shape run over and over within one request is the signature of
+    an N+1: one query per related object instead of one for all of them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+        self.shapes = Counter()
+        self.shape_time = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            shape = query_shape(sql)
+            self.count += 1
+            self.elapsed += elapsed
+            self.shapes[shape] += 1
+            self.shape_time[shape] += elapsed
+
+    @contextmanager
+    def capture(self, using=None):
+        """Profile every query run inside the block, on ``using`` or on all databases."""
+        aliases = [using] if using else list(connections)
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def repeated(self, threshold):
+        """Return ``(shape, count)`` for every shape run at least ``threshold`` times."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def summary(self, threshold):
+        return f'queries={self.count}; time={self.elapsed * 1000:.1f}ms; repeated={len(self.repeated(threshold))}'
+
+    def report(self, threshold):
+        lines = [self.summary(threshold)]
+        for shape, count in self.shapes.most_common():
+            marker = ' [N+1?]' if count >= threshold else ''
+            lines.append(f'  {count}x {self.shape_time[shape] * 1000:.1f}ms{marker} {shape}')
+        return '\n'.join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by ``query_budget`` when a block runs more queries than allowed."""
+
+
+@contextmanager
+def query_budget(limit, repeat_threshold=None, using=None):
+    """Fail unless the block runs at most ``limit`` queries.
+
+    With ``repeat_threshold`` it also fails when any one query shape runs that
+    many times, so an N+1 is caught even while the total is still in budget.
+    """
+    threshold = repeat_threshold or settings.SQL_PROFILER_REPEAT_THRESHOLD
+    with QueryProfile().capture(using) as profile:
+        yield profile
+
+    if profile.count > limit:
+        raise QueryBudgetExceeded(f'{profile.count} queries over a budget of {limit}\n{profile.report(threshold)}')
+    if repeat_threshold and profile.repeated(repeat_threshold):
+        raise QueryBudgetExceeded(f'Repeated query shapes\n{profile.report(threshold)}')
+
+
+class SQLProfilerMiddleware:
+    """Count and time each request's queries and flag repeated shapes.
+
+    Opt in with ``SQL_PROFILER``; otherwise the middleware removes itself at
+    startup. The summary goes into the ``X-SQL-Profile`` response header and
+    the log, with the full per-shape report logged as a warning whenever a
+    shape repeats ``SQL_PROFILER_REPEAT_THRESHOLD`` times. Only queries run
+    on the request's own thread are seen, so async views go unprofiled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SQL_PROFILER_REPEAT_THRESHOLD
+        with QueryProfile().capture() as profile:
+            response = self.get_response(request)
+
+        response[PROFILE_HEADER] = profile.summary(threshold)
+        if profile.repeated(threshold):
+            logger.warning('Possible N+1 on %s %s\n%s', request.method, request.path, profile.report(threshold))
+        else:
+            logger.info('%s %s %s', request.method, request.path, profile.summary(threshold))
+        return response
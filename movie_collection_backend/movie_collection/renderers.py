@@ -0,0 +1,71 @@
+import codecs
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_fallback_default = JSONEncoder().default
+
+
+def dumps(data, sort_keys=False):
+    """Encode ``data`` as compact UTF-8 JSON bytes with the fastest backend available.
+
+    UUIDs and datetimes are encoded natively; anything else orjson does not
+    know (decimals, lazy strings, querysets) goes through DRF's encoder.
+    """
+    if orjson is None:
+        return json.dumps(
+            data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys,
+        ).encode()
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(data, default=_fallback_default, option=option)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """``JSONRenderer`` that encodes through orjson when it is installed.
+
+    Requests asking for indented output (the browsable API does) keep using
+    the stock renderer. Unlike it, U+2028/U+2029 are left unescaped: they are
+    valid JSON, and scanning for them costs as much as encoding the body.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """``JSONParser`` that decodes UTF-8 bodies through orjson when it is installed."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+def json_response(data, status=200):
+    """``JsonResponse`` for plain Django views, encoded like the REST API's responses."""
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
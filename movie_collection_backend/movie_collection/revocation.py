@@ -0,0 +1,195 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .caching import incr_counter
+
+# Missing log entries are retried this long: the revoking process bumps the
+# sequence just before it writes the entry.
+LOG_ENTRY_GRACE = 5.0
+SYNC_BATCH_SIZE = 1000
+
+
+class BloomFilter:
+    """Set membership in fixed memory; may report false positives, never false negatives."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(-(-self.size // 8))
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * step) % self.size
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        # Stops at the first clear bit, which for most non-members is the first or second.
+        bits = self.bits
+        for position in self.positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    """Revoked token ids, kept in the shared cache until the tokens expire anyway.
+
+    Each revocation is also appended to a numbered log in the cache, which
+    every process replays into its own bloom filters at most every
+    ``TOKEN_REVOCATION_SYNC_INTERVAL`` seconds. Filters are bucketed by token
+    expiry, so whole buckets are dropped once their tokens are dead. A token
+    missing from its bucket's filter is not revoked, without a cache lookup;
+    a hit is confirmed in the cache. Revocations from other processes take up
+    to one sync interval to be seen. A log entry that never turns up (evicted,
+    or its revoker died) could have been for any token still alive, so until
+    all of those have expired, tokens they could be fall back to the cache
+    lookup too. With ``TOKEN_REVOCATION_BLOOM`` off every check is one cache
+    lookup.
+    """
+
+    namespace = 'auth:revoked'
+
+    def __init__(self):
+        self.buckets = {}
+        self.seen = 0
+        self.missing = {}
+        self.synced_at = None
+        # Tokens expiring up to here may have lost revocations; see ``lost_entries``.
+        self.unsure_until = 0
+        self.lock = threading.Lock()
+
+    def key(self, jti):
+        return f'{self.namespace}:{jti}'
+
+    def log_key(self, sequence):
+        return f'{self.namespace}:log:{sequence}'
+
+    @property
+    def sequence_key(self):
+        return f'{self.namespace}:sequence'
+
+    def revoke(self, jti, exp):
+        """Revoke token ``jti`` until ``exp``; returns False for a token that has already expired."""
+        ttl = math.ceil(exp - time.time())
+        if ttl <= 0:
+            return False
+        cache.set(self.key(jti), 1, timeout=ttl)
+        cache.set(self.log_key(incr_counter(self.sequence_key)), (jti, exp), timeout=ttl)
+        with self.lock:
+            self.remember(jti, exp)
+        return True
+
+    def is_revoked(self, jti, exp):
+        if settings.TOKEN_REVOCATION_BLOOM:
+            self.sync()
+            bloom = self.buckets.get(self.bucket(exp))
+            if (bloom is None or jti not in bloom) and exp > self.unsure_until:
+                return False
+        return cache.get(self.key(jti)) is not None
+
+    def bucket(self, exp):
+        return int(exp) // settings.TOKEN_REVOCATION_BUCKET_SECONDS
+
+    def remember(self, jti, exp):
+        bucket = self.bucket(exp)
+        if bucket not in self.buckets:
+            self.buckets[bucket] = BloomFilter(settings.TOKEN_REVOCATION_BLOOM_CAPACITY)
+        self.buckets[bucket].add(jti)
+
+    def sync(self, force=False):
+        """Replay revocations logged since the last sync into the bloom filters."""
+        now = time.monotonic()
+        if not force and self.synced_at is not None and now - self.synced_at < settings.TOKEN_REVOCATION_SYNC_INTERVAL:
+            return
+        # Whoever holds the lock is syncing already; the rest carry on with the filters as they are.
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.synced_at = now
+            latest = cache.get(self.sequence_key, 0)
+            if latest < self.seen:
+                # The cache lost the log; start over from whatever is left of it.
+                self.buckets.clear()
+                self.missing.clear()
+                self.seen = 0
+                self.lost_entries()
+
+            wanted = [*self.missing, *range(self.seen + 1, latest + 1)]
+            for start in range(0, len(wanted), SYNC_BATCH_SIZE):
+                batch = wanted[start:start + SYNC_BATCH_SIZE]
+                entries = cache.get_many([self.log_key(sequence) for sequence in batch])
+                for sequence in batch:
+                    entry = entries.get(self.log_key(sequence))
+                    if entry is not None:
+                        self.remember(*entry)
+                        self.missing.pop(sequence, None)
+                    elif now - self.missing.setdefault(sequence, now) > LOG_ENTRY_GRACE:
+                        # Expired, evicted, or never written by a revoker that died in between.
+                        del self.missing[sequence]
+                        self.lost_entries()
+            self.seen = max(self.seen, latest)
+
+            dead = self.bucket(time.time())
+            for bucket in [bucket for bucket in self.buckets if bucket < dead]:
+                del self.buckets[bucket]
+        finally:
+            self.lock.release()
+
+    def lost_entries(self):
+        """Check the cache for every token that could have been revoked in a log entry we never read.
+
+        That is any token alive now, so any expiring within the longest token lifetime.
+        """
+        lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+        self.unsure_until = max(self.unsure_until, time.time() + lifetime.total_seconds())
+
+
+revocation_list = RevocationList()
+
+
+def revoke_token(token):
+    """Revoke a validated simplejwt ``token`` of any type."""
+    return revocation_list.revoke(token[api_settings.JTI_CLAIM], token['exp'])
+
+
+class RevocationMixin:
+    """Like simplejwt's ``BlacklistMixin``, against ``revocation_list`` instead of a table."""
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if revocation_list.is_revoked(self[api_settings.JTI_CLAIM], self['exp']):
+            raise TokenError(_('Token has been revoked'))
+
+    def revoke(self):
+        return revoke_token(self)
+
+    # The name TokenRefreshSerializer calls on the old token when rotating.
+    blacklist = revoke
+
+
+class RevocableAccessToken(RevocationMixin, AccessToken):
+    pass
+
+
+class RevocableRefreshToken(RevocationMixin, RefreshToken):
+    pass
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocableRefreshToken
@@ -0,0 +1,121 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadPin:
+    """Where the current request reads from; ``primary`` once pinned to the primary."""
+
+    __slots__ = ('primary', 'wrote')
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+
+
+# Set by ReplicaPinningMiddleware for each request; None everywhere else. Like
+# request_db_time, it holds a mutable object so writes made in the threads
+# sync_to_async runs queries on still pin the request they belong to.
+request_pin = ContextVar('request_pin', default=None)
+
+
+class ReplicaRouter:
+    """Send reads to a random ``DATABASE_REPLICAS`` alias and writes to the primary.
+
+    Only requests ``ReplicaPinningMiddleware`` has cleared read from replicas;
+    management commands, workers and anything else outside a request use the
+    primary. The first write of a request pins the rest of it to the primary.
+    Related objects are read from the database their instance came from.
+    """
+
+    def db_for_read(self, model, **hints):
+        pin = request_pin.get()
+        if pin is None or pin.primary or hints.get('instance') is not None or not settings.DATABASE_REPLICAS:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        pin = request_pin.get()
+        if pin is not None:
+            pin.primary = pin.wrote = True
+        return DEFAULT_DB_ALIAS if settings.DATABASE_REPLICAS else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def reading_from_primary():
+    """Read from the primary inside the block, even in a request cleared for replicas.
+
+    For anything filling a shared cache: an entry built from a lagging
+    replica would outlive the invalidation that was meant to retire it.
+    Works as a decorator too.
+    """
+    token = request_pin.set(None)
+    try:
+        yield
+    finally:
+        request_pin.reset(token)
+
+
+class ReplicaPinningMiddleware:
+    """Let safe requests read from replicas while each client still reads its own writes.
+
+    Unsafe methods, and clients holding the pin cookie, read from the primary.
+    A request that writes sets the cookie for ``REPLICA_PIN_SECONDS``, longer
+    than replicas are expected to lag, so the same client's next reads come
+    from the primary too. Removes itself when there are no replicas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        pin = self.pin_for(request)
+        token = request_pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_pin.reset(token)
+        return self.remember(pin, response)
+
+    async def __acall__(self, request):
+        pin = self.pin_for(request)
+        token = request_pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_pin.reset(token)
+        return self.remember(pin, response)
+
+    def pin_for(self, request):
+        return ReadPin(primary=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+
+    def remember(self, pin, response):
+        if pin.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
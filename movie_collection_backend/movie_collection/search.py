@@ -0,0 +1,253 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.expressions import RawSQL
+
+from .deferral import Deferral
+from .models import Collection, Movie, SearchTerm
+
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split()
+)
+# How much one occurrence of a term counts, per field.
+FIELDS = {
+    SearchTerm.MOVIE: {'title': 3, 'genres': 2, 'description': 1},
+    SearchTerm.COLLECTION: {'title': 3, 'description': 1},
+}
+MODELS = {SearchTerm.MOVIE: Movie, SearchTerm.COLLECTION: Collection}
+KINDS = tuple(MODELS)
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+INDEX_CHUNK_SIZE = 500
+
+_WORDS = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercased words of ``text``, minus stop words and single characters."""
+    return [
+        word[:MAX_TERM_LENGTH] for word in _WORDS.findall((text or '').lower())
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def search_backend():
+    """``'mysql'`` to search the FULLTEXT indexes, ``'index'`` for the ``SearchTerm`` table."""
+    backend = settings.SEARCH_BACKEND
+    if backend == 'auto':
+        return 'mysql' if connection.vendor == 'mysql' else 'index'
+    return backend
+
+
+def term_weights(kind, row):
+    weights = Counter()
+    for field, weight in FIELDS[kind].items():
+        for term in tokenize(row[field]):
+            weights[term] += weight
+    return weights
+
+
+def index_rows(kind, rows, new=False):
+    """Replace the index entries of ``rows``, dicts holding ``id`` and the indexed fields.
+
+    ``new`` rows were just inserted, so there are no old entries to delete.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    if not new:
+        SearchTerm.objects.filter(kind=kind, object_id__in=[row['id'] for row in rows]).delete()
+    SearchTerm.objects.bulk_create([
+        SearchTerm(kind=kind, object_id=row['id'], term=term, weight=weight)
+        for row in rows
+        for term, weight in term_weights(kind, row).items()
+    ])
+
+
+def index_objects(kind, queryset, new=False):
+    """Reindex every object in ``queryset``, ``INDEX_CHUNK_SIZE`` at a time; returns how many.
+
+    Does nothing when the database's own full-text search is in use. Bulk
+    writes skip the signals that keep the index current, so they call this.
+    """
+    if search_backend() != 'index':
+        return 0
+    indexed = 0
+    rows = queryset.order_by().values('id', *FIELDS[kind]).iterator(chunk_size=INDEX_CHUNK_SIZE)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == INDEX_CHUNK_SIZE:
+            index_rows(kind, chunk, new)
+            indexed += len(chunk)
+            chunk = []
+    index_rows(kind, chunk, new)
+    return indexed + len(chunk)
+
+
+def index_instances(kind, instances, new=False):
+    """Reindex saved model instances, without reading them back; a no-op for full-text backends."""
+    if search_backend() == 'index':
+        index_rows(kind, [
+            {'id': instance.pk, **{field: getattr(instance, field) for field in FIELDS[kind]}}
+            for instance in instances
+        ], new=new)
+
+
+def unindex(kind, ids):
+    pending = _unindexed.pending()
+    if pending is not None:
+        pending[kind].update(ids)
+        return
+    SearchTerm.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def _unindex_all(pending):
+    for kind, ids in pending.items():
+        unindex(kind, ids)
+
+
+_unindexed = Deferral('unindexed', lambda: defaultdict(set), _unindex_all)
+
+
+def deferred_unindex():
+    """Collect the ``unindex`` calls made in the block into one delete per kind at its end.
+
+    Deleting a queryset sends ``post_delete`` for every row; inside this block
+    their index entries go in a single query instead of one per row.
+    """
+    return _unindexed.block()
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from scratch; returns how many objects were indexed."""
+    if search_backend() != 'index':
+        return 0
+    SearchTerm.objects.all().delete()
+    indexed = sum(index_objects(kind, model.objects.all()) for kind, model in MODELS.items())
+    analyze_search_index()
+    return indexed
+
+
+def analyze_search_index():
+    """Refresh SQLite's statistics for the ``SearchTerm`` table after a bulk load.
+
+    Without them SQLite prefers the unique ``(kind, object_id, term)`` index,
+    which matches the ranking query's GROUP BY, and scans every posting of the
+    kind instead of looking the query's terms up. MySQL keeps its own.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {SearchTerm._meta.db_table}')
+
+
+def index_hits(query, kinds):
+    """Ranked ``(kind, object_id, score)`` rows from the ``SearchTerm`` table, as a queryset.
+
+    Scores are tf-idf: each term's field-weighted count times the log of how
+    rare it is. Objects matching more of the query's terms rank first.
+    """
+    terms = sorted(set(tokenize(query)))
+    postings = SearchTerm.objects.filter(term__in=terms, kind__in=kinds)
+    frequencies = dict(postings.order_by().values_list('term').annotate(n=Count('id')))
+    if not frequencies:
+        return None
+
+    documents = sum(MODELS[kind].objects.count() for kind in kinds)
+    if len(frequencies) == 1:
+        # One posting per object: rank the postings themselves, no grouping needed.
+        (frequency,) = frequencies.values()
+        return (
+            postings.annotate(score=F('weight') * Value(math.log(1 + documents / frequency), FloatField()))
+            .order_by('-weight', 'kind', 'object_id')
+            .values_list('kind', 'object_id', 'score')
+        )
+    score = Sum(
+        Case(
+            *[
+                When(term=term, then=F('weight') * Value(math.log(1 + documents / frequency)))
+                for term, frequency in frequencies.items()
+            ],
+            output_field=FloatField(),
+        )
+    )
+    return (
+        postings.values('kind', 'object_id')
+        .annotate(matched=Count('term'), score=score)
+        .order_by('-matched', '-score', 'kind', 'object_id')
+        .values_list('kind', 'object_id', 'score')
+    )
+
+
+# Must list the same columns, in order, as the FULLTEXT indexes from migration 0006.
+FULLTEXT_COLUMNS = {
+    SearchTerm.MOVIE: 'title, description, genres',
+    SearchTerm.COLLECTION: 'title, description',
+}
+
+
+def fulltext_matches(query, kind):
+    match = f'MATCH ({FULLTEXT_COLUMNS[kind]}) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+    return MODELS[kind].objects.annotate(score=RawSQL(match, (query,))).filter(score__gt=0)
+
+
+class SearchResults:
+    """Lazily ranked search results, sliceable and countable like a queryset.
+
+    Slices hold ``{'type', 'score', 'object'}`` dicts, with every object of
+    a page loaded in one query per kind.
+    """
+
+    def __init__(self, query, kinds=KINDS):
+        self.query = query
+        self.kinds = tuple(kinds)
+        self.backend = search_backend()
+        self._hits = None
+        self._count = None
+
+    @property
+    def hits(self):
+        if self._hits is None:
+            self._hits = index_hits(self.query, self.kinds) if self.backend == 'index' else ()
+        return self._hits
+
+    def count(self):
+        if self._count is None:
+            if self.backend == 'index':
+                self._count = self.hits.count() if self.hits is not None else 0
+            else:
+                self._count = sum(fulltext_matches(self.query, kind).count() for kind in self.kinds)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice):
+            raise TypeError('SearchResults only supports slicing')
+        if self.backend == 'index':
+            hits = list(self.hits[page]) if self.hits is not None else []
+        else:
+            hits = self.fulltext_page(page.start or 0, page.stop)
+        return self.load(hits)
+
+    def fulltext_page(self, start, stop):
+        # Every kind's best ``stop`` rows are enough to merge any page up to ``stop``.
+        hits = []
+        for kind in self.kinds:
+            ranked = fulltext_matches(self.query, kind).order_by('-score', 'id').values_list('id', 'score')
+            hits.extend((kind, object_id, score) for object_id, score in ranked[:stop])
+        hits.sort(key=lambda hit: (-hit[2], hit[0], hit[1]))
+        return hits[start:stop]
+
+    def load(self, hits):
+        ids = {kind: [object_id for hit_kind, object_id, _ in hits if hit_kind == kind] for kind in self.kinds}
+        objects = {kind: MODELS[kind].objects.in_bulk(kind_ids) for kind, kind_ids in ids.items() if kind_ids}
+        return [
+            {'type': kind, 'score': round(score, 4), 'object': objects[kind][object_id]}
+            for kind, object_id, score in hits
+            if object_id in objects.get(kind, {})
+        ]
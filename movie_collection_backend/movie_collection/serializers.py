@@ -1,6 +1,12 @@
 from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
 from rest_framework import serializers
-from .models import Collection, Movie
+from .accounts import hash_password
+from .etags import one_version_bump
+from .genres import sync_movie_genres
+from .models import Collection, Movie, SearchTerm
+from .search import index_instances
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -9,16 +15,73 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'password',)
         
     def create(self, validated_data):
-        user = User(username=validated_data['username'])
-        user.set_password(validated_data['password'])
+        user = User(username=validated_data['username'], password=hash_password(validated_data['password']))
         user.save()
         return user
 
 class MovieSerializer(serializers.ModelSerializer):
+    # Optional on input: movies taken from the upstream list keep their uuid,
+    # anything else is matched by title.
+    uuid = serializers.UUIDField(required=False)
+
     class Meta:
         model = Movie
         fields = ['uuid', 'title', 'description', 'genres']
 
+
+def bulk_create_with_ids(model, objects):
+    """``bulk_create`` ``objects`` and make sure each one comes back with its primary key."""
+    created = model.objects.bulk_create(objects)
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL doesn't hand back primary keys; fetch them by the uuids we generated.
+        ids = dict(model.objects.filter(uuid__in=[obj.uuid for obj in created]).values_list('uuid', 'id'))
+        for obj in created:
+            obj.id = ids[obj.uuid]
+    return created
+
+
+def resolve_movies(movies_data):
+    """Return a ``Movie`` for each incoming movie dict, creating missing ones in bulk.
+
+    Existing movies are found with a single lookup by uuid, or by title when
+    no uuid was given. Duplicates in ``movies_data`` resolve to the same movie.
+    """
+    uuids = {data['uuid'] for data in movies_data if data.get('uuid')}
+    titles = {data['title'] for data in movies_data if not data.get('uuid')}
+    if not uuids and not titles:
+        return []
+
+    by_uuid, by_title = {}, {}
+    for movie in Movie.objects.filter(Q(uuid__in=uuids) | Q(title__in=titles)).order_by('id'):
+        by_uuid[movie.uuid] = movie
+        by_title.setdefault(movie.title, movie)
+
+    resolved, missing = [], {}
+    for data in movies_data:
+        if data.get('uuid'):
+            movie = by_uuid.get(data['uuid'])
+            key = data['uuid']
+        else:
+            movie = by_title.get(data['title'])
+            key = data['title']
+        if movie is None:
+            movie = missing.get(key)
+        if movie is None:
+            movie = missing[key] = Movie(
+                title=data['title'],
+                description=data['description'],
+                genres=data.get('genres', ''),
+                **({'uuid': data['uuid']} if data.get('uuid') else {}),
+            )
+        resolved.append(movie)
+
+    if missing:
+        created = bulk_create_with_ids(Movie, missing.values())
+        # bulk_create skips post_save, so link the new movies to their genres and index them here.
+        sync_movie_genres((movie.id, movie.genres) for movie in created)
+        index_instances(SearchTerm.MOVIE, created, new=True)
+    return resolved
+
 class CollectionListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Collection
@@ -32,40 +95,35 @@ class CollectionSerializer(serializers.ModelSerializer):
         model = Collection
         fields = ['title', 'description', 'movies']
 
+    @transaction.atomic
     def create(self, validated_data):
         movies_data = validated_data.pop('movies', [])
 
         collection = Collection.objects.create(**validated_data)
-
-        for movie_data in movies_data:
-            movie, created = Movie.objects.get_or_create(
-                title=movie_data['title'],
-                defaults={
-                    'description': movie_data['description'],
-                    'genres': movie_data['genres']
-                }
-            )
-            collection.movies.add(movie)
+        with one_version_bump(collection, bump=False):
+            collection.movies.add(*resolve_movies(movies_data))
 
         return collection
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        movies_data = validated_data.pop('movies', [])
+        movies_data = validated_data.pop('movies', None)
 
-        instance.title = validated_data.get('title', instance.title)
-        instance.description = validated_data.get('description', instance.description)
-        instance.save()
+        with one_version_bump(instance):
+            instance.title = validated_data.get('title', instance.title)
+            instance.description = validated_data.get('description', instance.description)
+            instance.save()
 
-        instance.movies.clear()
-        
-        for movie_data in movies_data:
-            movie, created = Movie.objects.get_or_create(
-                title=movie_data['title'],
-                defaults={
-                    'description': movie_data['description'],
-                    'genres': movie_data['genres']
-                }
-            )
-            instance.movies.add(movie)
+            if movies_data is not None:
+                wanted = {movie.id for movie in resolve_movies(movies_data)}
+                current = set(instance.movies.values_list('id', flat=True))
+                if current - wanted:
+                    instance.movies.remove(*(current - wanted))
+                if wanted - current:
+                    instance.movies.add(*(wanted - current))
 
         return instance
+
+
+class MovieSyncSerializer(serializers.Serializer):
+    restart = serializers.BooleanField(required=False, default=False)
@@ -0,0 +1,155 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import user_cache
+from .deferral import Deferral
+from .etags import bump_collection_version, bump_collection_versions, forget_cached_collections
+from .genres import (
+    apply_genre_deltas, count_genres, invalidate_favourite_genres, split_genres, sync_movie_genres,
+)
+from .models import Collection, CollectionGenreCount, Movie, SearchTerm
+from .search import index_instances, unindex
+
+Membership = Collection.movies.through
+SEARCH_KINDS = {Movie: SearchTerm.MOVIE, Collection: SearchTerm.COLLECTION}
+
+
+def forget_deleted_collections(uuids):
+    # Their genre counts go with them through the cascade, without any signal of their own.
+    invalidate_favourite_genres()
+    forget_cached_collections(uuids)
+
+
+_deleted_collections = Deferral('deleted_collections', list, forget_deleted_collections)
+
+
+def deferred_collection_forget():
+    """Retire the caches of every collection deleted in the block in one go at its end.
+
+    Deleting a queryset sends ``post_delete`` for every row; inside this block
+    the favourite genres are invalidated once and the cached versions of all
+    the collections dropped with one ``delete_many``.
+    """
+    return _deleted_collections.block()
+
+
+@receiver(m2m_changed, sender=Membership)
+def update_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_remove':
+        # remove() reports every pk it was given; only count the real members.
+        field, other = ('movie_id', 'collection_id') if reverse else ('collection_id', 'movie_id')
+        instance._removed_pks = set(
+            sender.objects.filter(**{field: instance.pk, f'{other}__in': pk_set}).values_list(other, flat=True)
+        )
+        return
+    if action == 'pre_clear' and reverse:
+        instance._removed_pks = set(instance.collections.values_list('id', flat=True))
+        return
+
+    if action == 'post_add':
+        sign, pks = 1, pk_set
+    elif action in ('post_remove', 'post_clear'):
+        sign, pks = -1, instance.__dict__.pop('_removed_pks', None)
+    else:
+        return
+
+    if not reverse:
+        bump_collection_version(instance)
+    elif pks:
+        bump_collection_versions(Collection.objects.filter(pk__in=pks))
+
+    if action == 'post_clear' and not reverse:
+        CollectionGenreCount.objects.filter(collection=instance).delete()
+        invalidate_favourite_genres()
+        return
+    if not pks:
+        return
+
+    if reverse:
+        genres = Counter(split_genres(instance.genres))
+        deltas = {(collection_id, genre): sign * n for collection_id in pks for genre, n in genres.items()}
+    else:
+        genres = count_genres(Movie.objects.filter(pk__in=pks).values_list('genres', flat=True))
+        deltas = {(instance.pk, genre): sign * n for genre, n in genres.items()}
+    apply_genre_deltas(deltas)
+
+
+@receiver(pre_save, sender=Movie)
+def remember_previous_genres(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and 'genres' not in update_fields):
+        return
+    instance._previous_genres = Movie.objects.filter(pk=instance.pk).values_list('genres', flat=True).first()
+
+
+@receiver(post_save, sender=Movie)
+def update_genres_on_movie_change(sender, instance, created, raw=False, **kwargs):
+    previous = instance.__dict__.pop('_previous_genres', None)
+    if raw:
+        return
+    if not created:
+        # Collection details embed their movies, so every edit changes their ETags.
+        bump_collection_versions(instance.collections.all())
+        if previous is None or previous == instance.genres:
+            return
+
+    sync_movie_genres([(instance.pk, instance.genres)])
+    if created:
+        return
+
+    change = Counter(split_genres(instance.genres))
+    change.subtract(split_genres(previous))
+    collection_ids = list(instance.collections.values_list('id', flat=True))
+    apply_genre_deltas({
+        (collection_id, genre): n for collection_id in collection_ids for genre, n in change.items()
+    })
+
+
+@receiver(pre_delete, sender=Movie)
+def update_genre_counts_on_movie_delete(sender, instance, **kwargs):
+    # Deleting a movie cascades to the membership rows without sending m2m_changed.
+    genres = Counter(split_genres(instance.genres))
+    collection_ids = list(instance.collections.values_list('id', flat=True))
+    if collection_ids:
+        bump_collection_versions(Collection.objects.filter(pk__in=collection_ids))
+    apply_genre_deltas({
+        (collection_id, genre): -n for collection_id in collection_ids for genre, n in genres.items()
+    })
+
+
+@receiver(post_save, sender=Collection)
+def bump_version_on_collection_change(sender, instance, created, raw=False, **kwargs):
+    if not (created or raw):
+        bump_collection_version(instance)
+
+
+@receiver(post_delete, sender=Collection)
+def forget_deleted_collection_genres(sender, instance, **kwargs):
+    pending = _deleted_collections.pending()
+    if pending is not None:
+        pending.append(instance.uuid)
+        return
+    forget_deleted_collections([instance.uuid])
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Collection)
+def update_search_index(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        index_instances(SEARCH_KINDS[sender], [instance], new=created)
+
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Collection)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes too; both are saves.
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
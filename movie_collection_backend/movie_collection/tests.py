@@ -1,9 +1,67 @@
-from django.urls import reverse
-from django.test import TestCase, Client
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+import requests
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import user_logged_in, user_login_failed
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.test import (
+    AsyncClient, AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, Client, RequestFactory,
+    override_settings,
+)
 from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.handlers.asgi import ASGIHandler
+from django.db import IntegrityError, connection, connections, transaction
+from django.test.client import MULTIPART_CONTENT
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from rest_framework_simplejwt.models import TokenUser
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Movie, Collection
+from .accounts import hashing_executor, in_hashing_pool
+from .authentication import user_cache
+from .benchmarks.load import BENCH_USERNAME, bench_rows, summarise
+from .benchmarks.upstream import FakeUpstream
+from .caching import CollectionDetailCache, UpstreamPageCache, asingle_flight, single_flight
+from .catalog import upsert_movies
+from .checks import check_shared_cache
+from .deferral import Deferral
+from .etags import cached_collection_version, forget_cached_collections, remember_collection_etag
+from .exports import read_chunk, stream_collections
+from .jobs import Worker, claim, enqueue, job, requeue_expired
+from .metrics import Histogram, registry
+from .middleware import (
+    RETIRED_EPOCH_TTL, UNMATCHED_ROUTE, UNNAMED_ROUTE, MetricsMiddleware, RequestCounter,
+    RequestCounterMiddleware, request_counter,
+)
+from .models import CatalogSyncState, CollectionGenreCount, Genre, Job, Movie, Collection, SearchTerm
+from .pagination import CollectionCursorPagination
+from .profiling import PROFILE_HEADER, QueryBudgetExceeded, query_budget, query_shape
+from .renderers import FastJSONParser, FastJSONRenderer, orjson
+from .revocation import BloomFilter, RevocationList, revocation_list, revoke_token
+from .routers import PIN_COOKIE, ReplicaRouter
+from .search import fulltext_matches, term_weights
+from .serializers import CollectionListSerializer, UserSerializer
+from .upstream import CircuitBreaker, UpstreamError, circuit, get_client
+from .utils import afetch_movies, fetch_movies
+from .views import AsyncMovieListView, AsyncUserLoginView, AsyncUserRegistrationView, MovieListView
+
 
 class UserTests(TestCase):
     def setUp(self):
@@ -39,6 +97,315 @@ class UserTests(TestCase):
         self.assertIn('error', response.data)
 
 
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_superuser(username='cached', password='cached')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.url = reverse('metrics')
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_backs_the_local_one(self):
+        self.client.get(self.url)
+        user_cache.clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    @override_settings(JWT_USER_CACHE_LOCAL_TTL=0)
+    def test_local_entries_expire(self):
+        self.client.get(self.url)
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_saving_or_deleting_the_user_invalidates_it(self):
+        self.client.get(self.url)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_callers_get_their_own_copy(self):
+        first = user_cache.get(self.user.pk)
+        first.username = 'changed'
+
+        self.assertEqual(user_cache.get(self.user.pk).username, 'cached')
+
+    def test_lru_is_bounded(self):
+        others = [User.objects.create_user(username=f'lru{i}') for i in range(3)]
+        with override_settings(JWT_USER_CACHE_SIZE=2):
+            for user in others:
+                user_cache.get(user.pk)
+
+        self.assertEqual(list(user_cache.entries), [str(others[1].pk), str(others[2].pk)])
+
+    def test_entries_hold_no_password_hash(self):
+        user_cache.get(self.user.pk)
+
+        entry = cache.get(user_cache.key(self.user.pk))
+        self.assertNotIn('password', entry)
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_deactivated_users_lose_collection_access(self):
+        url = reverse('collection-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_claims_only_endpoints_load_no_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('search'), {'q': 'heat'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries))
+        self.assertIsInstance(response.wsgi_request.user, TokenUser)
+        self.assertEqual(response.wsgi_request.user.id, str(self.user.pk))
+
+
+class AsyncAccountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='async', password='secret')
+
+    async def post(self, view, data, content_type='application/json'):
+        body = json.dumps(data) if content_type == 'application/json' else data
+        request = AsyncRequestFactory().post('/', body, content_type=content_type)
+        return await view.as_view()(request)
+
+    async def test_login_issues_one_token_pair(self):
+        response = await self.post(AsyncUserLoginView, {'username': 'async', 'password': 'secret'})
+        body = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(body['message'], 'async is logged in')
+        self.assertEqual(response.cookies['access'].value, body['access_token'])
+        self.assertEqual(response.cookies['refresh'].value, body['refresh_token'])
+        self.assertEqual(RefreshToken(body['refresh_token'])['user_id'], str(self.user.pk))
+
+    async def test_login_accepts_form_data(self):
+        response = await self.post(AsyncUserLoginView, {'username': 'async', 'password': 'secret'}, MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_login_rejects_bad_credentials(self):
+        await User.objects.filter(pk=self.user.pk).aupdate(is_active=False)
+        attempts = [
+            {'username': 'async', 'password': 'secret'},
+            {'username': 'async', 'password': 'wrong'},
+            {'username': 'nobody', 'password': 'secret'},
+            {'username': 'async'},
+        ]
+        for data in attempts:
+            with self.subTest(data=data):
+                response = await self.post(AsyncUserLoginView, data)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+                self.assertIn('error', json.loads(response.content))
+
+    async def test_login_upgrades_outdated_hashes(self):
+        await User.objects.filter(pk=self.user.pk).aupdate(password=make_password('secret', hasher='pbkdf2_sha1'))
+
+        response = await self.post(AsyncUserLoginView, {'username': 'async', 'password': 'secret'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user = await User.objects.aget(pk=self.user.pk)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    async def test_registration(self):
+        response = await self.post(AsyncUserRegistrationView, {'username': 'fresh', 'password': 'pw'})
+        duplicate = await self.post(AsyncUserRegistrationView, {'username': 'fresh', 'password': 'pw'})
+        broken = await self.post(AsyncUserRegistrationView, '{"username": ', 'application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.cookies['access'].value, json.loads(response.content)['access_token'])
+        user = await User.objects.aget(username='fresh')
+        self.assertTrue(await sync_to_async(user.check_password)('pw'))
+        self.assertEqual(duplicate.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', json.loads(duplicate.content))
+        self.assertEqual(broken.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_hashing_runs_in_the_bounded_pool(self):
+        name = in_hashing_pool(lambda: threading.current_thread().name)
+
+        self.assertTrue(name.startswith('password-hashing'))
+        self.assertEqual(hashing_executor()._max_workers, settings.PASSWORD_HASHING_WORKERS)
+
+    async def test_login_and_registration_take_the_standard_paths(self):
+        received, hashed_in = [], []
+
+        def receiver(signal, **kwargs):
+            received.append(signal)
+
+        def make_password_spy(raw_password):
+            hashed_in.append(threading.current_thread().name)
+            return make_password(raw_password)
+
+        user_logged_in.connect(receiver)
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_logged_in.disconnect, receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        create = mock.patch('movie_collection.serializers.UserSerializer.create', autospec=True,
+                            side_effect=UserSerializer.create)
+        with create as serializer_create, \
+                mock.patch('movie_collection.accounts.make_password', side_effect=make_password_spy):
+            await self.post(AsyncUserLoginView, {'username': 'async', 'password': 'wrong'})
+            await self.post(AsyncUserLoginView, {'username': 'nobody', 'password': 'secret'})
+            await self.post(AsyncUserLoginView, {'username': 'async', 'password': 'secret'})
+            await self.post(AsyncUserRegistrationView, {'username': 'fresh', 'password': 'pw'})
+
+        self.assertEqual(received, [user_login_failed, user_login_failed, user_logged_in])
+        serializer_create.assert_called_once()
+        # The unknown username's decoy hash and the new account's password.
+        self.assertEqual(len(hashed_in), 2)
+        self.assertTrue(all(name.startswith('password-hashing') for name in hashed_in))
+        user = await User.objects.aget(pk=self.user.pk)
+        self.assertIsNotNone(user.last_login)
+
+    def test_sync_views_issue_one_token_pair(self):
+        login = self.client.post(reverse('login'), {'username': 'async', 'password': 'secret'})
+        registration = self.client.post(reverse('register'), {'username': 'fresh', 'password': 'pw'})
+
+        self.assertEqual(login.cookies['access'].value, login.data['access_token'])
+        self.assertEqual(login.cookies['refresh'].value, login.data['refresh_token'])
+        self.assertEqual(registration.cookies['access'].value, registration.data['access_token'])
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocation_list.__init__()
+        self.user = User.objects.create_superuser(username='revoked', password='revoked')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = str(self.refresh.access_token)
+
+    def get_metrics(self, access):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh_with(self, refresh):
+        self.client.cookies['refresh'] = refresh
+        return self.client.post(reverse('token_refresh'), {}, content_type='application/json')
+
+    def test_logout_revokes_presented_tokens(self):
+        self.assertEqual(self.get_metrics(self.access).status_code, status.HTTP_200_OK)
+        self.client.cookies['refresh'] = str(self.refresh)
+
+        response = self.client.post(reverse('logout'), HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_metrics(self.access).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh_with(str(self.refresh)).status_code, status.HTTP_401_UNAUTHORIZED)
+        # Tokens that were never presented stay valid.
+        self.assertEqual(self.get_metrics(str(self.refresh.access_token)).status_code, status.HTTP_200_OK)
+
+    def test_logout_ignores_unusable_tokens(self):
+        self.client.cookies['access'] = 'not-a-token'
+
+        response = self.client.post(reverse('logout'), HTTP_AUTHORIZATION='Bearer expired.or.forged')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_rotates_and_revokes_the_old_token(self):
+        response = self.refresh_with(str(self.refresh))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rotated = response.cookies['refresh'].value
+        self.assertNotEqual(rotated, str(self.refresh))
+        self.assertEqual(self.get_metrics(response.data['access_token']).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.refresh_with(str(self.refresh)).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh_with(rotated).status_code, status.HTTP_200_OK)
+
+    def test_unrevoked_checks_skip_the_cache(self):
+        token = self.refresh.access_token
+        revoke_token(RefreshToken.for_user(self.user).access_token)
+        revocation_list.sync(force=True)
+
+        with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            self.assertFalse(revocation_list.is_revoked(token['jti'], token['exp']))
+            with override_settings(TOKEN_REVOCATION_BLOOM=False):
+                self.assertFalse(revocation_list.is_revoked(token['jti'], token['exp']))
+
+        self.assertEqual(cache_get.call_count, 1)
+
+    def test_other_processes_pick_up_revocations(self):
+        other = RevocationList()
+        other.sync(force=True)
+        token = self.refresh.access_token
+
+        revoke_token(token)
+        self.assertFalse(other.is_revoked(token['jti'], token['exp']))
+
+        other.sync(force=True)
+        self.assertTrue(other.is_revoked(token['jti'], token['exp']))
+
+    def test_late_log_entries_are_retried(self):
+        other = RevocationList()
+        exp = time.time() + 60
+        cache.set(revocation_list.sequence_key, 1)
+        other.sync(force=True)
+        self.assertEqual(list(other.missing), [1])
+
+        cache.set(revocation_list.key('late'), 1)
+        cache.set(revocation_list.log_key(1), ('late', exp))
+        other.sync(force=True)
+
+        self.assertTrue(other.is_revoked('late', exp))
+        self.assertEqual(other.missing, {})
+
+    def test_lost_log_entries_fall_back_to_the_cache(self):
+        other = RevocationList()
+        other.sync(force=True)
+        token = self.refresh.access_token
+        revoke_token(token)
+        # Evicted before the other process read it.
+        cache.delete(revocation_list.log_key(1))
+        other.sync(force=True)
+        with mock.patch('movie_collection.revocation.time.monotonic', return_value=time.monotonic() + 60):
+            other.sync(force=True)
+
+        self.assertEqual(other.missing, {})
+        self.assertTrue(other.is_revoked(token['jti'], token['exp']))
+        # Tokens expiring after every possibly-lost one still skip the cache.
+        with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            self.assertFalse(other.is_revoked('fresh', other.unsure_until + 1))
+        self.assertFalse(cache_get.called)
+
+    def test_expired_buckets_are_dropped(self):
+        revocation_list.revoke('old', time.time() + 1)
+        revocation_list.revoke('new', time.time() + 3600)
+        self.assertFalse(revocation_list.revoke('dead', time.time() - 1))
+
+        with mock.patch('movie_collection.revocation.time.time', return_value=time.time() + 900):
+            revocation_list.sync(force=True)
+
+        self.assertEqual(list(revocation_list.buckets), [revocation_list.bucket(time.time() + 3600)])
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        members = [str(uuid.uuid4()) for _ in range(1000)]
+        for member in members:
+            bloom.add(member)
+
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
 class CollectionTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -126,6 +493,7 @@ class CollectionTests(TestCase):
         self.assertEqual(Collection.objects.count(), 0)
 
 
+@override_settings(REQUEST_COUNTER_FLUSH_INTERVAL=0)
 class RequestCountTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -150,6 +518,198 @@ class RequestCountTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'request count reset successfully')
 
+    def test_counts_are_broken_down_by_route_and_status(self):
+        request_counter.reset()
+        self.client.get(reverse('collection-list'))
+        self.client.get(reverse('collection-list'))
+        self.client.get(reverse('collection-detail', args=[uuid.uuid4()]))
+        self.client.get('/no-such-page/')
+
+        response = self.client.get(self.request_count_url)
+
+        self.assertEqual(response.data['requests'], 4)
+        self.assertEqual(response.data['routes']['collection-list'], {'2xx': 2})
+        self.assertEqual(response.data['routes']['collection-detail'], {'4xx': 1})
+        self.assertEqual(response.data['routes'][UNMATCHED_ROUTE], {'4xx': 1})
+
+    def test_unnamed_routes_are_reported_together(self):
+        request_counter.reset()
+        self.client.get(reverse('collection-list'))
+        # The admin's catch-all view has no route name.
+        self.client.get('/admin/no-such-page/')
+
+        count, routes = request_counter.reset()
+
+        self.assertEqual(sum(routes[UNNAMED_ROUTE].values()), 1)
+        self.assertEqual(count, sum(sum(classes.values()) for classes in routes.values()))
+        self.assertEqual(request_counter.breakdown()[0], 0)
+
+    def test_reset_returns_counts_and_starts_over(self):
+        request_counter.reset()
+        self.client.get(reverse('collection-list'))
+
+        reset = self.client.post(self.reset_request_count_url)
+        after = self.client.get(self.request_count_url)
+
+        self.assertEqual(reset.data['requests'], 1)
+        self.assertEqual(reset.data['routes'], {'collection-list': {'2xx': 1}})
+        # Only the reset request itself lands in the new epoch.
+        self.assertEqual(after.data['routes'], {'reset_request_count': {'2xx': 1}})
+
+    def test_counts_are_buffered_between_flushes(self):
+        request_counter.reset()
+        self.client.get(reverse('collection-list'))
+        self.client.get(reverse('collection-list'))
+        self.assertEqual(request_counter.breakdown()[0], 0)
+
+        request_counter.flush()
+        self.assertEqual(request_counter.breakdown()[0], 2)
+
+    @override_settings(REQUEST_COUNTER_FLUSH_INTERVAL=0.01)
+    def test_idle_workers_still_publish_their_counts(self):
+        request_counter.reset()
+        counter = RequestCounter()
+        with mock.patch('movie_collection.middleware.atexit') as at_exit, \
+                mock.patch('movie_collection.middleware.os.register_at_fork'):
+            counter.start()
+            counter.start()
+        at_exit.register.assert_called_once_with(counter.flush)
+
+        counter.record('collection-list', 200)
+        deadline = time.monotonic() + 5
+        while counter.breakdown()[0] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(counter.breakdown()[1], {'collection-list': {'2xx': 1}})
+
+    def test_a_flush_overtaken_by_a_reset_moves_to_the_new_epoch(self):
+        request_counter.reset()
+        request_counter.record('collection-list', 200)
+        old_epoch = cache.get(RequestCounter.epoch_key)
+        publish = request_counter.publish
+        reports = []
+
+        def reset_first(epoch, pending):
+            # The reset reads and drops the old epoch before this flush's ``incr`` lands.
+            if not reports:
+                reports.append(request_counter.reset())
+            publish(epoch, pending)
+
+        with mock.patch.object(request_counter, 'publish', side_effect=reset_first), \
+                mock.patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            request_counter.flush()
+
+        self.assertEqual(reports[0], (0, {}))
+        self.assertEqual(request_counter.breakdown()[1], {'collection-list': {'2xx': 1}})
+        touch.assert_called_once_with(
+            request_counter.key(old_epoch, 'collection-list', '2xx'), RETIRED_EPOCH_TTL,
+        )
+
+    async def test_async_requests_are_counted_on_the_event_loop(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        path = reverse('movie-list')
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+        middleware = RequestCounterMiddleware(get_response)
+        await sync_to_async(request_counter.reset)()
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(request)
+
+        await sync_to_async(request_counter.flush)()
+        routes = (await sync_to_async(request_counter.breakdown)())[1]
+        self.assertEqual(routes, {'movie-list': {'2xx': 1}})
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.metrics_url = reverse('metrics')
+        self.user = User.objects.create_superuser(username='admin', password='admin')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        registry.reset()
+
+    def test_histogram_quantiles_come_from_buckets(self):
+        histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+        for value in [0.005] * 50 + [0.05] * 45 + [0.5] * 5:
+            histogram.observe(value)
+
+        self.assertLessEqual(histogram.quantile(0.5), 0.01)
+        self.assertTrue(0.01 < histogram.quantile(0.95) <= 0.1)
+        self.assertTrue(0.1 < histogram.quantile(0.99) <= 1.0)
+
+    def test_views_report_latency_db_and_serializer_time(self):
+        Collection.objects.create(title='Favourites', description='')
+        self.client.get(reverse('collection-list'))
+
+        response = self.client.get(self.metrics_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="collection-list"} 1', body)
+        self.assertIn('http_request_duration_seconds_quantile{view="collection-list",quantile="0.99"}', body)
+        self.assertIn('http_request_db_seconds_count{view="collection-list"} 1', body)
+        self.assertIn('serializer_duration_seconds_count{serializer="CollectionListSerializer"} 1', body)
+
+    def test_every_sample_belongs_to_its_declared_family(self):
+        registry.observe('http_request_duration_seconds', 0.01, view='movie-list')
+
+        families = {}
+        family = None
+        for line in registry.render().splitlines():
+            if line.startswith('# TYPE '):
+                family, kind = line.split()[2:]
+                families[family] = kind
+            elif not line.startswith('#'):
+                suffixes = ('_bucket', '_sum', '_count') if families[family] == 'histogram' else ('',)
+                metric = line.split('{')[0].split()[0]
+                self.assertIn(metric, [family + suffix for suffix in suffixes], line)
+
+        self.assertEqual(families['http_request_duration_seconds'], 'histogram')
+        self.assertEqual(families['http_request_duration_seconds_quantile'], 'gauge')
+
+    def test_fetch_movies_is_timed(self):
+        with FakeUpstream(movie_count=5) as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            fetch_movies(1)
+
+        body = registry.render()
+        self.assertIn('upstream_fetch_duration_seconds_count 1', body)
+        self.assertIn('upstream_attempt_duration_seconds_count{outcome="ok"} 1', body)
+
+    def test_metrics_are_admin_only(self):
+        user = User.objects.create_user(username='viewer', password='viewer')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+
+        response = self.client.get(self.metrics_url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_middleware_only_touches_the_cache_when_flushing(self):
+        # Timing lives in ``manage.py benchmark metrics``; this pins the behaviour
+        # that keeps it cheap: requests only touch process-local state.
+        path = reverse('movie-list')
+        request = RequestFactory().get(path)
+        request.resolver_match = resolve(path)
+        middleware = MetricsMiddleware(RequestCounterMiddleware(lambda request: HttpResponse()))
+        request_counter.flush()
+
+        with mock.patch('movie_collection.middleware.incr_counter') as incr, \
+                mock.patch('movie_collection.middleware.cache') as shared_cache:
+            shared_cache.get.return_value = 0
+            for _ in range(100):
+                middleware(request)
+            self.assertFalse(incr.called)
+            self.assertFalse(shared_cache.method_calls)
+
+            request_counter.flush()
+
+        incr.assert_called_once_with('request_count:0:movie-list:2xx', 100)
+        self.assertEqual(registry.histogram('http_request_duration_seconds', view='movie-list').count, 100)
+        self.assertEqual(registry.histogram('http_request_db_seconds', view='movie-list').count, 100)
+
 
 class MovieTests(TestCase):
     def setUp(self):
@@ -161,3 +721,1758 @@ class MovieTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('results', response.data)
         self.assertIsInstance(response.data['results'], list)
+
+
+class UpstreamClientTests(SimpleTestCase):
+    def fake_settings(self, upstream, **overrides):
+        options = {
+            'EXTERNAL_API_URL': upstream.url,
+            'EXTERNAL_API_BACKOFF_BASE': 0.01,
+            'EXTERNAL_API_BACKOFF_MAX': 0.02,
+        }
+        options.update(overrides)
+        return override_settings(**options)
+
+    def test_fetch_movies_from_upstream(self):
+        with FakeUpstream(movie_count=15) as upstream, self.fake_settings(upstream):
+            movies = fetch_movies(2)
+
+        self.assertEqual(movies['count'], 15)
+        self.assertEqual(len(movies['data']), 5)
+        self.assertIsNone(movies['next'])
+
+    def test_connections_are_reused(self):
+        with FakeUpstream() as upstream, self.fake_settings(upstream):
+            for page in (1, 2, 3):
+                fetch_movies(page)
+
+        self.assertEqual(upstream.requests, 3)
+        self.assertEqual(len(upstream.connections), 1)
+
+    def test_retries_server_errors(self):
+        with FakeUpstream(failures=[503, 502]) as upstream, self.fake_settings(upstream):
+            response = get_client().get_json(params={'page': 1})
+
+        self.assertEqual([a.status_code for a in response.attempts], [503, 502, 200])
+        self.assertTrue(all(a.elapsed >= 0 for a in response.attempts))
+
+    def test_client_errors_are_not_retried(self):
+        with FakeUpstream(failures=[404]) as upstream, self.fake_settings(upstream):
+            with self.assertRaises(UpstreamError) as ctx:
+                get_client().get_json(params={'page': 1})
+
+        self.assertEqual(len(ctx.exception.attempts), 1)
+        self.assertEqual(upstream.requests, 1)
+
+    def test_deadline_bounds_slow_upstream(self):
+        with FakeUpstream(latency=0.5) as upstream, self.fake_settings(
+            upstream, EXTERNAL_API_READ_TIMEOUT=5, EXTERNAL_API_DEADLINE=0.2
+        ):
+            started = time.monotonic()
+            self.assertIsNone(fetch_movies(1))
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.45)
+
+
+class UpstreamPageCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.fetched = threading.Event()
+
+    def fetch(self, page):
+        self.calls += 1
+        time.sleep(0.05)
+        self.fetched.set()
+        return {'count': 1, 'next': None, 'previous': None, 'data': [{'page': page, 'call': self.calls}]}
+
+    def test_second_read_is_a_hit(self):
+        page_cache = UpstreamPageCache(fetch=self.fetch, ttl=60, stale_ttl=60)
+
+        first = page_cache.get(1)
+        second = page_cache.get(1)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(UpstreamPageCache.stats.snapshot(), {'hit': 1, 'miss': 1, 'stale': 0, 'fallback': 0})
+
+    def test_concurrent_misses_fetch_once(self):
+        page_cache = UpstreamPageCache(fetch=self.fetch, ttl=60, stale_ttl=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(page_cache.get(3))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        page_cache = UpstreamPageCache(fetch=self.fetch, ttl=0, stale_ttl=60)
+        first = page_cache.get(1)
+        self.fetched.clear()
+
+        stale = page_cache.get(1)
+
+        self.assertEqual(stale, first)
+        self.assertTrue(self.fetched.wait(2))
+        self.assertEqual(UpstreamPageCache.stats.snapshot()['stale'], 1)
+
+    def test_failed_fetch_is_not_cached(self):
+        page_cache = UpstreamPageCache(fetch=lambda page: None, ttl=60, stale_ttl=60)
+
+        self.assertIsNone(page_cache.get(1))
+        self.assertIsNone(cache.get(page_cache.key(1)))
+
+
+class MovieCacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_superuser(username='admin', password='admin')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    def test_movie_list_is_served_from_cache(self):
+        with FakeUpstream() as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            self.client.get(reverse('movie-list'), {'page': 2})
+            response = self.client.get(reverse('movie-list'), {'page': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(upstream.requests, 1)
+        stats = self.client.get(reverse('movie-cache-stats')).data
+        self.assertEqual((stats['hit'], stats['miss']), (1, 1))
+
+
+class AsyncMovieListTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_sync(self, page):
+        request = RequestFactory().get('/movies/', {'page': page})
+        response = MovieListView.as_view()(request)
+        response.render()
+        return json.loads(response.content)
+
+    async def get_async(self, page):
+        request = AsyncRequestFactory().get('/movies/', {'page': page})
+        response = await AsyncMovieListView.as_view()(request)
+        return json.loads(response.content)
+
+    async def test_async_view_matches_sync_view(self):
+        with FakeUpstream(movie_count=25) as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            async_body = await self.get_async(2)
+            await cache.aclear()
+            sync_body = await sync_to_async(self.get_sync)(2)
+
+        self.assertEqual(async_body, sync_body)
+        self.assertEqual(len(async_body['results']), 10)
+        self.assertTrue(async_body['next'].endswith('?page=3'))
+
+    async def test_async_view_overlaps_upstream_waits(self):
+        # Under ASGI, sync views share one thread, so their upstream waits queue
+        # up behind each other; the async view keeps them all in flight at once.
+        pages = range(1, 11)
+        with FakeUpstream(movie_count=100, latency=0.2) as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            started = time.monotonic()
+            await asyncio.gather(*(sync_to_async(self.get_sync)(page) for page in pages))
+            sync_elapsed = time.monotonic() - started
+
+            await cache.aclear()
+            started = time.monotonic()
+            bodies = await asyncio.gather(*(self.get_async(page) for page in pages))
+            async_elapsed = time.monotonic() - started
+
+        self.assertEqual(len({body['results'][0]['uuid'] for body in bodies}), len(pages))
+        self.assertEqual(upstream.requests, 2 * len(pages))
+        self.assertLess(async_elapsed * 3, sync_elapsed)
+
+    async def test_async_view_reports_upstream_failure(self):
+        with FakeUpstream(failures=[404]) as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            request = AsyncRequestFactory().get('/movies/')
+            response = await AsyncMovieListView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@override_settings(EXTERNAL_API_BACKOFF_BASE=0.01, EXTERNAL_API_BACKOFF_MAX=0.02)
+class SyncMoviesTests(TestCase):
+    def sync(self, upstream, **options):
+        with override_settings(EXTERNAL_API_URL=upstream.url):
+            call_command('sync_movies', stdout=StringIO(), **options)
+
+    def test_sync_mirrors_every_page(self):
+        with FakeUpstream(movie_count=45) as upstream:
+            self.sync(upstream, concurrency=3)
+
+        self.assertEqual(Movie.objects.count(), 45)
+        self.assertEqual(sorted(upstream.pages_requested), [1, 2, 3, 4, 5])
+        movie = Movie.objects.get(uuid=upstream.movies[12]['uuid'])
+        self.assertEqual(movie.title, 'Upstream Movie 12')
+
+    def test_resync_updates_rows_in_place(self):
+        with FakeUpstream(movie_count=15) as upstream:
+            self.sync(upstream)
+            upstream.movies[3]['title'] = 'Renamed'
+            self.sync(upstream)
+
+        self.assertEqual(Movie.objects.count(), 15)
+        self.assertEqual(Movie.objects.get(uuid=upstream.movies[3]['uuid']).title, 'Renamed')
+
+    def test_interrupted_sync_resumes_from_checkpoint(self):
+        with FakeUpstream(movie_count=50, broken_pages={3}) as upstream:
+            with self.assertRaises(CommandError):
+                self.sync(upstream, concurrency=2)
+            self.assertEqual(Movie.objects.count(), 20)
+            self.assertEqual(CatalogSyncState.objects.get().next_page, 3)
+
+            upstream.broken_pages.clear()
+            upstream.pages_requested.clear()
+            self.sync(upstream, concurrency=2)
+
+        self.assertEqual(Movie.objects.count(), 50)
+        self.assertEqual(sorted(upstream.pages_requested), [3, 4, 5])
+        state = CatalogSyncState.objects.get()
+        self.assertEqual(state.next_page, 1)
+        self.assertIsNotNone(state.last_completed_at)
+
+    @override_settings(MOVIE_LIST_SOURCE='local')
+    def test_movie_list_served_from_local_table(self):
+        with FakeUpstream(movie_count=25) as upstream:
+            self.sync(upstream)
+            upstream.requests = 0
+            response = self.client.get(reverse('movie-list'), {'page': 3})
+
+        self.assertEqual(upstream.requests, 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['results'], upstream.movies[20:])
+        self.assertIsNone(response.data['next'])
+
+    @override_settings(MOVIE_LIST_SOURCE='local')
+    def test_local_pages_seek_the_catalog_index(self):
+        with FakeUpstream(movie_count=45) as upstream:
+            self.sync(upstream)
+        # Movies added by users are not part of the catalog.
+        Movie.objects.create(title='Home movie', description='d', genres='Drama')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('movie-list'), {'page': 4})
+
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(response.data['results'], upstream.movies[30:40])
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+
+    @override_settings(MOVIE_LIST_SOURCE='local')
+    def test_resync_follows_upstream_order_and_removals(self):
+        with FakeUpstream(movie_count=15) as upstream:
+            self.sync(upstream)
+            upstream.movies.reverse()
+            del upstream.movies[-3:]
+            self.sync(upstream)
+
+        response = self.client.get(reverse('movie-list'), {'page': 2})
+
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(response.data['results'], upstream.movies[10:])
+
+    def test_movie_list_rejects_bad_pages(self):
+        for page in ('0', '-1', 'two'):
+            with self.subTest(page=page):
+                response = self.client.get(reverse('movie-list'), {'page': page})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Queries per collection write, with the user already cached, when every insert
+# fits in one batch: savepoint, the collection row, one movie lookup, bulk movie,
+# genre, search term and link inserts, genre count maintenance and release;
+# updates add the collection lookup, reindexing it, one version bump, the
+# membership diff and the response body. None depend on the number of movies.
+CREATE_QUERIES = 16
+UPDATE_QUERIES = 26
+
+
+class CollectionWriteQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='writer')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        user_cache.get(self.user.pk)
+
+    def movies_payload(self, count, prefix='Movie'):
+        return [
+            {'title': f'{prefix} {i}', 'description': f'Description {i}', 'genres': 'Drama'}
+            for i in range(count)
+        ]
+
+    def insert_batches(self, rows, fields):
+        return -(-rows // connection.ops.bulk_batch_size(fields, [None] * rows))
+
+    def assertWriteQueries(self, count, base, method, url, payload, **batch_sizes):
+        # Bulk inserts are split by the backend's parameter limit, so only the
+        # number of batches may grow with the payload, never one query per movie.
+        # Each table inserts ``count`` rows unless given as ``(fields, rows)``.
+        expected = base
+        for fields in batch_sizes.values():
+            fields, rows = fields if isinstance(fields, tuple) else (fields, count)
+            expected += self.insert_batches(rows, fields) - 1
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, payload, content_type='application/json')
+        self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_201_CREATED))
+        self.assertEqual(len(queries), expected, [q['sql'][:80] for q in queries])
+
+    def test_create_query_count_is_flat(self):
+        for count in (1, 100, 1000):
+            with self.subTest(count=count):
+                movies = self.movies_payload(count, f'M{count}')
+                search_terms = sum(len(term_weights(SearchTerm.MOVIE, movie)) for movie in movies)
+                self.assertWriteQueries(
+                    count, CREATE_QUERIES, 'post', reverse('collection-list'),
+                    {'title': f'C{count}', 'description': 'd', 'movies': movies},
+                    movies=['uuid', 'title', 'description', 'genres', 'catalog_position'],
+                    links=['collection', 'movie'],
+                    genre_links=['genre', 'movie'],
+                    search_terms=(['kind', 'object_id', 'term', 'weight'], search_terms),
+                )
+                collection = Collection.objects.get(title=f'C{count}')
+                self.assertEqual(collection.movies.count(), count)
+
+    def test_update_only_touches_changed_rows(self):
+        for count in (1, 100, 1000):
+            with self.subTest(count=count):
+                movies = self.movies_payload(count, f'U{count}')
+                response = self.client.post(
+                    reverse('collection-list'),
+                    {'title': f'U{count}', 'description': 'd', 'movies': movies},
+                    content_type='application/json',
+                )
+                url = reverse('collection-detail', args=[response.data['collection_uuid']])
+                replaced = movies[:-1] + self.movies_payload(1, f'New{count}')
+
+                self.assertWriteQueries(
+                    count, UPDATE_QUERIES, 'put', url,
+                    {'title': f'U{count}', 'description': 'd', 'movies': replaced},
+                )
+                titles = set(Collection.objects.get(title=f'U{count}').movies.values_list('title', flat=True))
+                self.assertEqual(titles, {movie['title'] for movie in replaced})
+
+    def test_existing_movies_are_reused(self):
+        existing = Movie.objects.create(title='Known', description='d', genres='Drama')
+        payload = [
+            {'title': 'Known', 'description': 'd', 'genres': 'Drama'},
+            {'uuid': str(existing.uuid), 'title': 'Known', 'description': 'd', 'genres': 'Drama'},
+            {'title': 'Fresh', 'description': 'd', 'genres': 'Comedy'},
+            {'title': 'Fresh', 'description': 'd', 'genres': 'Comedy'},
+        ]
+        response = self.client.post(
+            reverse('collection-list'),
+            {'title': 'Reuse', 'description': 'd', 'movies': payload},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertEqual(Collection.objects.get(title='Reuse').movies.count(), 2)
+
+    def test_update_without_movies_keeps_membership(self):
+        collection = Collection.objects.create(title='Keep', description='d')
+        collection.movies.add(Movie.objects.create(title='Stay', description='d', genres=''))
+
+        response = self.client.put(
+            reverse('collection-detail', args=[collection.uuid]),
+            {'title': 'Renamed'},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(collection.movies.count(), 1)
+
+
+class GenreCountTests(TestCase):
+    def setUp(self):
+        self.action = Movie.objects.create(title='A', description='d', genres='Action,Drama')
+        self.comedy = Movie.objects.create(title='B', description='d', genres='Comedy, Drama')
+        self.thriller = Movie.objects.create(title='C', description='d', genres='Thriller')
+        self.collection = Collection.objects.create(title='Mine', description='d')
+
+    def counts(self, collection=None):
+        collection = collection or self.collection
+        return dict(collection.genre_counts.values_list('genre', 'count'))
+
+    def test_add_and_remove_update_counts(self):
+        self.collection.movies.add(self.action, self.comedy)
+        self.assertEqual(self.counts(), {'Action': 1, 'Drama': 2, 'Comedy': 1})
+
+        self.collection.movies.remove(self.action, self.thriller)
+        self.assertEqual(self.counts(), {'Drama': 1, 'Comedy': 1})
+
+        self.collection.movies.clear()
+        self.assertEqual(self.counts(), {})
+
+    def test_reverse_membership_changes_update_counts(self):
+        other = Collection.objects.create(title='Other', description='d')
+        self.thriller.collections.add(self.collection, other)
+        self.assertEqual(self.counts(other), {'Thriller': 1})
+
+        self.thriller.collections.clear()
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(self.counts(other), {})
+
+    def test_movie_edits_and_deletes_update_counts(self):
+        self.collection.movies.add(self.action, self.comedy)
+
+        self.action.genres = 'Action,Horror'
+        self.action.save()
+        self.assertEqual(self.counts(), {'Action': 1, 'Horror': 1, 'Drama': 1, 'Comedy': 1})
+
+        self.comedy.delete()
+        self.assertEqual(self.counts(), {'Action': 1, 'Horror': 1})
+
+    def test_favourite_genres_reads_top_three(self):
+        self.collection.movies.add(self.action, self.comedy, self.thriller)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.collection.favourite_genres, 'Drama,Action,Comedy')
+
+    def test_rebuild_command_recomputes_counts(self):
+        self.collection.movies.add(self.action, self.comedy)
+        Movie.objects.filter(pk=self.action.pk).update(genres='Western')
+        self.collection.genre_counts.update(count=99)
+
+        call_command('rebuild_genre_counts', stdout=StringIO())
+
+        self.assertEqual(self.counts(), {'Western': 1, 'Comedy': 1, 'Drama': 1})
+
+    def test_collection_list_reads_genres_in_one_query(self):
+        user = User.objects.create_user(username='lister', password='lister')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        self.collection.movies.add(self.action)
+        for i in range(5):
+            Collection.objects.create(title=f'More {i}', description='d').movies.add(self.thriller)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('collection-list'))
+
+        self.assertEqual(response.data['data']['favourite_genres'], ['Action', 'Drama', 'Thriller'])
+
+
+class GenreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='genres', password='genres')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.heat = Movie.objects.create(title='Heat', description='d', genres='Action,Crime')
+        self.up = Movie.objects.create(title='Up', description='d', genres='Animation, Comedy')
+        self.action = Collection.objects.create(title='Action', description='d')
+        self.action.movies.add(self.heat)
+        self.family = Collection.objects.create(title='Family', description='d')
+        self.family.movies.add(self.up)
+
+    def genre_names(self, movie):
+        return set(movie.genre_set.values_list('name', flat=True))
+
+    def test_movie_saves_keep_genre_links_in_sync(self):
+        self.assertEqual(self.genre_names(self.up), {'Animation', 'Comedy'})
+
+        self.up.genres = 'Animation,Family'
+        self.up.save()
+
+        self.assertEqual(self.genre_names(self.up), {'Animation', 'Family'})
+
+    def test_bulk_created_movies_are_linked(self):
+        self.client.post(reverse('collection-list'), {
+            'title': 'New', 'description': 'd',
+            'movies': [{'title': 'Alien', 'description': 'd', 'genres': 'Horror,Sci-Fi'}],
+        }, content_type='application/json')
+
+        self.assertEqual(self.genre_names(Movie.objects.get(title='Alien')), {'Horror', 'Sci-Fi'})
+
+    def test_collection_list_filters_by_genre(self):
+        response = self.client.get(reverse('collection-list'), {'genre': 'Comedy'})
+
+        titles = [collection['title'] for collection in response.data['data']['collections']]
+        self.assertEqual(titles, ['Family'])
+        self.assertEqual(response.data['data']['favourite_genres'], ['Animation', 'Comedy'])
+
+    @override_settings(MOVIE_LIST_SOURCE='local')
+    def test_local_movie_list_filters_by_genre(self):
+        upsert_movies(Movie.objects.order_by('id').values('uuid', 'title', 'description', 'genres'), first_position=0)
+
+        response = self.client.get(reverse('movie-list'), {'genre': 'Crime'})
+
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['title'], 'Heat')
+
+    def test_upstream_movie_list_rejects_genre_filter(self):
+        response = self.client.get(reverse('movie-list'), {'genre': 'Crime'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_are_counted_in_one_query(self):
+        self.family.movies.add(self.heat)
+        Genre.objects.create(name='Unused')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('genre-list'))
+
+        facets = {facet['name']: facet for facet in response.data['genres']}
+        self.assertEqual(set(facets), {'Action', 'Crime', 'Animation', 'Comedy'})
+        self.assertEqual(facets['Crime']['movie_count'], 1)
+        self.assertEqual(facets['Crime']['collection_count'], 2)
+        self.assertEqual(facets['Comedy']['collection_count'], 1)
+
+
+class CollectionPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pager', password='pager')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.movie = Movie.objects.create(title='Heat', description='d', genres='Crime')
+        for i in range(7):
+            Collection.objects.create(title=f'Collection {i}', description='d').movies.add(self.movie)
+
+    def test_cursor_walks_every_collection_once(self):
+        titles = []
+        url = reverse('collection-list') + '?page_size=3'
+        while url:
+            data = self.client.get(url).data['data']
+            self.assertLessEqual(len(data['collections']), 3)
+            titles.extend(collection['title'] for collection in data['collections'])
+            url = data['next']
+
+        self.assertEqual(titles, [f'Collection {i}' for i in reversed(range(7))])
+
+    def test_page_size_is_bounded(self):
+        for i in range(7, 205):
+            Collection.objects.create(title=f'Collection {i}', description='d')
+
+        data = self.client.get(reverse('collection-list'), {'page_size': 1000}).data['data']
+
+        self.assertEqual(len(data['collections']), CollectionCursorPagination.max_page_size)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('collection-list'), {'cursor': 'garbage'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_favourite_genres_summary_is_cached_until_counts_change(self):
+        self.client.get(reverse('collection-list'))
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('collection-list')).data['data']
+        self.assertEqual(data['favourite_genres'], ['Crime'])
+
+        Collection.objects.first().movies.add(Movie.objects.create(title='Up', description='d', genres='Animation'))
+
+        data = self.client.get(reverse('collection-list')).data['data']
+        self.assertEqual(data['favourite_genres'], ['Animation', 'Crime'])
+
+    def test_favourite_genres_keys_are_safe_and_bounded(self):
+        self.movie.genres = 'Science Fiction'
+        self.movie.save()
+
+        with mock.patch('movie_collection.genres.cache.set', wraps=cache.set) as cache_set:
+            data = self.client.get(reverse('collection-list'), {'genre': 'Science Fiction'}).data['data']
+            self.client.get(reverse('collection-list'), {'genre': 'Made up ' + 'x' * 300})
+
+        self.assertEqual(data['favourite_genres'], ['Science Fiction'])
+        keys = [call.args[0] for call in cache_set.call_args_list]
+        [key] = [key for key in keys if key.startswith('favourite_genres:')]
+        self.assertNotIn(' ', key)
+        self.assertLess(len(key), 250)
+
+
+class QueryBudgetTests(TestCase):
+    # Queries allowed per endpoint, however many rows it returns.
+    BUDGETS = {
+        'collection-list': 3,
+        'collection-detail': 3,
+        'genre-list': 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='auditor', password='auditor')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        movies = [Movie.objects.create(title=f'Movie {i}', description='d', genres='Drama,Crime') for i in range(10)]
+        for i in range(10):
+            Collection.objects.create(title=f'Collection {i}', description='d').movies.add(*movies)
+        self.collection = Collection.objects.first()
+
+    def assertWithinBudget(self, name, url):
+        with query_budget(self.BUDGETS[name], repeat_threshold=5):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertWithinBudget('collection-list', reverse('collection-list'))
+        self.assertWithinBudget('collection-detail', reverse('collection-detail', args=[self.collection.uuid]))
+        self.assertWithinBudget('genre-list', reverse('genre-list'))
+
+    def test_budget_catches_repeated_queries(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(20, repeat_threshold=5):
+                for collection in Collection.objects.all():
+                    collection.movies.count()
+
+        self.assertIn('[N+1?]', str(raised.exception))
+
+    def test_admin_changelist_does_not_query_per_row(self):
+        self.client.force_login(self.user)
+
+        with query_budget(12, repeat_threshold=5):
+            response = self.client.get(reverse('admin:movie_collection_collection_changelist'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'Crime,Drama')
+
+    def test_shapes_ignore_literals_and_in_list_length(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM movie WHERE id IN (%s, %s, %s) AND title = 'Heat' LIMIT 21"),
+            query_shape('SELECT * FROM movie WHERE id IN (%s)  AND title = %s LIMIT 1'),
+        )
+
+    @override_settings(SQL_PROFILER=True)
+    def test_profiler_reports_in_header_and_log(self):
+        client = Client(HTTP_AUTHORIZATION=self.client.defaults['HTTP_AUTHORIZATION'])
+
+        with self.assertLogs('movie_collection.profiling', 'INFO') as logs:
+            response = client.get(reverse('collection-list'))
+
+        self.assertRegex(response[PROFILE_HEADER], r'^queries=\d+; time=[\d.]+ms; repeated=0$')
+        self.assertIn('/collection/', logs.output[0])
+
+    def test_profiler_is_off_by_default(self):
+        response = self.client.get(reverse('collection-list'))
+
+        self.assertNotIn(PROFILE_HEADER, response)
+
+
+class ETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='poller', password='poller')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.movie = Movie.objects.create(title='Heat', description='d', genres='Crime')
+        self.collection = Collection.objects.create(title='Favourites', description='d')
+        self.collection.movies.add(self.movie)
+        self.url = reverse('collection-detail', args=[self.collection.uuid])
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified_without_loading_the_collection(self):
+        etag = self.etag()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_every_kind_of_write_changes_the_etag(self):
+        other = Movie.objects.create(title='Up', description='d', genres='Animation')
+        writes = [
+            lambda: self.client.put(self.url, {'title': 'Renamed'}, content_type='application/json'),
+            lambda: self.collection.movies.add(other),
+            lambda: other.collections.remove(self.collection),
+            lambda: Movie.objects.filter(pk=self.movie.pk).first().save(),
+        ]
+        seen = {self.etag()}
+        for write in writes:
+            write()
+            etag = self.etag()
+            self.assertNotIn(etag, seen)
+            seen.add(etag)
+
+    def test_stale_etag_gets_the_new_body(self):
+        etag = self.etag()
+        self.client.put(self.url, {'title': 'Renamed'}, content_type='application/json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Renamed')
+
+    def test_saving_a_stale_copy_does_not_undo_a_concurrent_bump(self):
+        stale = Collection.objects.get(pk=self.collection.pk)
+        etags = {self.etag()}
+        self.collection.movies.add(Movie.objects.create(title='Up', description='d', genres='Animation'))
+        etags.add(self.etag())
+
+        stale.title = 'Renamed'
+        stale.save()
+        etags.add(self.etag())
+
+        self.assertEqual(len(etags), 3)
+        self.assertEqual(Collection.objects.get(pk=self.collection.pk).version, stale.version + 2)
+        self.assertEqual(self.client.get(self.url).data['title'], 'Renamed')
+
+    def test_deleted_collection_is_not_reported_unmodified(self):
+        etag = self.etag()
+        self.client.delete(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_movie_list_etag_skips_upstream(self):
+        with FakeUpstream() as upstream, override_settings(EXTERNAL_API_URL=upstream.url):
+            first = self.client.get(reverse('movie-list'), {'page': 2})
+            again = self.client.get(reverse('movie-list'), {'page': 2}, HTTP_IF_NONE_MATCH=first['ETag'])
+            other_page = self.client.get(reverse('movie-list'), {'page': 3}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(upstream.requests, 2)
+        self.assertEqual(other_page.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(other_page['ETag'], first['ETag'])
+
+
+class CollectionDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='reader', password='reader')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.movie = Movie.objects.create(title='Heat', description='d', genres='Crime')
+        self.collection = Collection.objects.create(title='Favourites', description='d')
+        self.collection.movies.add(self.movie)
+        self.url = reverse('collection-detail', args=[self.collection.uuid])
+
+    def test_repeat_reads_skip_the_database(self):
+        self.client.get(self.url)
+
+        # The user comes from the user cache.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.data['title'], 'Favourites')
+        self.assertEqual(response.data['movies'][0]['title'], 'Heat')
+
+    def rename_movie(self):
+        self.movie.title = 'Heat (1995)'
+        self.movie.save()
+
+    def test_writes_invalidate_the_cached_payload(self):
+        other = Movie.objects.create(title='Up', description='d', genres='Animation')
+        writes = [
+            (lambda: self.client.put(self.url, {'title': 'Renamed'}, content_type='application/json'),
+             lambda data: data['title'] == 'Renamed'),
+            (lambda: self.collection.movies.add(other),
+             lambda data: len(data['movies']) == 2),
+            (lambda: other.collections.remove(self.collection),
+             lambda data: len(data['movies']) == 1),
+            (self.rename_movie,
+             lambda data: data['movies'][0]['title'] == 'Heat (1995)'),
+        ]
+        self.client.get(self.url)
+        for write, check in writes:
+            write()
+            data = self.client.get(self.url).data
+            self.assertTrue(check(data), data)
+
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_a_read_that_raced_a_write_cannot_cache_the_old_payload(self):
+        before = self.client.get(self.url)
+        old_version = Collection.objects.get(pk=self.collection.pk).version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.url, {'title': 'Renamed'}, content_type='application/json')
+
+        # A reader that loaded the row before the commit fills the cache after it.
+        CollectionDetailCache().load(self.collection.uuid, lambda: (old_version, before.data))
+        remember_collection_etag(self.collection.uuid, old_version)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Renamed')
+        self.assertNotEqual(response['ETag'], before['ETag'])
+
+    def test_cold_key_is_built_once_under_concurrency(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return 1, {'title': 'Slow'}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(CollectionDetailCache().get('cold', None, build)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(builds), 1)
+        self.assertEqual([entry['data'] for entry in results], [{'title': 'Slow'}] * 8)
+
+    def test_stats_report_hit_ratio_and_time_saved(self):
+        CollectionDetailCache.stats.reset()
+        for _ in range(4):
+            self.client.get(self.url)
+
+        stats = self.client.get(reverse('collection-cache-stats')).data
+
+        self.assertEqual((stats['hit'], stats['miss']), (3, 1))
+        self.assertEqual(stats['hit_ratio'], 0.75)
+        self.assertGreater(stats['saved_ms_per_hit'], 0)
+
+
+@override_settings(COLLECTION_EXPORT_CHUNK_SIZE=10)
+class CollectionExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='exporter')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.movie = Movie.objects.create(title='Heat', description='d', genres='Crime')
+        for i in range(25):
+            collection = Collection.objects.create(title=f'Collection {i}', description=f'Description {i}')
+            if i % 5 == 0:
+                collection.movies.add(self.movie)
+
+    def export(self, **params):
+        response = self.client.get(reverse('collection-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_export_streams_every_collection(self):
+        body = self.export()
+
+        self.assertTrue(body['is_success'])
+        collections = body['data']['collections']
+        self.assertEqual([c['title'] for c in collections], [f'Collection {i}' for i in range(25)])
+        expected = CollectionListSerializer(Collection.objects.order_by('id'), many=True).data
+        self.assertEqual(collections, json.loads(json.dumps(expected)))
+
+    def test_export_filters_by_genre(self):
+        collections = self.export(genre='Crime')['data']['collections']
+
+        self.assertEqual([c['title'] for c in collections], [f'Collection {i}' for i in range(0, 25, 5)])
+
+    def test_export_reads_bounded_keyset_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = b''.join(stream_collections(Collection.objects.all(), 10))
+
+        self.assertEqual(len(json.loads(body)['data']['collections']), 25)
+        self.assertEqual(len(queries), 3)
+        self.assertTrue(all('LIMIT 10' in query['sql'] for query in queries))
+
+    @override_settings(ASYNC_VIEWS=True, COLLECTION_EXPORT_CHUNK_SIZE=10)
+    async def test_asgi_export_sends_each_chunk_as_it_is_read(self):
+        response = await AsyncClient().get(
+            reverse('collection-export'), headers={'Authorization': self.client.defaults['HTTP_AUTHORIZATION']},
+        )
+        self.assertTrue(response.is_async)
+
+        sent = []
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                sent.append((message.get('body', b''), reads.call_count))
+
+        with mock.patch('movie_collection.exports.read_chunk', wraps=read_chunk) as reads:
+            await ASGIHandler().send_response(response, send)
+
+        body = b''.join(part for part, _ in sent)
+        self.assertEqual(len(json.loads(body)['data']['collections']), 25)
+        # Chunks of 10, 10 and 5 rows, each sent before the next one is read.
+        self.assertEqual([chunks_read for _, chunks_read in sent], [0, 1, 2, 3, 3, 3])
+
+    def test_empty_export_is_valid_json(self):
+        Collection.objects.all().delete()
+
+        self.assertEqual(self.export(), {'is_success': True, 'data': {'collections': []}})
+
+    def test_export_requires_authentication(self):
+        del self.client.defaults['HTTP_AUTHORIZATION']
+
+        response = self.client.get(reverse('collection-export'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class FastJSONTests(TestCase):
+    def test_renders_like_drf_json(self):
+        data = ReturnDict({
+            'uuid': uuid.uuid4(),
+            'at': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc),
+            'price': Decimal('9.50'),
+            'title': 'Amélie',
+            'movies': [{'id': 1}, {'id': 2}],
+        }, serializer=None)
+
+        fast = FastJSONRenderer().render(data)
+        with mock.patch('movie_collection.renderers.orjson', None):
+            fallback = FastJSONRenderer().render(data)
+
+        self.assertEqual(fallback, JSONRenderer().render(data))
+        self.assertEqual(json.loads(fast), json.loads(fallback))
+
+    def test_indented_requests_use_the_stock_renderer(self):
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=4')
+
+        self.assertEqual(rendered, b'{\n    "a": 1\n}')
+
+    def test_parses_request_bodies(self):
+        for backend in (orjson, None):
+            with self.subTest(backend=backend), mock.patch('movie_collection.renderers.orjson', backend):
+                parsed = FastJSONParser().parse(BytesIO('{"title": "Amélie", "n": [1, 2]}'.encode()))
+                self.assertEqual(parsed, {'title': 'Amélie', 'n': [1, 2]})
+
+    def test_api_uses_the_fast_classes(self):
+        user = User.objects.create_user(username='json', password='json')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+
+        created = self.client.post(
+            reverse('collection-list'),
+            {'title': 'Fast', 'description': 'd', 'movies': []},
+            content_type='application/json',
+        )
+        broken = self.client.post(reverse('collection-list'), '{"title": ', content_type='application/json')
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(created.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(broken.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', broken.data['detail'])
+
+
+class BenchmarkToolingTests(TestCase):
+    def test_generate_data_fills_every_table(self):
+        out = StringIO()
+        call_command(
+            'generate_data', users=3, movies=30, collections=4, movies_per_collection=5, batch_size=7, seed=1,
+            stdout=out,
+        )
+
+        self.assertIn('Created 3 users, 30 movies and 4 collections', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='bench_user_').count(), 3)
+        self.assertTrue(User.objects.get(username='bench_user_0').check_password('bench'))
+        self.assertEqual(Movie.objects.count(), 30)
+        self.assertEqual(Genre.objects.count(), len(set(
+            name for genres in Movie.objects.values_list('genres', flat=True) for name in genres.split(',')
+        )))
+        for collection in Collection.objects.all():
+            self.assertEqual(collection.movies.count(), 5)
+            expected = {}
+            for genres in collection.movies.values_list('genres', flat=True):
+                for name in genres.split(','):
+                    expected[name] = expected.get(name, 0) + 1
+            self.assertEqual(dict(collection.genre_counts.values_list('genre', 'count')), expected)
+
+    def test_generate_data_can_run_again(self):
+        call_command('generate_data', users=2, movies=0, collections=0, stdout=StringIO())
+        call_command('generate_data', users=2, movies=0, collections=0, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='bench_user_').count(), 4)
+
+    def test_fake_upstream_error_rate(self):
+        with FakeUpstream(error_rate=0.5, seed=7) as upstream:
+            with requests.Session() as session:
+                codes = [session.get(upstream.url, params={'page': 1}).status_code for _ in range(40)]
+
+        self.assertEqual(set(codes), {200, 503})
+        self.assertTrue(10 < codes.count(503) < 30)
+
+    def test_load_summary(self):
+        outcomes = [(i / 1000, i % 10 != 0) for i in range(1, 101)]
+
+        summary = summarise(outcomes, elapsed=2.0)
+
+        self.assertEqual(summary, {'requests': 100, 'errors': 10, 'rps': 50.0, 'p50_ms': 51.0, 'p99_ms': 100.0})
+
+    def test_load_against_a_running_server_needs_a_password(self):
+        with self.assertRaisesMessage(CommandError, '--password'):
+            call_command('benchmark', 'load', '--url', 'http://127.0.0.1:9', stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+    def test_load_against_a_running_server_cleans_up_after_itself(self):
+        existing = Collection.objects.create(title='Updated', description='Not the benchmark\'s.')
+
+        with bench_rows('s3cret') as collection_uuid:
+            self.assertTrue(User.objects.get(username=BENCH_USERNAME).check_password('s3cret'))
+            Collection.objects.filter(uuid=collection_uuid).update(title='Updated')
+            Collection.objects.create(title='Load test collection', description='d')
+            Movie.objects.create(title='Load Movie 0', description='d', genres='Drama')
+
+        self.assertEqual(list(Collection.objects.all()), [existing])
+        self.assertFalse(Movie.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='searcher', password='searcher')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        self.heat = Movie.objects.create(
+            title='Heat', description='A thief and a detective in Los Angeles.', genres='Crime,Thriller',
+        )
+        self.bagdad = Movie.objects.create(title='The Thief of Bagdad', description='A magic carpet.', genres='Fantasy')
+        self.up = Movie.objects.create(title='Up', description='A flying house.', genres='Animation')
+        self.heists = Collection.objects.create(title='Heist night', description='Every thief movie we own.')
+
+    def search(self, **params):
+        return self.client.get(reverse('search'), params)
+
+    def titles(self, response):
+        return [result['title'] for result in response.data['results']]
+
+    def test_results_are_ranked(self):
+        response = self.search(q='thief')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(self.titles(response)[0], 'The Thief of Bagdad')
+        self.assertEqual(set(self.titles(response)), {'The Thief of Bagdad', 'Heat', 'Heist night'})
+        first = response.data['results'][0]
+        self.assertEqual(first['type'], 'movie')
+        self.assertEqual(first['uuid'], str(self.bagdad.uuid))
+        self.assertGreater(first['score'], response.data['results'][-1]['score'])
+
+    def test_objects_matching_more_terms_rank_first(self):
+        response = self.search(q='Thief, detective!')
+
+        self.assertEqual(self.titles(response)[0], 'Heat')
+
+    def test_filter_by_type(self):
+        response = self.search(q='thief', type='collection')
+
+        self.assertEqual(response.data['results'], [
+            {'type': 'collection', 'score': response.data['results'][0]['score'],
+             'title': 'Heist night', 'uuid': str(self.heists.uuid), 'description': 'Every thief movie we own.'},
+        ])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.up.title = 'Up, the thief'
+        self.up.save()
+        self.assertIn('Up, the thief', self.titles(self.search(q='thief')))
+
+        self.up.delete()
+        self.heists.delete()
+        self.assertEqual(set(self.titles(self.search(q='thief'))), {'The Thief of Bagdad', 'Heat'})
+        self.assertFalse(SearchTerm.objects.filter(object_id=self.heists.pk, kind=SearchTerm.COLLECTION).exists())
+
+    def test_pagination(self):
+        first = self.search(q='thief', page_size=2)
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(first.data['count'], 3)
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertEqual(len(set(self.titles(first)) | set(self.titles(second))), 3)
+        self.assertIsNone(second.data['next'])
+
+    def test_query_count_is_flat(self):
+        for i in range(20):
+            Movie.objects.create(title=f'Thief {i}', description='d', genres='Crime')
+
+        # Term frequencies, document counts per kind, the total, the page and loading its movies.
+        with self.assertNumQueries(6):
+            response = self.search(q='thief crime')
+
+        self.assertEqual(response.data['count'], 23)
+
+    def test_no_matches(self):
+        self.assertEqual(self.search(q='zebra').data['count'], 0)
+        self.assertEqual(self.search(q='the of a').data['results'], [])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.search().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(q='  ').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(q='thief', type='genre').status_code, status.HTTP_400_BAD_REQUEST)
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.search(q='thief').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_writes_are_indexed(self):
+        upsert_movies([{'uuid': str(uuid.uuid4()), 'title': 'Thief Upstream', 'description': 'd', 'genres': ''}])
+        self.client.post(
+            reverse('collection-list'),
+            {'title': 'New', 'description': 'd', 'movies': [{'title': 'Thief Posted', 'description': 'd'}]},
+            content_type='application/json',
+        )
+
+        self.assertTrue({'Thief Upstream', 'Thief Posted'} <= set(self.titles(self.search(q='thief'))))
+
+    def test_rebuild_command(self):
+        SearchTerm.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+
+        self.assertIn('Indexed 4 movies and collections', out.getvalue())
+        self.assertEqual(self.search(q='thief').data['count'], 3)
+
+    @override_settings(SEARCH_BACKEND='mysql')
+    def test_mysql_backend_queries_the_fulltext_indexes(self):
+        sql = str(fulltext_matches('thief', SearchTerm.MOVIE).query)
+
+        self.assertIn('MATCH (title, description, genres) AGAINST (thief IN NATURAL LANGUAGE MODE)', sql)
+        # The table index is left alone when the database does the searching.
+        Movie.objects.create(title='Thief Unindexed', description='d')
+        self.assertFalse(SearchTerm.objects.filter(term='unindexed').exists())
+
+
+class CollectionBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='batcher', password='batcher')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.heat = Movie.objects.create(title='Heat', description='d', genres='Crime,Thriller')
+        self.up = Movie.objects.create(title='Up', description='d', genres='Animation')
+        self.url = reverse('collection-batch')
+
+    def payload(self, title, *movies):
+        return {
+            'title': title,
+            'description': 'd',
+            'movies': [{'uuid': str(movie.uuid), 'title': movie.title, 'description': 'd'} for movie in movies],
+        }
+
+    def create(self, *items):
+        return self.client.post(self.url, {'collections': list(items)}, content_type='application/json')
+
+    def genre_counts(self, collection):
+        return dict(collection.genre_counts.values_list('genre', 'count'))
+
+    def test_create_many(self):
+        new_movie = {'title': 'Alien', 'description': 'd', 'genres': 'Horror'}
+        mixed = self.payload('Mixed', self.heat)
+        mixed['movies'].append(new_movie)
+        response = self.create(
+            self.payload('Crime', self.heat, self.heat),
+            {'description': 'no title', 'movies': []},
+            mixed,
+            {'title': 'Also new', 'description': 'd', 'movies': [new_movie]},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 201, 201])
+        self.assertIn('title', results[1]['errors'])
+        crime, mixed, also_new = (Collection.objects.get(uuid=results[i]['collection_uuid']) for i in (0, 2, 3))
+        self.assertEqual(list(crime.movies.all()), [self.heat])
+        self.assertEqual(Movie.objects.filter(title='Alien').count(), 1)
+        self.assertEqual(self.genre_counts(mixed), {'Crime': 1, 'Thriller': 1, 'Horror': 1})
+        self.assertEqual(self.genre_counts(also_new), {'Horror': 1})
+        self.assertTrue(SearchTerm.objects.filter(kind=SearchTerm.COLLECTION, object_id=mixed.pk, term='mixed'))
+
+    def test_create_status_reflects_every_item(self):
+        self.assertEqual(self.create(self.payload('A', self.up)).status_code, status.HTTP_201_CREATED)
+        response = self.create({'title': 'No description'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Collection.objects.count(), 1)
+
+    def test_create_query_count_is_flat(self):
+        def queries(count):
+            items = [self.payload(f'Batch {i}', self.heat, self.up) for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.create(*items).status_code, status.HTTP_201_CREATED)
+            return len(captured)
+
+        # Load the user up front, so neither count includes authentication.
+        user_cache.get(self.user.pk)
+        self.assertEqual(queries(2), queries(20))
+
+    def test_lookup(self):
+        collections = [Collection.objects.create(title=f'C{i}', description='d') for i in range(3)]
+        collections[0].movies.add(self.heat, self.up)
+        missing = uuid.uuid4()
+
+        # The user, the collections, then their movies.
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                reverse('collection-batch-lookup'),
+                {'uuids': [str(collections[0].uuid), str(missing), str(collections[2].uuid)]},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second, third = response.data['results']
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(first['collection']['title'], 'C0')
+        self.assertEqual({movie['title'] for movie in first['collection']['movies']}, {'Heat', 'Up'})
+        self.assertEqual(second, {'collection_uuid': str(missing), 'status': 404})
+        self.assertEqual(third['collection']['movies'], [])
+
+    def test_delete_many(self):
+        collections = [Collection.objects.create(title=f'Doomed {i}', description='d') for i in range(10)]
+        for collection in collections:
+            collection.movies.add(self.heat)
+        kept = Collection.objects.create(title='Kept', description='d')
+        kept.movies.add(self.heat)
+        self.client.get(reverse('collection-detail', args=[collections[0].uuid]))
+        missing = uuid.uuid4()
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.delete(
+                self.url, {'uuids': [str(c.uuid) for c in collections] + [str(missing)]},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['results']], [204] * 10 + [404])
+        self.assertEqual(list(Collection.objects.all()), [kept])
+        self.assertEqual(list(self.heat.collections.all()), [kept])
+        indexed = SearchTerm.objects.filter(kind=SearchTerm.COLLECTION).values_list('object_id', flat=True)
+        self.assertEqual(set(indexed), {kept.pk})
+        self.assertIsNone(cached_collection_version(collections[0].uuid))
+        self.assertLess(len(captured), 10)
+
+    def test_delete_many_retires_caches_once_per_batch(self):
+        collections = [Collection.objects.create(title=f'Doomed {i}', description='d') for i in range(10)]
+
+        uuids = [str(c.uuid) for c in collections]
+        spy = mock.patch('movie_collection.signals.forget_cached_collections', wraps=forget_cached_collections)
+        with spy as forget, mock.patch('movie_collection.signals.invalidate_favourite_genres') as invalidate:
+            self.client.delete(self.url, {'uuids': uuids}, content_type='application/json')
+
+        forget.assert_called_once()
+        self.assertEqual(set(forget.call_args.args[0]), {c.uuid for c in collections})
+        invalidate.assert_called_once_with()
+
+        with mock.patch('movie_collection.signals.forget_cached_collections') as forget:
+            Collection.objects.create(title='Single', description='d').delete()
+        forget.assert_called_once()
+
+    def test_bad_requests(self):
+        lookup = reverse('collection-batch-lookup')
+        self.assertEqual(self.client.post(self.url, {}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.create().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.create('not an object').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(lookup, {'uuids': ['nope']}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('uuids', response.data)
+        with override_settings(COLLECTION_BATCH_MAX_SIZE=2):
+            uuids = [str(uuid.uuid4()) for _ in range(3)]
+            response = self.client.post(lookup, {'uuids': uuids}, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        del self.client.defaults['HTTP_AUTHORIZATION']
+        self.assertEqual(self.create(self.payload('A')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CollectionMoviesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='curator', password='curator')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.heat = Movie.objects.create(title='Heat', description='d', genres='Crime,Thriller')
+        self.up = Movie.objects.create(title='Up', description='d', genres='Animation')
+        self.collection = Collection.objects.create(title='Mine', description='d')
+        self.collection.movies.add(self.heat)
+        self.url = reverse('collection-movies', args=[self.collection.uuid])
+
+    def send(self, method, *movies, url=None):
+        uuids = [str(getattr(movie, 'uuid', movie)) for movie in movies]
+        return getattr(self.client, method)(url or self.url, {'uuids': uuids}, content_type='application/json')
+
+    def statuses(self, response):
+        return [result['status'] for result in response.data['results']]
+
+    def genre_counts(self):
+        return dict(self.collection.genre_counts.values_list('genre', 'count'))
+
+    def test_add(self):
+        version = Collection.objects.get(pk=self.collection.pk).version
+        missing = uuid.uuid4()
+
+        response = self.send('post', self.up, self.heat, missing)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.statuses(response), [201, 200, 404])
+        self.assertEqual(set(self.collection.movies.all()), {self.heat, self.up})
+        self.assertEqual(self.genre_counts(), {'Crime': 1, 'Thriller': 1, 'Animation': 1})
+        self.assertEqual(Collection.objects.get(pk=self.collection.pk).version, version + 1)
+
+    def test_remove(self):
+        self.collection.movies.add(self.up)
+
+        response = self.send('delete', self.heat, self.heat, uuid.uuid4())
+
+        self.assertEqual(self.statuses(response), [204, 204, 404])
+        self.assertEqual(list(self.collection.movies.all()), [self.up])
+        self.assertEqual(self.genre_counts(), {'Animation': 1})
+
+    def test_nothing_to_change_keeps_the_version(self):
+        version = Collection.objects.get(pk=self.collection.pk).version
+
+        self.assertEqual(self.statuses(self.send('post', self.heat)), [200])
+        self.assertEqual(self.statuses(self.send('delete', self.up)), [404])
+        self.assertEqual(Collection.objects.get(pk=self.collection.pk).version, version)
+
+    def test_query_count_follows_the_batch_not_the_collection(self):
+        def queries(collection_size):
+            collection = Collection.objects.create(title=f'Size {collection_size}', description='d')
+            collection.movies.add(*Movie.objects.bulk_create(
+                Movie(title=f'Filler {i}', description='d', genres='Drama') for i in range(collection_size)
+            ))
+            url = reverse('collection-movies', args=[collection.uuid])
+            with CaptureQueriesContext(connection) as added:
+                self.send('post', self.up, url=url)
+            with CaptureQueriesContext(connection) as removed:
+                self.send('delete', self.up, url=url)
+            return len(added), len(removed)
+
+        # Load the user up front, so neither count includes authentication.
+        user_cache.get(self.user.pk)
+        self.assertEqual(queries(2), queries(300))
+
+    def test_unknown_collection_and_bad_bodies(self):
+        url = reverse('collection-movies', args=[uuid.uuid4()])
+        self.assertEqual(self.send('post', self.up, url=url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.send('delete', self.up, url=url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.send('post').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.send('post', 'not-a-uuid').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReplicaRoutingTests(TestCase):
+    """Routing against a second SQLite database standing in for a read replica."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Added here rather than in settings, so the test runner does not set it up as a test database.
+        cls.databases = {'default', 'replica'}
+        cls.scratch = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.scratch.name, 'replica.sqlite3'),
+            'OPTIONS': {},
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        cls.enterClassContext(override_settings(DATABASE_REPLICAS=['replica']))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.scratch.cleanup()
+
+    def setUp(self):
+        user = User.objects.create_user(username='reader', password='reader')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        self.collection = Collection.objects.create(title='On the primary', description='d')
+
+    def listed(self):
+        response = self.client.get(reverse('collection-list'))
+        return [collection['title'] for collection in response.data['data']['collections']]
+
+    def test_safe_requests_read_from_the_replica(self):
+        Collection.objects.using('replica').create(title='On the replica', description='d')
+
+        self.assertEqual(self.listed(), ['On the replica'])
+        self.assertEqual(Collection.objects.get().title, 'On the primary')
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response = self.client.post(
+            reverse('collection-list'), {'title': 'Fresh', 'description': 'd', 'movies': []},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(set(self.listed()), {'On the primary', 'Fresh'})
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.listed(), [])
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        response = self.client.put(
+            reverse('collection-detail', args=[self.collection.uuid]), {'title': 'Renamed'},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Collection.objects.get().title, 'Renamed')
+
+    def test_shared_caches_are_filled_from_the_primary(self):
+        # Neither the user nor the collection exists on the replica.
+        self.assertEqual(self.client.get(reverse('genre-list')).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('collection-detail', args=[self.collection.uuid]))
+        self.assertEqual(response.data['title'], 'On the primary')
+
+    def test_reads_outside_requests_use_the_primary(self):
+        Collection.objects.using('replica').create(title='On the replica', description='d')
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(Collection))
+        replica_copy = Collection.objects.using('replica').get()
+        self.assertTrue(router.allow_relation(self.collection, replica_copy))
+        self.assertEqual(router.db_for_write(Collection, instance=replica_copy), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_is_pinned(self):
+        response = self.client.post(
+            reverse('collection-list'), {'title': 'Fresh', 'description': 'd', 'movies': []},
+            content_type='application/json',
+        )
+
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(len(self.listed()), 2)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def fake_settings(self, upstream, **overrides):
+        options = {
+            'EXTERNAL_API_URL': upstream.url,
+            'EXTERNAL_API_RETRIES': 1,
+            'EXTERNAL_API_BREAKER_THRESHOLD': 2,
+            'EXTERNAL_API_BREAKER_COOLDOWN': 60,
+        }
+        options.update(overrides)
+        return override_settings(**options)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        with FakeUpstream(failures=[503] * 5) as upstream, self.fake_settings(upstream):
+            self.assertIsNone(fetch_movies(1))
+            self.assertEqual(circuit.state(), CircuitBreaker.CLOSED)
+            self.assertIsNone(fetch_movies(1))
+            self.assertEqual(circuit.state(), CircuitBreaker.OPEN)
+            for page in (1, 2, 3):
+                self.assertIsNone(fetch_movies(page))
+
+        self.assertEqual(upstream.requests, 2)
+
+    def test_success_resets_the_failure_count(self):
+        with FakeUpstream(failures=[503, None, 503]) as upstream, self.fake_settings(upstream):
+            for _ in range(3):
+                fetch_movies(1)
+            self.assertEqual(circuit.state(), CircuitBreaker.CLOSED)
+
+    def test_client_errors_do_not_trip_the_circuit(self):
+        with FakeUpstream(failures=[404] * 3) as upstream, self.fake_settings(upstream):
+            for _ in range(3):
+                self.assertIsNone(fetch_movies(1))
+            self.assertEqual(circuit.state(), CircuitBreaker.CLOSED)
+
+        self.assertEqual(upstream.requests, 3)
+
+    def test_half_open_probe_closes_or_reopens_the_circuit(self):
+        with FakeUpstream(failures=[503, 503, 503]) as upstream, self.fake_settings(
+            upstream, EXTERNAL_API_BREAKER_COOLDOWN=0,
+        ):
+            fetch_movies(1)
+            fetch_movies(1)
+            self.assertEqual(circuit.state(), CircuitBreaker.HALF_OPEN)
+            self.assertIsNone(fetch_movies(1))
+            self.assertEqual(upstream.requests, 3)
+
+            self.assertIsNotNone(fetch_movies(1))
+            self.assertEqual(circuit.state(), CircuitBreaker.CLOSED)
+
+    def test_only_one_probe_at_a_time(self):
+        with FakeUpstream() as upstream, self.fake_settings(upstream, EXTERNAL_API_BREAKER_COOLDOWN=0):
+            circuit.trip(2)
+            self.assertTrue(circuit.allow())
+            self.assertFalse(circuit.allow())
+
+    async def test_async_client_shares_the_circuit(self):
+        with FakeUpstream(failures=[503] * 5) as upstream, self.fake_settings(upstream):
+            self.assertIsNone(await sync_to_async(fetch_movies)(1))
+            self.assertIsNone(await afetch_movies(1))
+            self.assertIsNone(await afetch_movies(1))
+
+        self.assertEqual(upstream.requests, 2)
+
+    def test_movie_list_serves_last_good_page_while_open(self):
+        with FakeUpstream(movie_count=25) as upstream, self.fake_settings(
+            upstream, MOVIE_PAGE_CACHE_TTL=0, MOVIE_PAGE_CACHE_STALE_TTL=0,
+        ):
+            request = RequestFactory().get('/movies/', {'page': 2})
+            fresh = MovieListView.as_view()(request)
+            circuit.trip(2)
+            request = RequestFactory().get('/movies/', {'page': 2})
+            stale = MovieListView.as_view()(request)
+            missing = MovieListView.as_view()(RequestFactory().get('/movies/', {'page': 3}))
+
+        self.assertEqual(upstream.requests, 1)
+        self.assertNotIn('stale', fresh.data)
+        self.assertEqual(stale.status_code, status.HTTP_200_OK)
+        self.assertTrue(stale.data['stale'])
+        self.assertIsInstance(stale.data['fetched_at'], datetime)
+        self.assertEqual(stale.data['results'], fresh.data['results'])
+        self.assertEqual(missing.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(UpstreamPageCache.stats.snapshot()['fallback'], 1)
+
+    async def test_async_movie_list_serves_last_good_page_while_open(self):
+        with FakeUpstream(movie_count=25) as upstream, self.fake_settings(
+            upstream, MOVIE_PAGE_CACHE_TTL=0, MOVIE_PAGE_CACHE_STALE_TTL=0,
+        ):
+            await AsyncMovieListView.as_view()(AsyncRequestFactory().get('/movies/'))
+            await sync_to_async(circuit.trip)(2)
+            response = await AsyncMovieListView.as_view()(AsyncRequestFactory().get('/movies/'))
+
+        body = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(body['stale'])
+        self.assertEqual(len(body['results']), 10)
+
+
+job_calls = []
+
+
+@job
+def record_call(value, fail_times=0, sleep=0):
+    time.sleep(sleep)
+    job_calls.append(value)
+    if job_calls.count(value) <= fail_times:
+        raise RuntimeError(f'{value} failed')
+
+
+class JobQueueTests(TestCase):
+    def test_queued_jobs_are_deduplicated_until_claimed(self):
+        first = record_call.enqueue(value='a', dedup_key='k')
+        self.assertEqual(enqueue('record_call', value='b', dedup_key='k'), first)
+        self.assertEqual(Job.objects.count(), 1)
+
+        self.assertEqual(claim('test', 5), [first])
+        follow_up = record_call.enqueue(value='c', dedup_key='k')
+
+        self.assertNotEqual(follow_up, first)
+        self.assertEqual(follow_up.payload, {'value': 'c'})
+
+    def test_unknown_jobs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('no_such_job')
+
+    def test_scheduled_jobs_wait_for_their_time(self):
+        later = record_call.enqueue(value='later', delay=60)
+        now = record_call.enqueue(value='now')
+
+        self.assertEqual(claim('test', 5), [now])
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now())
+        claimed = claim('test', 5)
+
+        self.assertEqual(claimed, [later])
+        self.assertEqual((claimed[0].status, claimed[0].attempts, claimed[0].locked_by), (Job.RUNNING, 1, 'test'))
+
+    def test_enqueue_rolls_back_with_the_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record_call.enqueue(value='a')
+            raise RuntimeError
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_expired_leases_are_requeued(self):
+        record_call.enqueue(value='a', max_attempts=2)
+        record_call.enqueue(value='b', max_attempts=1)
+        claim('dead-worker', 5)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(requeue_expired(), 1)
+        self.assertEqual(
+            dict(Job.objects.values_list('payload__value', 'status')), {'a': Job.QUEUED, 'b': Job.FAILED},
+        )
+
+    def test_sync_endpoint_queues_one_job(self):
+        admin = User.objects.create_superuser(username='admin', password='admin')
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+
+        responses = [client.post(reverse('movie-sync')) for _ in range(2)]
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_202_ACCEPTED] * 2)
+        self.assertEqual(responses[0].data['job_id'], responses[1].data['job_id'])
+        self.assertEqual(Job.objects.get().name, 'sync_movies')
+
+    def test_sync_endpoint_rejects_bad_bodies(self):
+        admin = User.objects.create_superuser(username='admin', password='admin')
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+
+        for body in ([], 'restart', {'restart': 'maybe'}):
+            with self.subTest(body=body):
+                response = client.post(reverse('movie-sync'), body, content_type='application/json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Job.objects.exists())
+
+        client.post(reverse('movie-sync'), {'restart': True}, content_type='application/json')
+        self.assertEqual(Job.objects.get().payload, {'restart': True})
+
+    def test_enqueue_retries_when_the_duplicate_is_claimed_before_the_lookup(self):
+        create = Job.objects.create
+        calls = []
+
+        def create_after_losing_a_race(**fields):
+            calls.append(fields)
+            if len(calls) == 1:
+                # A queued job held the key, and a worker claimed it right after.
+                raise IntegrityError('UNIQUE constraint failed: movie_collection_job.dedup_key')
+            return create(**fields)
+
+        with mock.patch.object(Job.objects, 'create', side_effect=create_after_losing_a_race):
+            queued = record_call.enqueue(value='a', dedup_key='k')
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Job.objects.get(), queued)
+        self.assertEqual(queued.dedup_key, 'k')
+
+
+@override_settings(JOB_RETRY_DELAY=0)
+class JobWorkerTests(TransactionTestCase):
+    def setUp(self):
+        job_calls.clear()
+
+    def test_failed_jobs_are_retried_until_attempts_run_out(self):
+        flaky = record_call.enqueue(value='flaky', fail_times=1)
+        broken = record_call.enqueue(value='broken', fail_times=5, max_attempts=2)
+
+        with self.assertLogs('movie_collection.jobs', 'ERROR') as logs:
+            Worker(threads=2, poll_interval=0.01).run(once=True)
+
+        flaky.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((flaky.status, flaky.attempts, flaky.dedup_key), (Job.DONE, 2, None))
+        self.assertEqual((broken.status, broken.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: broken failed', broken.last_error)
+        self.assertEqual(job_calls.count('broken'), 2)
+        self.assertEqual(sorted(record.getMessage() for record in logs.records), [
+            f'Job record_call#{flaky.pk} running failed on attempt 1/{flaky.max_attempts}',
+            f'Job record_call#{broken.pk} running failed on attempt 1/2',
+            f'Job record_call#{broken.pk} running failed on attempt 2/2',
+        ])
+
+    def test_genre_rebuild_endpoint_queues_a_recount(self):
+        admin = User.objects.create_superuser(username='admin', password='admin')
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        collection = Collection.objects.create(title='Counted', description='d')
+        collection.movies.add(Movie.objects.create(title='Heat', description='d', genres='Crime, Drama'))
+        CollectionGenreCount.objects.all().delete()
+
+        responses = [client.post(reverse('genre-rebuild')) for _ in range(2)]
+        Worker(threads=1, poll_interval=0.01).run(once=True)
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_202_ACCEPTED] * 2)
+        self.assertEqual(responses[0].data['job_id'], responses[1].data['job_id'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(
+            set(CollectionGenreCount.objects.values_list('genre', 'count')), {('Crime', 1), ('Drama', 1)},
+        )
+
+    def test_run_workers_runs_jobs_in_parallel(self):
+        for value in range(4):
+            record_call.enqueue(value=value, sleep=0.2)
+        out = StringIO()
+
+        started = time.monotonic()
+        call_command('run_workers', '--threads', '4', '--poll-interval', '0.01', '--once', stdout=out)
+        elapsed = time.monotonic() - started
+
+        self.assertIn('Ran 4 jobs', out.getvalue())
+        self.assertEqual(sorted(job_calls), [0, 1, 2, 3])
+        self.assertLess(elapsed, 0.6)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_warns_about_a_per_process_cache_with_several_workers(self):
+        with override_settings(WEB_CONCURRENCY=4):
+            warnings = check_shared_cache(None)
+
+        self.assertEqual([warning.id for warning in warnings], ['movie_collection.W001'])
+
+    def test_single_worker_or_shared_cache_passes(self):
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(WEB_CONCURRENCY=1):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(WEB_CONCURRENCY=4, CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_follower_that_times_out_computes_the_value(self):
+        started = threading.Event()
+
+        def slow_build():
+            started.set()
+            time.sleep(0.5)
+            return 'leader'
+
+        leader = threading.Thread(target=single_flight, args=('slow', slow_build))
+        leader.start()
+        started.wait()
+        try:
+            self.assertEqual(single_flight('slow', lambda: 'follower', wait=0.05), 'follower')
+        finally:
+            leader.join()
+
+    def test_follower_computes_the_value_when_the_leader_fails(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def failing_build():
+            started.set()
+            release.wait()
+            raise RuntimeError('upstream down')
+
+        def lead():
+            with self.assertRaises(RuntimeError):
+                single_flight('failing', failing_build)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait()
+        results = []
+        follower = threading.Thread(target=lambda: results.append(single_flight('failing', lambda: 'follower')))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(results, ['follower'])
+
+    async def test_async_follower_that_times_out_computes_the_value(self):
+        async def slow_build():
+            await asyncio.sleep(0.5)
+            return 'leader'
+
+        async def fast_build():
+            return 'follower'
+
+        leader = asyncio.ensure_future(asingle_flight('aslow', slow_build))
+        await asyncio.sleep(0)
+        self.assertEqual(await asingle_flight('aslow', fast_build, wait=0.05), 'follower')
+        self.assertEqual(await leader, 'leader')
+
+
+class DeferralTests(SimpleTestCase):
+    def test_nested_blocks_flush_once_at_the_end(self):
+        flushed = []
+        deferral = Deferral('test_nested', list, flushed.append)
+
+        with deferral.block():
+            deferral.pending().append(1)
+            with deferral.block():
+                deferral.pending().append(2)
+            self.assertEqual(flushed, [])
+
+        self.assertEqual(flushed, [[1, 2]])
+        self.assertIsNone(deferral.pending())
+
+    def test_work_offloaded_by_sync_to_async_joins_the_block(self):
+        flushed = []
+        deferral = Deferral('test_offloaded', list, flushed.append)
+
+        def elsewhere():
+            deferral.pending().append(threading.current_thread().name)
+
+        with deferral.block():
+            async_to_sync(sync_to_async(elsewhere, thread_sensitive=False))()
+
+        self.assertEqual(len(flushed), 1)
+        self.assertNotEqual(flushed[0], [threading.current_thread().name])
+
+    def test_nothing_is_flushed_when_the_block_fails(self):
+        flushed = []
+        deferral = Deferral('test_failing', list, flushed.append)
+
+        with self.assertRaises(RuntimeError), deferral.block():
+            deferral.pending().append(1)
+            raise RuntimeError
+
+        self.assertEqual(flushed, [])
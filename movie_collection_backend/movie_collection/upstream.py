@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth another attempt; anything else in the 4xx range is the caller's fault.
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+Attempt = namedtuple('Attempt', ['number', 'elapsed', 'status_code', 'error'])
+UpstreamResponse = namedtuple('UpstreamResponse', ['data', 'attempts'])
+
+
+class UpstreamError(Exception):
+    """Raised when the external API could not produce a usable response."""
+
+    def __init__(self, message, attempts=()):
+        super().__init__(message)
+        self.attempts = list(attempts)
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised instead of calling the external API while its circuit is open."""
+
+
+def is_outage(error):
+    """Whether an ``UpstreamError`` says the API is unhealthy rather than the request wrong."""
+    status_code = error.attempts[-1].status_code if error.attempts else None
+    return status_code is None or status_code in RETRYABLE_STATUS_CODES or not 400 <= status_code < 500
+
+
+class CircuitBreaker:
+    """Fail fast while the external API keeps failing, with its state in the default cache.
+
+    After ``EXTERNAL_API_BREAKER_THRESHOLD`` consecutive failed calls the
+    circuit opens and calls fail at once without touching the network. Once
+    ``EXTERNAL_API_BREAKER_COOLDOWN`` seconds have passed it is half-open: one
+    caller at a time is let through as a probe. A successful probe closes the
+    circuit, a failed one opens it for another cooldown. Workers share one
+    circuit, and one probe, only when ``CACHE_URL`` points them at a shared
+    cache; with the per-process default each worker trips and probes alone.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, namespace):
+        self.failures_key = f'{namespace}:failures'
+        self.open_until_key = f'{namespace}:open_until'
+        self.probe_key = f'{namespace}:probe'
+
+    @property
+    def keys(self):
+        return [self.failures_key, self.open_until_key, self.probe_key]
+
+    @staticmethod
+    def probe_timeout():
+        # Frees the probe slot even if the worker holding it dies mid-call.
+        return int(settings.EXTERNAL_API_DEADLINE) + 1
+
+    def state(self):
+        open_until = cache.get(self.open_until_key)
+        if open_until is None:
+            return self.CLOSED
+        return self.OPEN if time.time() < open_until else self.HALF_OPEN
+
+    def allow(self):
+        """Whether this call may go upstream; claims the probe slot when half-open."""
+        open_until = cache.get(self.open_until_key)
+        if open_until is None:
+            return True
+        if time.time() < open_until:
+            return False
+        return cache.add(self.probe_key, 1, timeout=self.probe_timeout())
+
+    def record_success(self):
+        values = cache.get_many([self.failures_key, self.open_until_key])
+        if values:
+            cache.delete_many(self.keys)
+            if self.open_until_key in values:
+                logger.info('upstream circuit closed')
+
+    def record_failure(self):
+        was_open = cache.get(self.open_until_key) is not None
+        # The counter is only ever created here, so add-then-incr cannot miss it.
+        failures = 1 if cache.add(self.failures_key, 1, timeout=None) else cache.incr(self.failures_key)
+        if was_open or failures >= settings.EXTERNAL_API_BREAKER_THRESHOLD:
+            self.trip(failures)
+
+    def trip(self, failures):
+        cooldown = settings.EXTERNAL_API_BREAKER_COOLDOWN
+        cache.set(self.open_until_key, time.time() + cooldown, timeout=None)
+        cache.delete(self.probe_key)
+        logger.warning('upstream circuit opened for %ss after %d consecutive failures', cooldown, failures)
+
+    async def aallow(self):
+        open_until = await cache.aget(self.open_until_key)
+        if open_until is None:
+            return True
+        if time.time() < open_until:
+            return False
+        return await cache.aadd(self.probe_key, 1, timeout=self.probe_timeout())
+
+    async def arecord_success(self):
+        values = await cache.aget_many([self.failures_key, self.open_until_key])
+        if values:
+            await cache.adelete_many(self.keys)
+            if self.open_until_key in values:
+                logger.info('upstream circuit closed')
+
+    async def arecord_failure(self):
+        was_open = await cache.aget(self.open_until_key) is not None
+        if await cache.aadd(self.failures_key, 1, timeout=None):
+            failures = 1
+        else:
+            failures = await cache.aincr(self.failures_key)
+        if was_open or failures >= settings.EXTERNAL_API_BREAKER_THRESHOLD:
+            cooldown = settings.EXTERNAL_API_BREAKER_COOLDOWN
+            await cache.aset(self.open_until_key, time.time() + cooldown, timeout=None)
+            await cache.adelete(self.probe_key)
+            logger.warning('upstream circuit opened for %ss after %d consecutive failures', cooldown, failures)
+
+    def reset(self):
+        cache.delete_many(self.keys)
+
+
+circuit = CircuitBreaker('upstream:circuit')
+
+
+class RetryPolicy:
+    """Timeouts, retry budget and backoff shared by the sync and async clients."""
+
+    def __init__(self, base_url, connect_timeout=2.0, read_timeout=4.0, retries=3,
+                 backoff_base=0.1, backoff_max=1.0, deadline=5.0):
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+
+    def backoff(self, retry):
+        """Full-jitter exponential backoff before the given (zero-based) retry."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def _record(self, number, started, status_code, error):
+        attempt = Attempt(number, time.monotonic() - started, status_code, error)
+        registry.observe('upstream_attempt_duration_seconds', attempt.elapsed,
+                         outcome='ok' if error is None else 'error')
+        if error is None:
+            logger.info('upstream attempt %d ok status=%s elapsed=%.1fms',
+                        number, status_code, attempt.elapsed * 1000)
+        else:
+            logger.warning('upstream attempt %d failed status=%s elapsed=%.1fms error=%s',
+                           number, status_code, attempt.elapsed * 1000, error)
+        return attempt
+
+
+class UpstreamClient(RetryPolicy):
+    """HTTP client for the external movie API.
+
+    A single pooled ``requests.Session`` is reused so connections are kept
+    alive between calls. Each call is bounded by a total deadline that covers
+    every attempt and every backoff pause, so a degraded upstream can never
+    hold a worker for longer than ``deadline`` seconds.
+    """
+
+    def __init__(self, base_url, auth=None, pool_size=10, verify=True, **policy):
+        super().__init__(base_url, **policy)
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_json(self, params=None, retries=None, deadline=None):
+        """GET ``base_url`` and return an ``UpstreamResponse`` with the decoded body.
+
+        Raises ``UpstreamError`` once the attempts or the deadline run out. The
+        attempts made so far are attached to the response or the error. While
+        the circuit is open it raises ``CircuitOpenError`` without a request.
+        """
+        if not circuit.allow():
+            raise CircuitOpenError('Circuit open; upstream not called')
+        try:
+            response = self._get_json(params, retries, deadline)
+        except UpstreamError as e:
+            if is_outage(e):
+                circuit.record_failure()
+            else:
+                circuit.record_success()
+            raise
+        circuit.record_success()
+        return response
+
+    def _get_json(self, params, retries, deadline):
+        retries = self.retries if retries is None else retries
+        expires_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempts = []
+
+        for number in range(1, retries + 1):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+
+            started = time.monotonic()
+            status_code = None
+            try:
+                response = self.session.get(
+                    self.base_url,
+                    params=params,
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)),
+                )
+                status_code = response.status_code
+                if status_code in RETRYABLE_STATUS_CODES:
+                    raise requests.HTTPError(f'{status_code} from upstream', response=response)
+                response.raise_for_status()
+                data = response.json()
+            except requests.HTTPError as e:
+                attempts.append(self._record(number, started, status_code, e))
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    raise UpstreamError(str(e), attempts) from e
+            except ValueError as e:
+                attempts.append(self._record(number, started, status_code, e))
+                raise UpstreamError(f'Invalid JSON from upstream: {e}', attempts) from e
+            except requests.RequestException as e:
+                attempts.append(self._record(number, started, status_code, e))
+            else:
+                attempts.append(self._record(number, started, status_code, None))
+                return UpstreamResponse(data, attempts)
+
+            if number < retries:
+                pause = self.backoff(number - 1)
+                if time.monotonic() + pause >= expires_at:
+                    break
+                time.sleep(pause)
+
+        raise UpstreamError(f'Upstream request failed after {len(attempts)} attempt(s)', attempts)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncUpstreamClient(RetryPolicy):
+    """Asyncio counterpart of ``UpstreamClient`` built on ``httpx.AsyncClient``.
+
+    Requests in flight only hold a pooled connection, not a thread, so one
+    process can wait on hundreds of upstream pages at once. Unlike the sync
+    client, the deadline also caps each attempt as a whole.
+    """
+
+    def __init__(self, base_url, auth=None, pool_size=100, verify=True, **policy):
+        super().__init__(base_url, **policy)
+        self.client = httpx.AsyncClient(
+            auth=auth,
+            verify=verify,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        )
+
+    async def get_json(self, params=None, retries=None, deadline=None):
+        """Async version of ``UpstreamClient.get_json``."""
+        if not await circuit.aallow():
+            raise CircuitOpenError('Circuit open; upstream not called')
+        try:
+            response = await self._get_json(params, retries, deadline)
+        except UpstreamError as e:
+            if is_outage(e):
+                await circuit.arecord_failure()
+            else:
+                await circuit.arecord_success()
+            raise
+        await circuit.arecord_success()
+        return response
+
+    async def _get_json(self, params, retries, deadline):
+        retries = self.retries if retries is None else retries
+        expires_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempts = []
+
+        for number in range(1, retries + 1):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+
+            started = time.monotonic()
+            status_code = None
+            try:
+                response = await asyncio.wait_for(
+                    self.client.get(self.base_url, params=params), remaining
+                )
+                status_code = response.status_code
+                if status_code in RETRYABLE_STATUS_CODES:
+                    raise httpx.HTTPStatusError(
+                        f'{status_code} from upstream', request=response.request, response=response
+                    )
+                response.raise_for_status()
+                data = response.json()
+            except httpx.HTTPStatusError as e:
+                attempts.append(self._record(number, started, status_code, e))
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    raise UpstreamError(str(e), attempts) from e
+            except ValueError as e:
+                attempts.append(self._record(number, started, status_code, e))
+                raise UpstreamError(f'Invalid JSON from upstream: {e}', attempts) from e
+            except asyncio.TimeoutError:
+                attempts.append(self._record(number, started, status_code, TimeoutError('deadline exceeded')))
+            except httpx.HTTPError as e:
+                attempts.append(self._record(number, started, status_code, e))
+            else:
+                attempts.append(self._record(number, started, status_code, None))
+                return UpstreamResponse(data, attempts)
+
+            if number < retries:
+                pause = self.backoff(number - 1)
+                if time.monotonic() + pause >= expires_at:
+                    break
+                await asyncio.sleep(pause)
+
+        raise UpstreamError(f'Upstream request failed after {len(attempts)} attempt(s)', attempts)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def _policy_from_settings():
+    return {
+        'connect_timeout': settings.EXTERNAL_API_CONNECT_TIMEOUT,
+        'read_timeout': settings.EXTERNAL_API_READ_TIMEOUT,
+        'retries': settings.EXTERNAL_API_RETRIES,
+        'backoff_base': settings.EXTERNAL_API_BACKOFF_BASE,
+        'backoff_max': settings.EXTERNAL_API_BACKOFF_MAX,
+        'deadline': settings.EXTERNAL_API_DEADLINE,
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+# httpx clients are bound to the event loop they were first used on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the process-wide client, building it from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient(
+                    settings.EXTERNAL_API_URL,
+                    auth=HTTPBasicAuth(settings.EXTERNAL_API_USERNAME, settings.EXTERNAL_API_PASSWORD),
+                    pool_size=settings.EXTERNAL_API_POOL_SIZE,
+                    verify=settings.EXTERNAL_API_VERIFY_SSL,
+                    **_policy_from_settings(),
+                )
+    return _client
+
+
+def get_async_client():
+    """Return the async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncUpstreamClient(
+            settings.EXTERNAL_API_URL,
+            auth=(settings.EXTERNAL_API_USERNAME, settings.EXTERNAL_API_PASSWORD),
+            pool_size=settings.EXTERNAL_API_ASYNC_POOL_SIZE,
+            verify=settings.EXTERNAL_API_VERIFY_SSL,
+            **_policy_from_settings(),
+        )
+    return client
+
+
+def reset_client():
+    """Drop the shared clients so the next call picks up fresh settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+    # Async clients can only be closed on their own loop; dropping them is enough.
+    _async_clients.clear()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith('EXTERNAL_API_'):
+        reset_client()
+        circuit.reset()
@@ -1,23 +1,53 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     RequestCountView,
+    MetricsView,
     UserRegistrationView,
+    AsyncUserRegistrationView,
     UserLoginView,
+    AsyncUserLoginView,
     ExpiredTokenRefreshView,
     LogoutView,
     MovieListView,
+    AsyncMovieListView,
+    MovieCacheStatsView,
+    MovieSyncView,
+    GenreListView,
+    GenreCountRebuildView,
     CollectionListView,
+    CollectionBatchView,
+    CollectionBatchLookupView,
+    CollectionCacheStatsView,
+    CollectionExportView,
     CollectionDetailView,
+    CollectionMoviesView,
+    SearchView,
 )
 
 urlpatterns = [
-    path("register/", UserRegistrationView.as_view(), name="register"),
-    path("login/", UserLoginView.as_view(), name="login"),
+    path(
+        "register/",
+        (AsyncUserRegistrationView if settings.ASYNC_VIEWS else UserRegistrationView).as_view(),
+        name="register",
+    ),
+    path("login/", (AsyncUserLoginView if settings.ASYNC_VIEWS else UserLoginView).as_view(), name="login"),
     path("refresh/", ExpiredTokenRefreshView.as_view(), name="token_refresh"),
     path("logout/", LogoutView.as_view(), name="logout"),
-    path("movies/", MovieListView.as_view(), name="movie-list"),
+    path("movies/", (AsyncMovieListView if settings.ASYNC_VIEWS else MovieListView).as_view(), name="movie-list"),
+    path("movies/cache-stats/", MovieCacheStatsView.as_view(), name="movie-cache-stats"),
+    path("movies/sync/", MovieSyncView.as_view(), name="movie-sync"),
+    path("genres/", GenreListView.as_view(), name="genre-list"),
+    path("genres/rebuild/", GenreCountRebuildView.as_view(), name="genre-rebuild"),
     path('collection/', CollectionListView.as_view(), name='collection-list'),
+    path('collection/batch/', CollectionBatchView.as_view(), name='collection-batch'),
+    path('collection/batch/lookup/', CollectionBatchLookupView.as_view(), name='collection-batch-lookup'),
+    path('collection/export/', CollectionExportView.as_view(), name='collection-export'),
+    path('collection/cache-stats/', CollectionCacheStatsView.as_view(), name='collection-cache-stats'),
     path('collection/<uuid:collection_uuid>/', CollectionDetailView.as_view(), name='collection-detail'),
+    path('collection/<uuid:collection_uuid>/movies/', CollectionMoviesView.as_view(), name='collection-movies'),
+    path('search/', SearchView.as_view(), name='search'),
     path('request-count/', RequestCountView.as_view(), name='request_count'),
     path('request-count/reset/', RequestCountView.as_view(), name='reset_request_count'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
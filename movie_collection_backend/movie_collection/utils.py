@@ -1,38 +1,54 @@
-import requests
-from django.conf import settings
-from requests.auth import HTTPBasicAuth
-from time import sleep
+import logging
 
-def fetch_movies(page=1, retries=3):
+from .metrics import registry
+from .upstream import CircuitOpenError, UpstreamError, get_async_client, get_client
+
+logger = logging.getLogger(__name__)
+
+# Number of movies per page served by the external API.
+UPSTREAM_PAGE_SIZE = 10
+
+
+def fetch_movies(page=1, retries=None):
     """Fetch movies from the external API with retries."""
-    url = f'{settings.EXTERNAL_API_URL}?page={page}'
-    
-    for attempt in range(retries):
-        try:
-            response = requests.get(
-                url,
-                auth=HTTPBasicAuth(settings.EXTERNAL_API_USERNAME, settings.EXTERNAL_API_PASSWORD),
-                verify=False
-            )
-
-            response.raise_for_status()
-            data = response.json()
-            results = data.get('results', [])
-
-            if not isinstance(results, list):
-                raise ValueError("'results' key should be a list")
-            
-            return {
-                'count': data.get('count', 0),
-                'next': data.get('next', None),
-                'previous': data.get('previous', None),
-                'data': results
-            }
-        except requests.RequestException as e:
-            print(f"Attempt {attempt + 1} failed with error: {e}")
-            sleep(2)
-        except ValueError as e:
-            print(f"Data format error: {e}")
-            return None
-    
-    return None
\ No newline at end of file
+    try:
+        with registry.time('upstream_fetch_duration_seconds'):
+            response = get_client().get_json(params={'page': page}, retries=retries)
+    except CircuitOpenError:
+        # Logged once by the breaker when it opened, not on every refused call.
+        return None
+    except UpstreamError as e:
+        logger.error('Fetching movies page %s failed: %s', page, e)
+        return None
+
+    return _movies_page(response.data)
+
+
+async def afetch_movies(page=1, retries=None):
+    """Fetch movies from the external API without blocking the event loop."""
+    try:
+        with registry.time('upstream_fetch_duration_seconds'):
+            response = await get_async_client().get_json(params={'page': page}, retries=retries)
+    except CircuitOpenError:
+        # Logged once by the breaker when it opened, not on every refused call.
+        return None
+    except UpstreamError as e:
+        logger.error('Fetching movies page %s failed: %s', page, e)
+        return None
+
+    return _movies_page(response.data)
+
+
+def _movies_page(data):
+    results = data.get('results', []) if isinstance(data, dict) else None
+
+    if not isinstance(results, list):
+        logger.error("Data format error: 'results' key should be a list")
+        return None
+
+    return {
+        'count': data.get('count', 0),
+        'next': data.get('next', None),
+        'previous': data.get('previous', None),
+        'data': results
+    }
@@ -1,18 +1,74 @@
-from django.core.cache import cache
-from django.http import JsonResponse
+from datetime import datetime, timezone as dt_timezone
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, user_logged_in
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status, generics
+from rest_framework.exceptions import APIException, ParseError, ValidationError
+from rest_framework.fields import DictField, ListField, UUIDField, empty
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+from rest_framework_simplejwt.tokens import UntypedToken
 from urllib.parse import urlparse, urlunparse
-from .utils import fetch_movies
+from .accounts import issue_tokens, set_token_cookies
+from .authentication import ClaimsJWTAuthentication
+from .batches import add_movies, collection_details, create_collections, delete_collections, remove_movies
+from .caching import CollectionDetailCache, UpstreamPageCache, aget_movies_page, get_movies_page
+from .catalog import alocal_movies_page, local_movies_page
+from .etags import cached_collection_version, collection_etag, content_etag, remember_collection_etag
+from .exports import astream_collections, stream_collections
+from .genres import cached_favourite_genres, collections_with_genre, genre_facets
+from .jobs import recompute_genre_counts, sync_movies
+from .metrics import registry, serializer_data
+from .middleware import request_counter
 from .models import Collection
-from .serializers import UserSerializer, CollectionSerializer, CollectionListSerializer
+from .pagination import CollectionCursorPagination, SearchPagination
+from .renderers import FastJSONParser, json_response
+from .revocation import revoke_token
+from .routers import reading_from_primary
+from .search import KINDS, SearchResults
+from .serializers import (
+    UserSerializer, CollectionSerializer, CollectionListSerializer, MovieSerializer, MovieSyncSerializer,
+)
+from .utils import UPSTREAM_PAGE_SIZE
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
+def registration_data(user, tokens):
+    return {
+        'message': f'{user.username}\'s account is registered!',
+        'access_token': tokens['access'],
+    }
+
+
+def login_data(username, tokens):
+    return {
+        'username': username,
+        'message': f'{username} is logged in',
+        'access_token': tokens['access'],
+        'refresh_token': tokens['refresh'],
+    }
+
+
+def request_data(request):
+    """The body of a plain Django view's request, JSON or form encoded."""
+    if request.content_type == 'application/json':
+        data = FastJSONParser().parse(BytesIO(request.body))
+        if not isinstance(data, dict):
+            raise ParseError('JSON parse error - expected an object')
+        return data
+    return request.POST.dict()
+
+
 class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserSerializer
     
@@ -21,17 +77,10 @@ class UserRegistrationView(generics.CreateAPIView):
         if serializer.is_valid():
             try:
                 user = serializer.save()
-                refresh = RefreshToken.for_user(user)
-                
-                response = Response({
-                    'message': f'{user.username}\'s account is registered!',
-                    'access_token': str(refresh.access_token),
-                }, status=status.HTTP_201_CREATED)
-
-                response.set_cookie('access', str(refresh.access_token), httponly=True, samesite='Lax')
-                response.set_cookie('refresh', str(refresh), httponly=True, samesite='Lax')
-                
-                return response
+                tokens = issue_tokens(user)
+                return set_token_cookies(
+                    Response(registration_data(user, tokens), status=status.HTTP_201_CREATED), tokens,
+                )
             except Exception as e:
                 return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
@@ -41,36 +90,77 @@ class UserRegistrationView(generics.CreateAPIView):
 class UserLoginView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
         try:
-            response = super().post(request, *args, **kwargs)
-            
-            refresh_token = response.data['refresh']
-            access_token = response.data['access']
+            # The serializer authenticates and mints the pair; use it as is.
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            tokens = serializer.validated_data
+            user_logged_in.send(sender=serializer.user.__class__, request=request, user=serializer.user)
 
-            if not refresh_token or not access_token:
-                raise ValueError("Tokens are missing from response data")
-            
-            refresh = RefreshToken(refresh_token)
-            access_token = str(refresh.access_token)
-
-            response_data = {
-                'username': request.data["username"],
-                'message': f'{request.data["username"]} is logged in',
-                'access_token': access_token,
-                'refresh_token': str(refresh)
-            }
-
-            response.set_cookie('refresh', str(refresh), httponly=True, samesite='Lax')
-            response.set_cookie('access', access_token, httponly=True, samesite='Lax')
-            
-            response.data = response_data
-            
-            return response
+            return set_token_cookies(Response(login_data(request.data['username'], tokens)), tokens)
 
         except Exception as e:
             print(f"Error in UserLoginView: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+class AsyncTokenView(View):
+    """Base of the async login and registration views, used when running under ASGI.
+
+    Authentication and account creation take the same paths as the sync views,
+    in a thread, while the password hashes they wait on run in the bounded
+    hashing pool (see ``accounts``), so a burst of logins neither blocks the
+    event loop nor takes every core.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token endpoints are called by API clients, like the DRF views they stand in for.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+
+class AsyncUserRegistrationView(AsyncTokenView):
+    async def post(self, request):
+        try:
+            serializer = UserSerializer(data=request_data(request))
+        except ParseError as e:
+            return json_response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        if not await sync_to_async(serializer.is_valid)():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await sync_to_async(serializer.save)()
+            tokens = issue_tokens(user)
+            return set_token_cookies(
+                json_response(registration_data(user, tokens), status=status.HTTP_201_CREATED), tokens,
+            )
+        except Exception as e:
+            return json_response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncUserLoginView(AsyncTokenView):
+    async def post(self, request):
+        try:
+            data = request_data(request)
+        except ParseError as e:
+            return json_response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        username, password = data.get('username'), data.get('password')
+        if not username or not password:
+            return json_response(
+                {'error': 'Both username and password are required'}, status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        user = await aauthenticate(request, username=username, password=password)
+        if user is None:
+            return json_response(
+                {'error': str(TokenObtainSerializer.default_error_messages['no_active_account'])},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        await user_logged_in.asend(sender=user.__class__, request=request, user=user)
+
+        tokens = issue_tokens(user)
+        return set_token_cookies(json_response(login_data(username, tokens)), tokens)
+
+
 class ExpiredTokenRefreshView(TokenRefreshView):
     def post(self, request, *args, **kwargs):
         try:
@@ -84,28 +174,51 @@ class ExpiredTokenRefreshView(TokenRefreshView):
             response = super().post(request, *args, **kwargs)
 
             if response.status_code == status.HTTP_200_OK:
-                access_token = response.data.get('access')
-                refresh_token = response.data.get('refresh')
-
-                if access_token:
-                    response.set_cookie('access', access_token, httponly=True, samesite='Lax')
-                if refresh_token:
-                    response.set_cookie('refresh', refresh_token, httponly=True, samesite='Lax')
-
-                response_data = {'access_token': access_token}
-                return Response(response_data, status=status.HTTP_200_OK)
+                # Refresh tokens rotate: the one just used is revoked, so the new one must reach the cookie.
+                tokens = response.data
+                return set_token_cookies(
+                    Response({'access_token': tokens['access']}, status=status.HTTP_200_OK), tokens,
+                )
 
             return response
 
+        except InvalidToken as e:
+            return JsonResponse({'Token error': str(e.detail['detail'])}, status=401)
         except TokenError as e:
             return JsonResponse({'Token error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'Unexpected error': str(e)}, status=500)
 
 
+def presented_tokens(request):
+    """Every token the request carries, in cookies, the body or the Authorization header."""
+    raw_tokens = [request.COOKIES.get('access'), request.COOKIES.get('refresh')]
+    if isinstance(request.data, dict):
+        raw_tokens.append(request.data.get('refresh'))
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header:
+        raw_tokens.append(authentication.get_raw_token(header))
+
+    tokens = []
+    for raw_token in filter(None, raw_tokens):
+        try:
+            tokens.append(UntypedToken(raw_token))
+        except TokenError:
+            # Expired or forged; nothing to revoke.
+            continue
+    return tokens
+
+
 class LogoutView(APIView):
+    # Logging out must work with whatever tokens are left, even expired ones.
+    authentication_classes = []
+
     def post(self, request):
         try:
+            for token in presented_tokens(request):
+                revoke_token(token)
+
             response = JsonResponse({'message': 'Logout successful'}, status=status.HTTP_200_OK)
             
             response.delete_cookie('access')
@@ -117,55 +230,179 @@ class LogoutView(APIView):
             return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+GENRE_FILTER_UNAVAILABLE = 'Filtering by genre needs the local movie catalog (MOVIE_LIST_SOURCE=local)'
+INVALID_PAGE = 'page must be a positive integer'
+
+
+def requested_page(request):
+    """The ``page`` query parameter as a number from 1 up, or None when it is anything else."""
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+    return page if page >= 1 else None
+
+
+def movie_list_data(request, page, movies_data):
+    """Build the paginated movie list body, pointing next/previous back at this API."""
+    full_url = request.build_absolute_uri()
+    parsed_url = urlparse(full_url)
+    url_without_query = urlunparse(parsed_url._replace(query=''))
+
+    total_pages = -(-movies_data['count'] // UPSTREAM_PAGE_SIZE)
+    next_page = page + 1 if page < total_pages else None
+    previous_page = page - 1 if page > 1 else None
+
+    def page_url(number):
+        query = request.GET.copy()
+        query['page'] = number
+        return f'{url_without_query}?{query.urlencode()}'
+
+    body = {
+        'count': movies_data['count'],
+        'next': page_url(next_page) if next_page else None,
+        'previous': page_url(previous_page) if previous_page else None,
+        'results': movies_data['data']
+    }
+    if movies_data.get('stale'):
+        # Upstream is unavailable and this is the last page it returned.
+        body['stale'] = True
+        body['fetched_at'] = datetime.fromtimestamp(movies_data['fetched_at'], tz=dt_timezone.utc)
+    return body
+
+
+def with_etag(request, etag, build):
+    """Answer 304 when ``If-None-Match`` matches ``etag``, else ``build()``; both carry the ETag."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    return response
+
+
 class MovieListView(APIView):
     def get(self, request):
-        page = int(request.GET.get('page', 1))
-        movies_data = fetch_movies(page)
-        full_url = request.build_absolute_uri()
-        parsed_url = urlparse(full_url)
-        url_without_query = urlunparse(parsed_url._replace(query=''))
-        
+        page = requested_page(request)
+        if page is None:
+            return Response({'error': INVALID_PAGE}, status=status.HTTP_400_BAD_REQUEST)
+        genre = request.GET.get('genre')
+        if settings.MOVIE_LIST_SOURCE == 'local':
+            movies_data = local_movies_page(page, genre)
+        elif genre:
+            return Response({'error': GENRE_FILTER_UNAVAILABLE}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            movies_data = get_movies_page(page)
+
         if movies_data:
-            total_pages = (movies_data['count'] + 9) // 10
-            next_page = page + 1 if page < total_pages else None
-            previous_page = page - 1 if page > 1 else None
-            
-            response_data = {
-                'count': movies_data['count'],
-                'next': url_without_query + f'?page={next_page}' if next_page else None,
-                'previous': url_without_query + f'?page={previous_page}' if previous_page else None,
-                'results': movies_data['data']
-            }
-            return Response(response_data)
-        
+            body = movie_list_data(request, page, movies_data)
+            return with_etag(request, content_etag(body), lambda: Response(body))
+
         return Response({'error': 'Failed to fetch movies'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class AsyncMovieListView(View):
+    """Async counterpart of ``MovieListView``, used when running under ASGI."""
+
+    async def get(self, request):
+        page = requested_page(request)
+        if page is None:
+            return json_response({'error': INVALID_PAGE}, status=status.HTTP_400_BAD_REQUEST)
+        genre = request.GET.get('genre')
+        if settings.MOVIE_LIST_SOURCE == 'local':
+            movies_data = await alocal_movies_page(page, genre)
+        elif genre:
+            return json_response({'error': GENRE_FILTER_UNAVAILABLE}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            movies_data = await aget_movies_page(page)
+
+        if movies_data:
+            body = movie_list_data(request, page, movies_data)
+            return with_etag(request, content_etag(body), lambda: json_response(body))
+
+        return json_response({'error': 'Failed to fetch movies'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class GenreListView(APIView):
+    def get(self, request):
+        return Response({'genres': genre_facets()})
+
+
+class GenreCountRebuildView(APIView):
+    """Queue a rebuild of every collection's genre counts for ``run_workers``; repeated requests share one job."""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        job = recompute_genre_counts.enqueue(dedup_key='recompute_genre_counts')
+        return Response(
+            {'job_id': job.pk, 'status': job.status, 'run_at': job.run_at}, status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class MovieCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(UpstreamPageCache.stats.snapshot())
+
+    def post(self, request):
+        UpstreamPageCache.stats.reset()
+        return Response({'message': 'movie cache stats reset successfully'})
+
+
+class MovieSyncView(APIView):
+    """Queue a sync of the local movie mirror for ``run_workers``; repeated requests share one job."""
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = MovieSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = sync_movies.enqueue(dedup_key='sync_movies', restart=serializer.validated_data['restart'])
+        return Response(
+            {'job_id': job.pk, 'status': job.status, 'run_at': job.run_at}, status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class CollectionCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(CollectionDetailCache.report())
+
+    def post(self, request):
+        CollectionDetailCache.stats.reset()
+        return Response({'message': 'collection cache stats reset successfully'})
+
+
 class CollectionListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         try:
             collections = Collection.objects.all()
-            serializer = CollectionListSerializer(collections, many=True)
-            unique_favourite_genres = set()
+            genre = request.GET.get('genre')
+            if genre:
+                collections = collections_with_genre(collections, genre)
 
-            for collection in collections:
-                genres = (genre.strip() for genre in collection.favourite_genres.split(',') if genre.strip())
-                unique_favourite_genres.update(genres)
-
-            sorted_favourite_genres = sorted(unique_favourite_genres)
+            paginator = CollectionCursorPagination()
+            page = paginator.paginate_queryset(collections, request, view=self)
+            serializer = CollectionListSerializer(page, many=True)
 
             response = {
                 "is_success": True,
                 "data": {
-                    "collections": serializer.data,
-                    "favourite_genres": sorted_favourite_genres
+                    "collections": serializer_data(serializer),
+                    "next": paginator.get_next_link(),
+                    "previous": paginator.get_previous_link(),
+                    "favourite_genres": cached_favourite_genres(genre)
                 }
             }
 
             return Response(response)
-        
+
+        except APIException:
+            raise
         except Exception as e:
             print(f"An error occurred while processing the request: {str(e)}")
 
@@ -182,17 +419,55 @@ class CollectionListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CollectionExportView(APIView):
+    """Every collection (optionally of one genre) as a single streamed JSON document.
+
+    Under ASGI (``ASYNC_VIEWS``) the body comes from an async generator, which
+    the handler streams as it goes; it would buffer a sync one whole.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        collections = Collection.objects.all()
+        genre = request.GET.get('genre')
+        if genre:
+            collections = collections_with_genre(collections, genre)
+
+        stream = astream_collections if settings.ASYNC_VIEWS else stream_collections
+        return StreamingHttpResponse(
+            stream(collections, settings.COLLECTION_EXPORT_CHUNK_SIZE),
+            content_type='application/json',
+        )
+
+
 class CollectionDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, collection_uuid):
+        # A cached version answers a matching If-None-Match without any query.
+        version = cached_collection_version(collection_uuid)
+        if version is not None:
+            etag = collection_etag(collection_uuid, version)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
+
+        entry = CollectionDetailCache().get(collection_uuid, version, lambda: self.build(collection_uuid))
+        if entry is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        etag = remember_collection_etag(collection_uuid, entry['version'])
+        return with_etag(request, etag, lambda: Response(entry['data']))
+
+    @reading_from_primary()
+    def build(self, collection_uuid):
         try:
             collection = Collection.objects.get(uuid=collection_uuid)
         except Collection.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
-
-        serializer = CollectionSerializer(collection)
-        return Response(serializer.data)
+            return None
+        return collection.version, serializer_data(CollectionSerializer(collection))
 
     def put(self, request, collection_uuid):
         try:
@@ -203,7 +478,7 @@ class CollectionDetailView(APIView):
         serializer = CollectionSerializer(collection, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serializer_data(serializer))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, collection_uuid):
@@ -216,14 +491,168 @@ class CollectionDetailView(APIView):
         return Response({'collection_uuid': str(collection.uuid)+' deleted'}, status=status.HTTP_204_NO_CONTENT)
 
 
+def batch_of(request, name, child):
+    """Validate the list of ``child`` items under ``name`` in the body; raises ``ValidationError``."""
+    data = request.data.get(name, empty) if isinstance(request.data, dict) else empty
+    field = ListField(child=child, allow_empty=False, max_length=settings.COLLECTION_BATCH_MAX_SIZE)
+    try:
+        return field.run_validation(data)
+    except ValidationError as e:
+        raise ValidationError({name: e.detail})
+
+
+class CollectionBatchView(APIView):
+    """Create or delete many collections in one request, with a result per item.
+
+    ``POST {"collections": [...]}`` takes the same items as the collection
+    list's POST; valid ones are created together even when others are not.
+    ``DELETE {"uuids": [...]}`` deletes every listed collection that exists.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializers = [CollectionSerializer(data=item) for item in batch_of(request, 'collections', DictField())]
+        valid = [serializer for serializer in serializers if serializer.is_valid()]
+        created = iter(create_collections([serializer.validated_data for serializer in valid]))
+
+        results = [
+            {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors} if serializer.errors
+            else {'status': status.HTTP_201_CREATED, 'collection_uuid': str(next(created).uuid)}
+            for serializer in serializers
+        ]
+        if len(valid) == len(serializers):
+            response_status = status.HTTP_201_CREATED
+        elif valid:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    def delete(self, request):
+        uuids = batch_of(request, 'uuids', UUIDField())
+        deleted = delete_collections(uuids)
+        return Response({'results': [
+            {
+                'collection_uuid': str(collection_uuid),
+                'status': status.HTTP_204_NO_CONTENT if collection_uuid in deleted else status.HTTP_404_NOT_FOUND,
+            }
+            for collection_uuid in uuids
+        ]})
+
+
+class CollectionBatchLookupView(APIView):
+    """The details of many collections at once: ``POST {"uuids": [...]}``.
+
+    A POST because a few hundred uuids do not fit in a query string.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        uuids = batch_of(request, 'uuids', UUIDField())
+        details = collection_details(uuids)
+        results = []
+        for collection_uuid in uuids:
+            if collection_uuid in details:
+                result = {'status': status.HTTP_200_OK, 'collection': details[collection_uuid]}
+            else:
+                result = {'status': status.HTTP_404_NOT_FOUND}
+            results.append({'collection_uuid': str(collection_uuid), **result})
+        return Response({'results': results})
+
+
+class CollectionMoviesView(APIView):
+    """Add or remove some of a collection's movies: ``POST`` or ``DELETE {"uuids": [...]}``.
+
+    Unlike a PUT of the whole movie list, only the memberships being changed
+    are read and written, so the cost follows the batch, not the collection.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, collection_uuid):
+        uuids = batch_of(request, 'uuids', UUIDField())
+        collection = Collection.objects.filter(uuid=collection_uuid).first()
+        if collection is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        added, present = add_movies(collection, uuids)
+        results = []
+        for movie_uuid in uuids:
+            if movie_uuid in added:
+                result_status = status.HTTP_201_CREATED
+            elif movie_uuid in present:
+                result_status = status.HTTP_200_OK
+            else:
+                result_status = status.HTTP_404_NOT_FOUND
+            results.append({'movie_uuid': str(movie_uuid), 'status': result_status})
+        return Response({'results': results})
+
+    def delete(self, request, collection_uuid):
+        uuids = batch_of(request, 'uuids', UUIDField())
+        collection = Collection.objects.filter(uuid=collection_uuid).first()
+        if collection is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        removed = remove_movies(collection, uuids)
+        return Response({'results': [
+            {
+                'movie_uuid': str(movie_uuid),
+                'status': status.HTTP_204_NO_CONTENT if movie_uuid in removed else status.HTTP_404_NOT_FOUND,
+            }
+            for movie_uuid in uuids
+        ]})
+
+
+class SearchView(APIView):
+    """Ranked full-text search over movies and collections: ``?q=`` plus optional ``type``."""
+
+    authentication_classes = [ClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializers = {'movie': MovieSerializer, 'collection': CollectionListSerializer}
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Missing search query (q)'}, status=status.HTTP_400_BAD_REQUEST)
+        kind = request.GET.get('type')
+        if kind and kind not in KINDS:
+            return Response(
+                {'error': f'Unknown type {kind!r}; expected one of {", ".join(KINDS)}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(SearchResults(query, [kind] if kind else KINDS), request, view=self)
+        results = [
+            {'type': hit['type'], 'score': hit['score'], **self.serializers[hit['type']](hit['object']).data}
+            for hit in page
+        ]
+        return paginator.get_paginated_response(results)
+
+
 class RequestCountView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        count = cache.get('request_count', 0)
-        return Response({'requests': count})
+        request_counter.flush()
+        count, routes = request_counter.breakdown()
+        return Response({'requests': count, 'routes': routes})
 
     def post(self, request):
-        cache.set('request_count', 0)
-        return Response({'message': 'request count reset successfully'})
-    
\ No newline at end of file
+        count, routes = request_counter.reset()
+        return Response({
+            'message': 'request count reset successfully',
+            'requests': count,
+            'routes': routes,
+        })
+
+
+class MetricsView(APIView):
+    """Latency histograms of this process in the Prometheus text format."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_collection_backend.settings')
+# Route upstream-bound views to their native async variants under ASGI.
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Publish request counts from a background thread, idle or not.
+from movie_collection.middleware import request_counter  # noqa: E402
+
+request_counter.start()
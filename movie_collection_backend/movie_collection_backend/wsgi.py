@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_collection_backend.settings')
 
 application = get_wsgi_application()
+
+# Publish request counts from a background thread, idle or not.
+from movie_collection.middleware import request_counter  # noqa: E402
+
+request_counter.start()